@@ -0,0 +1,465 @@
+# benchmark.py
+# ----------------------------------------------------
+# Bases de datos sintéticas y mediciones de database.py sin interfaz.
+#
+#   python benchmark.py generar bench.db --productos 5000 --movimientos 500000
+#   python benchmark.py medir bench.db --json hoy.json --comparar ayer.json
+#
+# "generar" crea una base nueva con productos de popularidad desigual,
+# movimientos repartidos en días hábiles y salidas que nunca dejan el
+# stock negativo. "medir" cronometra las funciones de database.py y los
+# recorridos que hacen las pestañas (conteo, primer bloque, bloque
+# siguiente, salto al medio) para cada filtro y orden, y escribe un JSON
+# que se puede comparar con una corrida anterior.
+# Código de salida de "medir": 3 si hay regresiones respecto de --comparar.
+# ----------------------------------------------------
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+REGRESION = 3
+
+# Vocabulario para nombres, destinos y comentarios
+_TIPOS = ("Tornillo", "Tuerca", "Cable", "Tubo", "Codo", "Válvula", "Cinta", "Guante", "Filtro", "Rodamiento",
+          "Interruptor", "Enchufe", "Ampolleta", "Pintura", "Brocha", "Lija", "Manguera", "Abrazadera",
+          "Candado", "Bisagra", "Silicona", "Adhesivo", "Taladro", "Broca", "Disco de corte", "Casco")
+_MATERIALES = ("acero", "bronce", "cobre", "PVC", "galvanizado", "inoxidable", "nitrilo", "aluminio",
+               "plástico", "goma", "latón", "carbono")
+_MEDIDAS = ("1/4", "3/8", "1/2", "3/4", "1\"", "2 mm", "2.5 mm", "4 mm", "6 mm", "10 mm", "20 mm",
+            "1 L", "4 L", "talla M", "talla L", "50 m", "100 m")
+_DESTINOS = [f"Bodega {i}" for i in range(1, 9)] + [f"Sala {i}" for i in range(1, 25)] + \
+            ["Taller", "Mantención", "Obra norte", "Obra sur", "Oficina central", "Laboratorio"]
+_PALABRAS = ("revisado", "según", "pedido", "urgente", "proveedor", "caja", "dañada", "reposición",
+             "mensual", "faltan", "unidades", "entregado", "a", "bodega", "por", "turno", "noche",
+             "devuelto", "garantía", "nuevo", "lote", "para", "mantención", "preventiva", "del", "equipo")
+
+
+# ---------------------------------------------------
+# Generación
+# ---------------------------------------------------
+def _nombres(cantidad, rnd):
+    vistos = set()
+    while len(vistos) < cantidad:
+        nombre = f"{rnd.choice(_TIPOS)} {rnd.choice(_MATERIALES)} {rnd.choice(_MEDIDAS)}"
+        if nombre.lower() in vistos:
+            nombre = f"{nombre} modelo {len(vistos)}"
+        vistos.add(nombre.lower())
+        yield nombre
+
+
+def _comentario(largo, rnd):
+    if not largo or rnd.random() < 0.3:
+        return ""
+    objetivo = rnd.randint(1, 2 * largo)
+    palabras = []
+    while sum(len(p) + 1 for p in palabras) < objetivo:
+        palabras.append(rnd.choice(_PALABRAS))
+    return " ".join(palabras).capitalize()
+
+
+def _fechas(cantidad, dias, rnd):
+    """`cantidad` fechas ISO ordenadas en los últimos `dias` días (pocas en fin de semana)."""
+    hoy = date.today()
+    pesos = [0.25 if (hoy - timedelta(days=d)).weekday() >= 5 else 1.0 for d in range(dias)]
+    atras = sorted(rnd.choices(range(dias), weights=pesos, k=cantidad), reverse=True)
+    return [(hoy - timedelta(days=d)).isoformat() for d in atras]
+
+
+def generar_base(database, productos=2000, movimientos=200000, dias=1095, largo_comentario=40,
+                 proporcion_salidas=0.3, semilla=1, tamano_lote=20000, progreso=None, ubicaciones=1):
+    """Llena la base vacía de `database` (ya apuntando a su archivo) con datos sintéticos.
+
+    La popularidad de los productos sigue una ley de Zipf. Las salidas
+    solo sacan unidades que hay en stock en esa fecha (y en esa ubicación,
+    con más de una); si el producto no tiene, el movimiento pasa a ser una
+    entrada. Devuelve un dict con las cantidades insertadas.
+    """
+    rnd = random.Random(semilla)
+    database.migrar()
+    # Los índices por producto reciben inserciones salteadas; con la caché
+    # normal de 20 MB cada tanda es más lenta que la anterior
+    database.connect().execute("PRAGMA cache_size = -262144")
+    with database.transaccion() as conn:
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM productos)").fetchone()[0]:
+            raise ValueError("La base de datos ya tiene productos; generar necesita una base vacía")
+        conn.executemany("INSERT INTO productos (nombre, sku) VALUES (?, ?)",
+                         ((n, f"SKU-{i:06d}") for i, n in enumerate(_nombres(productos, rnd), start=1)))
+        ids = [fila[0] for fila in conn.execute("SELECT id FROM productos ORDER BY id")]
+    lugares = [database.UBICACION_PRINCIPAL] + [database.agregar_ubicacion(f"Sucursal {i}")
+                                                for i in range(2, ubicaciones + 1)]
+
+    rnd.shuffle(ids)  # la popularidad no depende del orden alfabético
+    acumulado = list(itertools.accumulate(1 / rango ** 0.9 for rango in range(1, len(ids) + 1)))
+
+    stock = dict.fromkeys(itertools.product(lugares, ids), 0)
+    entradas, salidas = [], []
+    contador = {"entradas": 0, "salidas": 0}
+
+    def volcar():
+        with database.transaccion() as conn:
+            conn.executemany("INSERT INTO entradas (producto_id, fecha, factura, cantidad, comentario, ubicacion_id) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", entradas)
+            conn.executemany("INSERT INTO salidas (producto_id, fecha, estado, destino, cantidad, comentario, "
+                             "ubicacion_id) VALUES (?, ?, ?, ?, ?, ?, ?)", salidas)
+        contador["entradas"] += len(entradas)
+        contador["salidas"] += len(salidas)
+        entradas.clear()
+        salidas.clear()
+        if progreso:
+            progreso(contador["entradas"] + contador["salidas"], movimientos)
+
+    for fecha in _fechas(movimientos, dias, rnd):
+        producto = rnd.choices(ids, cum_weights=acumulado)[0]
+        # Con una sola ubicación no se sortea: la misma semilla da la misma base
+        lugar = rnd.choice(lugares) if len(lugares) > 1 else lugares[0]
+        if rnd.random() < proporcion_salidas and stock[lugar, producto] > 0:
+            cantidad = rnd.randint(1, min(stock[lugar, producto], 12))
+            stock[lugar, producto] -= cantidad
+            estado = "Operativo" if rnd.random() < 0.9 else "No operativo"
+            salidas.append((producto, fecha, estado, rnd.choice(_DESTINOS), cantidad,
+                            _comentario(largo_comentario, rnd), lugar))
+        else:
+            cantidad = rnd.randint(1, 60)
+            stock[lugar, producto] += cantidad
+            entradas.append((producto, fecha, f"F{contador['entradas'] + len(entradas) + 1:07d}", cantidad,
+                             _comentario(largo_comentario, rnd), lugar))
+        if len(entradas) + len(salidas) >= tamano_lote:
+            volcar()
+    volcar()
+    database._invalidar_todo()
+    database.optimizar()
+    return {"productos": len(ids), "ubicaciones": len(lugares), **contador}
+
+
+# ---------------------------------------------------
+# Mediciones
+# ---------------------------------------------------
+def _filas(valor):
+    if isinstance(valor, bool) or valor is None:
+        return None
+    if isinstance(valor, int):
+        return valor  # total de un recorrido
+    if isinstance(valor, tuple) and valor and isinstance(valor[0], list):
+        valor = valor[0]  # (filas, cursor) de obtener_pagina
+    if isinstance(valor, dict):
+        return valor.get("filas", valor.get("insertadas"))
+    return len(valor) if isinstance(valor, (list, tuple)) else None
+
+
+def _recorrido_tabla(database, tabla, filtro=None, orden=None, descendente=False, rango=None, bloque=100,
+                     ubicacion=None):
+    """Lo que hace la VirtualTable de una pestaña: contar, primer bloque,
+    bloque siguiente por cursor y salto al medio con desplazamiento."""
+    total = database.contar_filas(tabla, filtro, rango, ubicacion)
+    filas, cursor = database.obtener_pagina(tabla, filtro, orden, descendente, limite=bloque, rango=rango,
+                                            ubicacion=ubicacion)
+    if cursor is not None:
+        database.obtener_pagina(tabla, filtro, orden, descendente, cursor=cursor, limite=bloque, rango=rango,
+                                ubicacion=ubicacion)
+    if total > 2 * bloque:
+        database.obtener_pagina(tabla, filtro, orden, descendente, limite=bloque,
+                                desplazamiento=total // 2, rango=rango, ubicacion=ubicacion)
+    return total
+
+
+def _muestras(database):
+    """Valores reales de la base para que las consultas encuentren algo."""
+    conn = database.connect()
+    popular = conn.execute("""
+        SELECT p.nombre FROM stock AS s JOIN productos AS p ON p.id = s.producto_id
+        ORDER BY s.total_entradas DESC LIMIT 1
+    """).fetchone()
+    raro = conn.execute("""
+        SELECT p.nombre FROM stock AS s JOIN productos AS p ON p.id = s.producto_id
+        WHERE s.total_entradas > 0 ORDER BY s.total_entradas LIMIT 1
+    """).fetchone()
+    fechas = conn.execute("SELECT MIN(fecha), MAX(fecha) FROM entradas").fetchone()
+    factura = conn.execute("SELECT factura FROM entradas ORDER BY id DESC LIMIT 1").fetchone()
+    # La ubicación con menos productos (la principal si es la única)
+    ubicacion = conn.execute("""
+        SELECT u.id FROM ubicaciones AS u
+        ORDER BY (SELECT COUNT(*) FROM stock_ubicacion AS s WHERE s.ubicacion_id = u.id), u.id LIMIT 1
+    """).fetchone()
+    if not popular or not fechas[0]:
+        raise ValueError("La base de datos no tiene movimientos para medir")
+    ultima = date.fromisoformat(fechas[1])
+    return {
+        "popular": popular[0],
+        "raro": raro[0],
+        "palabra": popular[0].split()[0],
+        "factura": factura[0],
+        "ubicacion": ubicacion[0],
+        "mes": ((ultima - timedelta(days=30)).isoformat(), ultima.isoformat()),
+        "anio_pasado": ((ultima - timedelta(days=730)).isoformat(), (ultima - timedelta(days=365)).isoformat()),
+        "fecha_pasada": (ultima - timedelta(days=400)).isoformat(),
+    }
+
+
+def casos(database):
+    """Lista de (nombre, funcion, antes, despues). `antes` y `despues` (o
+    None) preparan y deshacen los casos que escriben; no se cronometran."""
+    m = _muestras(database)
+    lista = []
+
+    def caso(nombre, funcion, antes=None, despues=None):
+        lista.append((nombre, funcion, antes, despues))
+
+    # Lecturas completas (lo que usaban las pestañas antes de paginar)
+    caso("calcular_inventario", database.calcular_inventario)
+    caso("nombres_productos", database.nombres_productos)
+    caso("obtener_productos", database.obtener_productos)
+    caso("obtener_entradas", database.obtener_entradas)
+    caso("obtener_entradas(filtro)", lambda: database.obtener_entradas(m["palabra"]))
+    caso("obtener_salidas", database.obtener_salidas)
+    caso("obtener_salidas(filtro)", lambda: database.obtener_salidas(m["palabra"]))
+    caso("factura_existe(si)", lambda: database.factura_existe(m["factura"]))
+    caso("factura_existe(no)", lambda: database.factura_existe("NO-EXISTE"))
+    caso("stock_disponible", lambda: database.stock_disponible(m["popular"]))
+    caso("verificar_stock", database.verificar_stock)
+
+    # Reportes
+    for por in database.AGRUPACIONES:
+        caso(f"resumen_periodo({por})", lambda por=por: database.resumen_periodo(por))
+        caso(f"resumen_periodo({por}, año)", lambda por=por: database.resumen_periodo(por, *m["anio_pasado"]))
+    caso("resumen_periodo(mes, producto)", lambda: database.resumen_periodo("mes", producto=m["popular"]))
+    caso("stock_al", lambda: database.stock_al(m["fecha_pasada"]))
+    caso("stock_al(producto)", lambda: database.stock_al(m["fecha_pasada"], m["popular"]))
+    caso("stock_ubicacion", lambda: database.stock_ubicacion(m["ubicacion"]))
+    caso("stock_ubicacion(producto)", lambda: database.stock_ubicacion(m["ubicacion"], m["popular"]))
+    caso("stock_por_ubicacion", lambda: database.stock_por_ubicacion(m["popular"]))
+
+    # Recorridos de las pestañas: filtro x orden x período
+    for tabla in ("entradas", "salidas", "stock"):
+        caso(f"{tabla}: sin filtro", lambda t=tabla: _recorrido_tabla(database, t))
+        for col in database._TABLAS[tabla]["orden"]:
+            caso(f"{tabla}: orden {col}", lambda t=tabla, c=col: _recorrido_tabla(database, t, orden=c))
+            caso(f"{tabla}: orden {col} desc", lambda t=tabla, c=col: _recorrido_tabla(database, t, orden=c,
+                                                                                      descendente=True))
+        caso(f"{tabla}: buscar común", lambda t=tabla: _recorrido_tabla(database, t, m["palabra"]))
+        caso(f"{tabla}: buscar común por nombre",
+             lambda t=tabla: _recorrido_tabla(database, t, m["palabra"], orden="nombre"))
+        caso(f"{tabla}: buscar producto", lambda t=tabla: _recorrido_tabla(database, t, m["raro"]))
+        caso(f"{tabla}: último mes", lambda t=tabla: _recorrido_tabla(database, t, rango=m["mes"]))
+        caso(f"{tabla}: último mes + buscar",
+             lambda t=tabla: _recorrido_tabla(database, t, m["palabra"], rango=m["mes"]))
+        caso(f"{tabla}: exportar csv",
+             lambda t=tabla: database.escribir_filas(io.StringIO(), t)["filas"])
+
+    # La pestaña Inventario filtrada por ubicación
+    u = m["ubicacion"]
+    caso("stock: ubicación", lambda: _recorrido_tabla(database, "stock", ubicacion=u))
+    caso("stock: ubicación orden stock desc",
+         lambda: _recorrido_tabla(database, "stock", orden="stock", descendente=True, ubicacion=u))
+    caso("stock: ubicación + buscar", lambda: _recorrido_tabla(database, "stock", m["palabra"], ubicacion=u))
+    caso("stock: ubicación + último mes", lambda: _recorrido_tabla(database, "stock", rango=m["mes"], ubicacion=u))
+    caso("stock: ubicación + año pasado",
+         lambda: _recorrido_tabla(database, "stock", rango=m["anio_pasado"], ubicacion=u))
+    caso("entradas: ubicación orden fecha", lambda: _recorrido_tabla(database, "entradas", orden="fecha", ubicacion=u))
+
+    # Escrituras: cada una se deshace después
+    def ultimo_id(tabla):
+        return database.connect().execute(f"SELECT MAX(id) FROM {tabla}").fetchone()[0]
+
+    hoy = date.today().isoformat()
+    caso("agregar_entrada",
+         lambda: database.agregar_entrada(m["popular"], hoy, "BENCH-1", 5, "benchmark"),
+         despues=lambda: database.eliminar_entrada(ultimo_id("entradas")))
+    caso("registrar_salida",
+         lambda: database.registrar_salida(m["popular"], hoy, "Operativo", "Bodega 1", 1, "benchmark"),
+         despues=lambda: database.eliminar_salida(ultimo_id("salidas")))
+    transferencia = {}
+
+    def preparar_transferencia():
+        transferencia["destino"] = database.agregar_ubicacion("Benchmark")
+
+    def deshacer_transferencia():
+        database.eliminar_transferencia(transferencia["id"])
+        database.eliminar_ubicacion(transferencia["destino"])
+
+    caso("transferir",
+         lambda: transferencia.update(id=database.transferir(m["popular"], hoy, database.UBICACION_PRINCIPAL,
+                                                             transferencia["destino"], 1, "benchmark")),
+         antes=preparar_transferencia, despues=deshacer_transferencia)
+    caso("actualizar_entrada",
+         lambda: database.actualizar_entrada(ultimo_id("entradas"), m["raro"], hoy, "BENCH-2", 3, "benchmark"),
+         antes=lambda: database.agregar_entrada(m["popular"], hoy, "BENCH-2", 3, ""),
+         despues=lambda: database.eliminar_entrada(ultimo_id("entradas")))
+
+    archivo = os.path.join(tempfile.gettempdir(), f"benchmark_importar_{os.getpid()}.csv")
+
+    def preparar_csv():
+        with open(archivo, "w", encoding="utf-8", newline="") as f:
+            f.write("nombre,fecha,factura,cantidad,comentario\n")
+            f.writelines(f"{m['popular']},{hoy},BENCH-CSV-{i},1,benchmark\n" for i in range(2000))
+
+    def borrar_importadas():
+        with database.transaccion() as conn:
+            conn.execute("DELETE FROM entradas WHERE factura LIKE 'BENCH-CSV-%'")
+        database._invalidar("entradas")
+        os.remove(archivo)
+
+    caso("importar_csv(2000)", lambda: database.importar_csv("entradas", archivo),
+         antes=preparar_csv, despues=borrar_importadas)
+    return lista
+
+
+def medir(database, repeticiones=5, solo=None, progreso=None):
+    """Cronometra cada caso `repeticiones` veces con la caché vacía y una vez
+    más con la caché llena. Devuelve {nombre: resultado}."""
+    resultados = {}
+    lista = [c for c in casos(database) if not solo or solo.lower() in c[0].lower()]
+    for i, (nombre, funcion, antes, despues) in enumerate(lista, start=1):
+        tiempos = []
+        for _ in range(repeticiones):
+            if antes:
+                antes()
+            database.limpiar_cache()
+            inicio = time.perf_counter()
+            valor = funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if despues:
+                despues()
+        resultado = {
+            "frio_ms": {"min": round(min(tiempos), 3), "mediana": round(statistics.median(tiempos), 3),
+                        "max": round(max(tiempos), 3)},
+            "filas": _filas(valor),
+        }
+        if not antes and not despues:
+            inicio = time.perf_counter()
+            funcion()
+            resultado["caliente_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+        resultados[nombre] = resultado
+        if progreso:
+            progreso(i, len(lista), nombre, resultado)
+    return resultados
+
+
+def informe(database, resultados, repeticiones):
+    conn = database.connect()
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+        },
+        "base": {
+            "archivo": database.DB_PATH,
+            "bytes": os.path.getsize(database.DB_PATH),
+            "version": database.version_esquema(),
+            "productos": conn.execute("SELECT COUNT(*) FROM productos").fetchone()[0],
+            "entradas": conn.execute("SELECT COUNT(*) FROM entradas").fetchone()[0],
+            "salidas": conn.execute("SELECT COUNT(*) FROM salidas").fetchone()[0],
+        },
+        "repeticiones": repeticiones,
+        "resultados": resultados,
+    }
+
+
+def comparar(actual, anterior, umbral=1.25, minimo_ms=1.0):
+    """Casos cuya mediana en frío empeoró más que `umbral` veces (y más de
+    `minimo_ms`, para no confundir ruido con regresiones)."""
+    regresiones = []
+    for nombre, resultado in actual["resultados"].items():
+        previo = anterior["resultados"].get(nombre)
+        if not previo:
+            continue
+        antes, ahora = previo["frio_ms"]["mediana"], resultado["frio_ms"]["mediana"]
+        if ahora - antes > minimo_ms and ahora > antes * umbral:
+            regresiones.append({"caso": nombre, "antes_ms": antes, "ahora_ms": ahora,
+                                "factor": round(ahora / antes, 2) if antes else None})
+    return regresiones
+
+
+# ---------------------------------------------------
+# Línea de comandos
+# ---------------------------------------------------
+def _crear_parser():
+    parser = argparse.ArgumentParser(description="Datos sintéticos y mediciones de rendimiento de database.py.")
+    comandos = parser.add_subparsers(dest="comando", required=True, metavar="COMANDO")
+
+    p = comandos.add_parser("generar", help="crear una base de datos sintética")
+    p.add_argument("db", help="archivo a crear (no debe existir)")
+    p.add_argument("--productos", type=int, default=2000)
+    p.add_argument("--movimientos", type=int, default=200000, help="entradas + salidas")
+    p.add_argument("--dias", type=int, default=1095, help="días de historia hasta hoy")
+    p.add_argument("--comentario", type=int, default=40, help="largo medio de los comentarios (0 = sin comentarios)")
+    p.add_argument("--salidas", type=float, default=0.3, help="proporción de movimientos que son salidas")
+    p.add_argument("--semilla", type=int, default=1)
+    p.add_argument("--ubicaciones", type=int, default=1, help="ubicaciones entre las que se reparten los movimientos")
+
+    p = comandos.add_parser("medir", help="cronometrar las consultas sobre una base")
+    p.add_argument("db")
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--solo", help="solo los casos cuyo nombre contiene este texto")
+    p.add_argument("--json", help="archivo de resultados (por defecto stdout)")
+    p.add_argument("--comparar", help="resultados anteriores para detectar regresiones")
+    p.add_argument("--umbral", type=float, default=1.25, help="factor de empeoramiento tolerado (1.25)")
+    return parser
+
+
+def main(argv=None):
+    args = _crear_parser().parse_args(argv)
+    if args.comando == "generar":
+        if os.path.exists(args.db):
+            print(f"{args.db} ya existe", file=sys.stderr)
+            return 2
+        open(args.db, "wb").close()  # vacío: database.py no copia la base de ejemplo
+    elif not os.path.exists(args.db):
+        print(f"{args.db} no existe", file=sys.stderr)
+        return 2
+    os.environ["INVENTARIO_DB"] = args.db
+
+    # Los print() de database.py van a stderr, stdout queda para el JSON
+    salida, sys.stdout = sys.stdout, sys.stderr
+    import database
+
+    if args.comando == "generar":
+        inicio = time.perf_counter()
+        resultado = generar_base(
+            database, args.productos, args.movimientos, args.dias, args.comentario, args.salidas, args.semilla,
+            progreso=lambda hechos, total: print(f"\r{hechos} de {total} movimientos", end="", file=sys.stderr),
+            ubicaciones=args.ubicaciones,
+        )
+        resultado["segundos"] = round(time.perf_counter() - inicio, 1)
+        print(file=sys.stderr)
+        salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        return 0
+
+    def mostrar(i, total, nombre, resultado):
+        print(f"[{i}/{total}] {nombre}: {resultado['frio_ms']['mediana']:.2f} ms", file=sys.stderr)
+
+    if database.migraciones_pendientes():
+        database.migrar()
+    resultados = medir(database, args.repeticiones, args.solo, progreso=mostrar)
+    actual = informe(database, resultados, args.repeticiones)
+    codigo = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            actual["regresiones"] = comparar(actual, json.load(f), args.umbral)
+        for r in actual["regresiones"]:
+            print(f"⚠️ {r['caso']}: {r['antes_ms']:.2f} -> {r['ahora_ms']:.2f} ms", file=sys.stderr)
+        codigo = REGRESION if actual["regresiones"] else 0
+
+    texto = json.dumps(actual, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        salida.write(texto + "\n")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# cli.py
+# ----------------------------------------------------
+# Línea de comandos para tareas programadas: importar, exportar, reportes
+# y mantenimiento sin abrir la interfaz gráfica (no importa Tk).
+#
+# Los resultados salen por stdout en JSON (o CSV / JSON lines al exportar)
+# y los mensajes por stderr. Códigos de salida:
+#   0 correcto, 1 error, 2 uso o datos de entrada inválidos,
+#   3 terminó pero con problemas (filas rechazadas, diferencias de stock)
+#
+#   python cli.py --db inventario.db importar entradas compras.csv
+#   python cli.py exportar stock --formato jsonl --desde 2025-01-01
+#   python cli.py inventario --al 2024-12-31
+#   python cli.py inventario --ubicacion "Bodega Norte"
+#   python cli.py transferir "Tornillo 6mm" Principal "Bodega Norte" 20
+#   python cli.py resumen --por mes --desde 2025-01-01 --hasta 2025-06-30
+# ----------------------------------------------------
+
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+CORRECTO = 0
+ERROR = 1
+USO = 2
+INCOMPLETO = 3
+
+
+def _crear_parser():
+    parser = argparse.ArgumentParser(prog="inventario", description="Sistema de Inventario sin interfaz gráfica.")
+    parser.add_argument("--db", help="archivo de base de datos (por defecto INVENTARIO_DB o la carpeta del usuario)")
+    comandos = parser.add_subparsers(dest="comando", required=True, metavar="COMANDO")
+
+    def rango(p):
+        p.add_argument("--desde", help="fecha inicial incluida (YYYY-mm-dd o dd-mm-YYYY)")
+        p.add_argument("--hasta", help="fecha final incluida")
+
+    p = comandos.add_parser("importar", help="importar movimientos desde un CSV")
+    p.add_argument("tabla", choices=("entradas", "salidas"))
+    p.add_argument("archivo")
+    p.add_argument("--lote", type=int, default=1000, help="filas por transacción (1000)")
+
+    p = comandos.add_parser("exportar", help="exportar una tabla en CSV o JSON lines")
+    p.add_argument("tabla", choices=("entradas", "salidas", "stock"))
+    p.add_argument("--formato", choices=("csv", "jsonl"), default="csv")
+    p.add_argument("--salida", help="archivo de destino (por defecto stdout)")
+    p.add_argument("--buscar", help="mismo texto que la barra de búsqueda")
+    p.add_argument("--orden", help="columna de orden (nombre, fecha, cantidad...)")
+    p.add_argument("--desc", action="store_true", help="orden descendente")
+    p.add_argument("--ubicacion", help="solo los movimientos o el stock de esta ubicación")
+    rango(p)
+
+    p = comandos.add_parser("inventario", help="stock por producto, actual o a una fecha")
+    p.add_argument("--al", help="stock al final de esta fecha (no se combina con --buscar, --desde ni --hasta)")
+    p.add_argument("--producto", help="solo este producto (nombre exacto)")
+    p.add_argument("--buscar", help="filtrar productos por nombre")
+    p.add_argument("--ubicacion", help="stock de esta ubicación (por defecto el total)")
+    rango(p)
+
+    comandos.add_parser("ubicaciones", help="listar las ubicaciones")
+
+    p = comandos.add_parser("transferir", help="mover stock de una ubicación a otra")
+    p.add_argument("producto")
+    p.add_argument("origen")
+    p.add_argument("destino")
+    p.add_argument("cantidad", type=int)
+    p.add_argument("--fecha", help="fecha de la transferencia (por defecto hoy)")
+    p.add_argument("--comentario", default="")
+
+    p = comandos.add_parser("resumen", help="entradas y salidas por producto, día, semana o mes")
+    p.add_argument("--por", choices=("producto", "dia", "semana", "mes"), default="mes")
+    p.add_argument("--producto", help="solo este producto")
+    rango(p)
+
+    comandos.add_parser("estado", help="ruta, versión del esquema y cantidad de filas")
+    comandos.add_parser("migrar", help="aplicar las migraciones pendientes")
+    comandos.add_parser("verificar", help="comparar la tabla stock con los movimientos")
+    comandos.add_parser("reconstruir", help="recalcular la tabla stock desde los movimientos")
+
+    p = comandos.add_parser("optimizar", help="actualizar estadísticas e índices")
+    p.add_argument("--vacuum", action="store_true", help="además compactar el archivo")
+
+    p = comandos.add_parser("respaldar", help="copiar la base de datos a otro archivo")
+    p.add_argument("destino")
+    return parser
+
+
+def _rango(args):
+    return (args.desde, args.hasta) if args.desde or args.hasta else None
+
+
+def _diferencias(diferencias):
+    return [{"producto": nombre, "guardado": guardado, "calculado": calculado}
+            for nombre, guardado, calculado in diferencias]
+
+
+def ejecutar(args, salida, database):
+    """Ejecuta el comando de `args` escribiendo el resultado en `salida`. Devuelve el código de salida."""
+
+    def escribir(valor):
+        salida.write(json.dumps(valor, ensure_ascii=False) + "\n")
+
+    comando = args.comando
+    if comando == "migrar":
+        escribir([{"version": v, "segundos": round(s, 3)} for v, s in database.migrar()])
+        return CORRECTO
+    if database.migraciones_pendientes():
+        database.migrar()
+
+    if comando == "importar":
+        resultado = database.importar_csv(args.tabla, args.archivo, tamano_lote=args.lote)
+        resultado["errores"] = [{"linea": linea, "motivo": motivo} for linea, motivo in resultado["errores"]]
+        escribir(resultado)
+        return INCOMPLETO if resultado["rechazadas"] else CORRECTO
+
+    if comando == "exportar":
+        opciones = dict(filtro=args.buscar, orden=args.orden, descendente=args.desc,
+                        rango=_rango(args), formato=args.formato, ubicacion=args.ubicacion)
+        if args.salida:
+            resultado = database.exportar_csv(args.tabla, args.salida, **opciones)
+            escribir({"archivo": os.path.abspath(args.salida), "filas": resultado["filas"]})
+        else:
+            database.escribir_filas(salida, args.tabla, **opciones)
+        return CORRECTO
+
+    if comando == "inventario":
+        if args.al and (args.buscar or _rango(args)):
+            # Un programador de tareas no debe recibir datos sin el filtro que pidió
+            print("inventario: --al no se combina con --buscar, --desde ni --hasta", file=sys.stderr)
+            return USO
+        if args.al:
+            filas = database.stock_al(args.al, args.producto, args.ubicacion)
+        else:
+            filas = [fila for lote in database.iterar_filas("stock", args.buscar, rango=_rango(args),
+                                                            ubicacion=args.ubicacion)
+                     for fila in lote]
+            if args.producto is not None:
+                nombre = database.normalizar_nombre(args.producto)
+                filas = [fila for fila in filas if fila[0] == nombre]
+        escribir([{"producto": nombre, "entradas": e, "salidas": s, "disponible": d}
+                  for nombre, e, s, d in filas])
+        return CORRECTO
+
+    if comando == "ubicaciones":
+        escribir([{"id": i, "nombre": nombre} for i, nombre in database.obtener_ubicaciones()])
+        return CORRECTO
+
+    if comando == "transferir":
+        fecha = args.fecha or date.today()
+        try:
+            transferencia = database.transferir(args.producto, fecha, args.origen, args.destino,
+                                                args.cantidad, args.comentario)
+        except database.StockInsuficiente as e:
+            print(f"inventario: {e}", file=sys.stderr)
+            return USO
+        escribir({"transferencia": transferencia, "producto": args.producto, "origen": args.origen,
+                  "destino": args.destino, "cantidad": args.cantidad})
+        return CORRECTO
+
+    if comando == "resumen":
+        clave = "producto" if args.por == "producto" else "periodo"
+        filas = database.resumen_periodo(args.por, args.desde, args.hasta, args.producto)
+        escribir([{clave: k, "entradas": e, "salidas": s} for k, e, s in filas])
+        return CORRECTO
+
+    if comando == "estado":
+        conn = database.connect()
+        escribir({
+            "db": database.DB_PATH,
+            "version": database.version_esquema(),
+            "bytes": os.path.getsize(database.DB_PATH),
+            "entradas": database.contar_filas("entradas"),
+            "salidas": database.contar_filas("salidas"),
+            "productos": conn.execute("SELECT COUNT(*) FROM productos").fetchone()[0],
+        })
+        return CORRECTO
+
+    if comando == "verificar":
+        diferencias = database.verificar_stock()
+        escribir(_diferencias(diferencias))
+        return INCOMPLETO if diferencias else CORRECTO
+
+    if comando == "reconstruir":
+        escribir({"corregidas": _diferencias(database.reconstruir_stock())})
+        return CORRECTO
+
+    if comando == "optimizar":
+        escribir(database.optimizar(vacuum=args.vacuum))
+        return CORRECTO
+
+    if comando == "respaldar":
+        escribir({"archivo": os.path.abspath(args.destino), "bytes": database.respaldar(args.destino)})
+        return CORRECTO
+    raise AssertionError(comando)
+
+
+def main(argv=None):
+    args = _crear_parser().parse_args(argv)
+    if args.db:
+        os.environ["INVENTARIO_DB"] = args.db
+
+    # stdout queda solo para el resultado; los print() de database.py
+    # (migraciones, avisos) van a stderr
+    salida = sys.stdout
+    salida.reconfigure(encoding="utf-8", newline="")
+    sys.stdout = sys.stderr
+    try:
+        import database
+        codigo = ejecutar(args, salida, database)
+        salida.flush()
+        return codigo
+    except BrokenPipeError:
+        # El lector cerró la tubería (p. ej. `| head`): no es un error nuestro
+        os.dup2(os.open(os.devnull, os.O_WRONLY), salida.fileno())
+        return CORRECTO
+    except (ValueError, FileNotFoundError) as e:
+        print(f"inventario: {e}", file=sys.stderr)
+        return USO
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"inventario: error: {e}", file=sys.stderr)
+        return ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
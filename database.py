@@ -3,6 +3,15 @@ import os
 import sys
 import sqlite3
 import shutil
+import atexit
+import threading
+import time
+import re
+import unicodedata
+import functools
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
 def resource_path(relative_path):
     """Devuelve ruta absoluta compatible con ejecutables PyInstaller."""
@@ -14,7 +23,21 @@ def resource_path(relative_path):
 
 
 # 📌 Ruta final donde se guardará la base de datos del usuario
-DB_PATH = os.path.expanduser("~\\AppData\\Local\\InventarioApp\\inventario.db")
+# INVENTARIO_DB permite elegir otro archivo (la línea de comandos la usa
+# para --db); si no, va en la carpeta de datos del usuario de cada sistema.
+def _ruta_base_datos():
+    if os.environ.get("INVENTARIO_DB"):
+        return os.path.abspath(os.path.expanduser(os.environ["INVENTARIO_DB"]))
+    if sys.platform == "win32":
+        return os.path.expanduser("~\\AppData\\Local\\InventarioApp\\inventario.db")
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "InventarioApp", "inventario.db")
+
+
+DB_PATH = _ruta_base_datos()
 
 # 📦 Copiar base de datos inicial si no existe
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
@@ -27,17 +50,353 @@ if not os.path.exists(DB_PATH):
 
 
 # 📚 Conexión a la base de datos
+# Cada hilo mantiene su propia conexión abierta durante toda la ejecución
+# (sqlite3 no permite compartir conexiones entre hilos). Las conexiones se
+# abren en modo autocommit y las escrituras se agrupan con transaccion().
+_local = threading.local()
+_conexiones = []
+_conexiones_lock = threading.Lock()
+
+CACHE_SENTENCIAS = 256          # sentencias preparadas cacheadas por conexión
+CACHE_PAGINAS_KB = 20000        # ~20 MB de caché de páginas por conexión
+TIMEOUT_BLOQUEO = 10.0          # segundos de espera si otra conexión escribe
+
+
+def _abrir_conexion():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=TIMEOUT_BLOQUEO,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=CACHE_SENTENCIAS,
+        factory=_ConexionMedida,
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_PAGINAS_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA busy_timeout = {int(TIMEOUT_BLOQUEO * 1000)}")
+    return conn
+
+
 def connect():
-    """Devuelve una conexión SQLite a la base de datos del sistema."""
-    return sqlite3.connect(DB_PATH)
+    """Devuelve la conexión SQLite persistente del hilo actual."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _abrir_conexion()
+        _local.conn = conn
+        _local.nivel = 0
+        with _conexiones_lock:
+            _conexiones.append(conn)
+    return conn
 
 
+@contextmanager
+def transaccion(modo="DEFERRED"):
+    """Agrupa varias sentencias en una transacción.
+
+    Hace COMMIT al salir y ROLLBACK si hay una excepción. Las transacciones
+    anidadas se convierten en SAVEPOINT. `modo` puede ser DEFERRED,
+    IMMEDIATE o EXCLUSIVE (solo aplica a la transacción externa).
+    """
+    conn = connect()
+    nivel = _local.nivel
+    if nivel == 0:
+        conn.execute(f"BEGIN {modo}")
+        cambios = conn.total_changes
+    else:
+        conn.execute(f"SAVEPOINT sp_{nivel}")
+    _local.nivel = nivel + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.nivel = nivel
+        # Tras un interrupt() o un error grave SQLite ya deshizo la
+        # transacción entera y un ROLLBACK más fallaría
+        if not conn.in_transaction:
+            pass
+        elif nivel == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp_{nivel}")
+            conn.execute(f"RELEASE sp_{nivel}")
+        raise
+    else:
+        _local.nivel = nivel
+        if nivel == 0:
+            propia = _anotar_escritura(conn) if conn.total_changes != cambios else None
+            try:
+                conn.execute("COMMIT")
+            except BaseException:
+                _olvidar_escritura(propia)
+                raise
+        else:
+            conn.execute(f"RELEASE sp_{nivel}")
+
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones abiertas (se llama al salir)."""
+    with _conexiones_lock:
+        while _conexiones:
+            try:
+                _conexiones.pop().close()
+            except sqlite3.Error:
+                pass
+    _local.__dict__.clear()
+    # Otra conexión puede abrir otra base (DB_PATH): nada de lo guardado sirve
+    with _generaciones_lock:
+        _escrituras["conocidas"].clear()
+        _escrituras["vista"] = None
+    _invalidar_todo()
+
+
+atexit.register(cerrar_conexiones)
+
+
+# 🔎 Diagnóstico de consultas
+# Las conexiones son _ConexionMedida: mientras el diagnóstico está activo
+# sus cursores miden cada sentencia (execute más los fetch de sus filas) y
+# suman veces, tiempo y filas por texto de SQL. Las que pasan de
+# UMBRAL_LENTA_MS quedan en un registro rotativo con sus parámetros; el
+# EXPLAIN QUERY PLAN se calcula al consultarlas, no en el camino de la
+# consulta. set_trace_callback no sirve para esto: avisa cuando empieza
+# una sentencia pero no cuánto tarda.
+# Viene apagado porque medir cada fetch encarece las lecturas grandes; se
+# enciende desde la ventana de diagnóstico o con INVENTARIO_DIAGNOSTICO=1.
+UMBRAL_LENTA_MS = 100.0         # más que esto se considera lenta
+LENTAS_GUARDADAS = 50           # registro rotativo de consultas lentas
+MAX_SENTENCIAS = 500            # textos de SQL distintos con contadores propios
+
+_traza = {
+    "activo": os.environ.get("INVENTARIO_DIAGNOSTICO", "0") == "1",
+    "umbral_ms": UMBRAL_LENTA_MS,
+    "desde": time.time(),
+    "sentencias": {},
+    "lentas": deque(maxlen=LENTAS_GUARDADAS),
+}
+_traza_lock = threading.Lock()
+
+
+def _normalizar_sql(sql):
+    """Texto de SQL en una línea; las listas de ? de largo variable cuentan como una."""
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return re.sub(r"\?(?: ?, ?\?)+", "?, …", sql)
+
+
+def _registrar_sentencia(sql, parametros, segundos, filas):
+    clave = _normalizar_sql(sql)
+    ms = segundos * 1000
+    with _traza_lock:
+        sentencias = _traza["sentencias"]
+        datos = sentencias.get(clave)
+        if datos is None:
+            if len(sentencias) >= MAX_SENTENCIAS:
+                clave = "(otras)"
+            datos = sentencias.setdefault(clave, {"veces": 0, "total_ms": 0.0, "max_ms": 0.0, "filas": 0})
+        datos["veces"] += 1
+        datos["total_ms"] += ms
+        datos["max_ms"] = max(datos["max_ms"], ms)
+        datos["filas"] += filas
+        if ms >= _traza["umbral_ms"]:
+            _traza["lentas"].append({
+                "hora": datetime.now().isoformat(timespec="seconds"),
+                "ms": round(ms, 1),
+                "filas": filas,
+                "hilo": threading.current_thread().name,
+                "sql": clave,
+                "_sql": sql,
+                "_parametros": parametros,
+            })
+
+
+class _CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia desde execute hasta que se leen sus filas.
+
+    La medición se cierra al agotar las filas, al ejecutar otra sentencia,
+    al cerrar el cursor o cuando se libera.
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self._medicion = None  # [sql, parametros, segundos, filas]
+
+    def _terminar(self):
+        if self._medicion is not None:
+            medicion, self._medicion = self._medicion, None
+            _registrar_sentencia(*medicion)
+
+    def _sumar(self, inicio, filas):
+        if self._medicion is not None:
+            self._medicion[2] += time.perf_counter() - inicio
+            self._medicion[3] += filas
+
+    def execute(self, sql, parametros=()):
+        self._terminar()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self._medicion = [sql, parametros, time.perf_counter() - inicio, 0]
+
+    def executemany(self, sql, secuencia):
+        self._terminar()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, secuencia)
+        finally:
+            # Sin parámetros: no hay un solo juego para el plan
+            self._medicion = [sql, None, time.perf_counter() - inicio, max(self.rowcount, 0)]
+            self._terminar()
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = super().fetchone()
+        self._sumar(inicio, fila is not None)
+        if fila is None:
+            self._terminar()
+        return fila
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        inicio = time.perf_counter()
+        filas = super().fetchmany(size)
+        self._sumar(inicio, len(filas))
+        if len(filas) < size:
+            self._terminar()
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = super().fetchall()
+        self._sumar(inicio, len(filas))
+        self._terminar()
+        return filas
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            fila = super().__next__()
+        except StopIteration:
+            self._terminar()
+            raise
+        self._sumar(inicio, 1)
+        return fila
+
+    def close(self):
+        self._terminar()
+        super().close()
+
+    def __del__(self):
+        self._terminar()
+
+
+class _ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de execute) se miden si el diagnóstico está activo."""
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = _CursorMedido if _traza["activo"] else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # sqlite3 no pasa por cursor() en estos atajos
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+
+def configurar_diagnostico(activo=None, umbral_ms=None):
+    """Activa o desactiva la medición y cambia el umbral de consulta lenta.
+
+    Afecta a los cursores que se creen desde ahora.
+    """
+    with _traza_lock:
+        if activo is not None:
+            _traza["activo"] = bool(activo)
+        if umbral_ms is not None:
+            _traza["umbral_ms"] = float(umbral_ms)
+
+
+def limpiar_diagnostico():
+    """Pone en cero los contadores y vacía el registro de consultas lentas."""
+    with _traza_lock:
+        _traza["sentencias"].clear()
+        _traza["lentas"].clear()
+        _traza["desde"] = time.time()
+
+
+def _plan_consulta(sql, parametros):
+    """Líneas de EXPLAIN QUERY PLAN, con sangría según el nivel."""
+    if parametros is None:
+        return ["(sin plan: sentencia con varios juegos de parámetros)"]
+    try:
+        # Cursor normal: el plan no se suma a las estadísticas
+        filas = connect().cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parametros).fetchall()
+    except sqlite3.Error as e:
+        return [f"(sin plan: {e})"]
+    niveles, lineas = {}, []
+    for id_, padre, _, detalle in filas:
+        niveles[id_] = niveles.get(padre, -1) + 1
+        lineas.append("  " * niveles[id_] + detalle)
+    return lineas
+
+
+def estadisticas_consultas(limite=20):
+    """Contadores del diagnóstico de consultas.
+
+    Devuelve un dict con el estado, el total de sentencias y de tiempo,
+    las `limite` sentencias que más tiempo sumaron (todas con None) y las
+    consultas lentas de la más nueva a la más vieja, con su plan.
+    """
+    with _traza_lock:
+        sentencias = [{"sql": sql, **datos} for sql, datos in _traza["sentencias"].items()]
+        lentas = list(_traza["lentas"])
+        resumen = {"activo": _traza["activo"], "umbral_ms": _traza["umbral_ms"],
+                   "desde": datetime.fromtimestamp(_traza["desde"]).isoformat(timespec="seconds")}
+    sentencias.sort(key=lambda d: d["total_ms"], reverse=True)
+    for lenta in lentas:
+        if "plan" not in lenta:
+            lenta["plan"] = _plan_consulta(lenta["_sql"], lenta["_parametros"])  # queda guardado
+    return {
+        **resumen,
+        "sentencias": sum(d["veces"] for d in sentencias),
+        "total_ms": round(sum(d["total_ms"] for d in sentencias), 1),
+        "mas_costosas": [{**d, "total_ms": round(d["total_ms"], 1), "max_ms": round(d["max_ms"], 1)}
+                         for d in sentencias[:limite]],
+        "lentas": [{k: v for k, v in lenta.items() if not k.startswith("_")} for lenta in reversed(lentas)],
+    }
+
+
+def volcar_diagnostico(ruta):
+    """Guarda en `ruta` (JSON) todo lo necesario para un reporte de soporte."""
+    import json
+    import platform
 
-def crear_tablas():
     conn = connect()
-    cur = conn.cursor()
+    pragmas = {p: conn.execute(f"PRAGMA {p}").fetchone()[0]
+               for p in ("page_size", "page_count", "freelist_count", "journal_mode", "cache_size")}
+    datos = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                    "plataforma": platform.platform()},
+        "base": {"archivo": DB_PATH, "bytes": os.path.getsize(DB_PATH), "version": version_esquema(),
+                 "pragmas": pragmas},
+        "consultas": estadisticas_consultas(limite=None),
+        "cache": estadisticas_cache(),
+    }
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    return ruta
+
 
-    cur.execute("""
+# 🧱 Migraciones del esquema
+# La versión aplicada se guarda en PRAGMA user_version. Cada migración se
+# ejecuta en su propia transacción junto con el cambio de versión, así una
+# actualización interrumpida se reintenta completa en el próximo arranque.
+def _migracion_1(conn):
+    """Tablas base de entradas y salidas"""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS entradas (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             nombre TEXT,
@@ -48,7 +407,7 @@ def crear_tablas():
         )
     """)
 
-    cur.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS salidas (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             nombre TEXT,
@@ -60,116 +419,2320 @@ def crear_tablas():
         )
     """)
 
-    conn.commit()
-    conn.close()
 
-# Funciones de CRUD Entradas
-def agregar_entrada(nombre, fecha, factura, cantidad, comentario):
+def _migracion_2(conn):
+    """Índices para búsquedas por nombre, factura y fecha"""
+    # (nombre, cantidad) cubre los SUM ... GROUP BY nombre sin leer la tabla
+    # y también sirve para cualquier búsqueda por nombre.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_nombre_cantidad ON entradas(nombre, cantidad)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_nombre_cantidad ON salidas(nombre, cantidad)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_factura ON entradas(factura)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_fecha ON entradas(fecha)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_fecha ON salidas(fecha)")
+    conn.execute("ANALYZE")
+
+
+# Triggers que mantenían la tabla stock por nombre (esquema 3 a 5). {tabla}
+# es entradas o salidas y {total} la columna acumulada que le corresponde.
+_TRIGGERS_STOCK_NOMBRE = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_insert AFTER INSERT ON {tabla}
+    WHEN NEW.nombre IS NOT NULL
+    BEGIN
+        INSERT INTO stock (nombre, {total}, disponible, movimientos)
+        VALUES (NEW.nombre, IFNULL(NEW.cantidad, 0), {signo} IFNULL(NEW.cantidad, 0), 1)
+        ON CONFLICT(nombre) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_delete AFTER DELETE ON {tabla}
+    WHEN OLD.nombre IS NOT NULL
+    BEGIN
+        UPDATE stock SET
+            {total} = {total} - IFNULL(OLD.cantidad, 0),
+            disponible = disponible - ({signo} IFNULL(OLD.cantidad, 0)),
+            movimientos = movimientos - 1
+        WHERE nombre = OLD.nombre;
+        DELETE FROM stock WHERE nombre = OLD.nombre AND movimientos <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_update AFTER UPDATE OF nombre, cantidad ON {tabla}
+    BEGIN
+        UPDATE stock SET
+            {total} = {total} - IFNULL(OLD.cantidad, 0),
+            disponible = disponible - ({signo} IFNULL(OLD.cantidad, 0)),
+            movimientos = movimientos - 1
+        WHERE nombre = OLD.nombre;
+        INSERT INTO stock (nombre, {total}, disponible, movimientos)
+        SELECT NEW.nombre, IFNULL(NEW.cantidad, 0), {signo} IFNULL(NEW.cantidad, 0), 1
+        WHERE NEW.nombre IS NOT NULL
+        ON CONFLICT(nombre) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+        DELETE FROM stock WHERE nombre = OLD.nombre AND movimientos <= 0;
+    END;
+"""
+
+# Stock por nombre calculado desde los movimientos (esquema 3 a 5)
+_SQL_STOCK_POR_NOMBRE = """
+    SELECT nombre, SUM(e), SUM(s), SUM(e) - SUM(s), SUM(n)
+    FROM (
+        SELECT nombre, IFNULL(cantidad, 0) AS e, 0 AS s, 1 AS n
+        FROM entradas WHERE nombre IS NOT NULL
+        UNION ALL
+        SELECT nombre, 0, IFNULL(cantidad, 0), 1
+        FROM salidas WHERE nombre IS NOT NULL
+    )
+    GROUP BY nombre
+"""
+
+
+def _migracion_3(conn):
+    """Tabla stock mantenida por triggers"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock (
+            nombre TEXT PRIMARY KEY,
+            total_entradas INTEGER NOT NULL DEFAULT 0,
+            total_salidas INTEGER NOT NULL DEFAULT 0,
+            disponible INTEGER NOT NULL DEFAULT 0,
+            movimientos INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    for tabla, total, signo in (("entradas", "total_entradas", ""), ("salidas", "total_salidas", "-")):
+        for sentencia in _TRIGGERS_STOCK_NOMBRE.format(tabla=tabla, total=total, signo=signo).split("END;"):
+            if sentencia.strip():
+                conn.execute(sentencia + "END;")
+    conn.execute("DELETE FROM stock")
+    conn.execute(f"""
+        INSERT INTO stock (nombre, total_entradas, total_salidas, disponible, movimientos)
+        {_SQL_STOCK_POR_NOMBRE}
+    """)
+
+
+# 📅 Fechas
+# Las fechas se guardan siempre como texto ISO 'YYYY-mm-dd', que ordena
+# igual que la fecha real y permite usar el índice en ORDER BY y rangos.
+_FORMATOS_FECHA = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d.%m.%Y")
+
+
+def normalizar_fecha(valor):
+    """Convierte una fecha (date, datetime o texto) al formato 'YYYY-mm-dd'.
+
+    Lanza ValueError si el texto no corresponde a ningún formato conocido.
+    """
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor or "").strip()
+    # Descartar la hora si viene incluida ('2025-10-09 14:30:00')
+    texto = texto.split(" ")[0].split("T")[0]
+    for fmt in _FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no reconocida: {valor!r}")
+
+
+def _migracion_4(conn):
+    """Fechas ISO, cantidades enteras e índices para cada columna ordenable"""
+    for tabla in ("entradas", "salidas"):
+        pendientes = conn.execute(f"""
+            SELECT id, fecha FROM {tabla}
+            WHERE fecha IS NULL OR fecha NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+        """).fetchall()
+        corregidas = []
+        for id_fila, fecha in pendientes:
+            try:
+                corregidas.append((normalizar_fecha(fecha), id_fila))
+            except ValueError:
+                print(f"⚠️ {tabla} #{id_fila}: fecha no reconocida {fecha!r}, se deja igual")
+        conn.executemany(f"UPDATE {tabla} SET fecha = ? WHERE id = ?", corregidas)
+        # Los valores NULL no se pueden comparar en la paginación por cursor
+        conn.execute(f"""
+            UPDATE {tabla} SET cantidad = IFNULL(CAST(cantidad AS INTEGER), 0)
+            WHERE typeof(cantidad) <> 'integer'
+        """)
+        for col in ("nombre", "fecha", "comentario") + (("factura",) if tabla == "entradas" else ("estado", "destino")):
+            conn.execute(f"UPDATE {tabla} SET {col} = '' WHERE {col} IS NULL")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_nombre_nocase ON entradas(nombre COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_factura_nocase ON entradas(factura COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entradas_cantidad ON entradas(cantidad)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_nombre_nocase ON salidas(nombre COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_estado_nocase ON salidas(estado COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_destino_nocase ON salidas(destino COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_cantidad ON salidas(cantidad)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_nombre_nocase ON stock(nombre COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_total_entradas ON stock(total_entradas)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_total_salidas ON stock(total_salidas)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_disponible ON stock(disponible)")
+    conn.execute("ANALYZE")
+
+
+# Índices de texto completo sincronizados con la tabla por triggers.
+# {vigiladas} son las columnas de la tabla cuyo cambio reindexa la fila.
+_TRIGGERS_FTS = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_insert AFTER INSERT ON {tabla} BEGIN
+        INSERT INTO {tabla}_fts (rowid, {columnas}) VALUES (NEW.id, {nuevos});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_delete AFTER DELETE ON {tabla} BEGIN
+        INSERT INTO {tabla}_fts ({tabla}_fts, rowid, {columnas}) VALUES ('delete', OLD.id, {viejos});
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_update AFTER UPDATE OF {vigiladas} ON {tabla} BEGIN
+        INSERT INTO {tabla}_fts ({tabla}_fts, rowid, {columnas}) VALUES ('delete', OLD.id, {viejos});
+        INSERT INTO {tabla}_fts (rowid, {columnas}) VALUES (NEW.id, {nuevos});
+    END;
+"""
+
+
+def _migracion_5(conn):
+    """Búsqueda de texto completo (FTS5) en entradas y salidas"""
+    for tabla, columnas in (("entradas", ("nombre", "factura", "comentario")),
+                            ("salidas", ("nombre", "destino"))):
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {tabla}_fts USING fts5(
+                {", ".join(columnas)},
+                content='{tabla}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        triggers = _TRIGGERS_FTS.format(
+            tabla=tabla,
+            columnas=", ".join(columnas),
+            vigiladas=", ".join(columnas),
+            nuevos=", ".join(f"NEW.{c}" for c in columnas),
+            viejos=", ".join(f"OLD.{c}" for c in columnas),
+        )
+        for sentencia in triggers.split("END;"):
+            if sentencia.strip():
+                conn.execute(sentencia + "END;")
+        conn.execute(f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')")
+
+
+# 🏷️ Productos
+# Cada producto tiene un id entero; entradas, salidas y stock lo referencian
+# por producto_id en lugar de repetir el nombre. El nombre es único sin
+# distinguir mayúsculas y se guarda sin espacios de más.
+def normalizar_nombre(nombre):
+    """Nombre de producto sin espacios al inicio, al final ni repetidos."""
+    return " ".join(str(nombre or "").split())
+
+
+# Triggers que mantienen la tabla stock al día. {tabla} es entradas o
+# salidas y {total} la columna acumulada que le corresponde; {nuevo} y
+# {viejo} son condiciones WHEN opcionales sobre la fila (migración 9).
+_TRIGGERS_STOCK = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_insert AFTER INSERT ON {tabla} {nuevo}
+    BEGIN
+        INSERT INTO stock (producto_id, {total}, disponible, movimientos)
+        VALUES (NEW.producto_id, NEW.cantidad, {signo} NEW.cantidad, 1)
+        ON CONFLICT(producto_id) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_delete AFTER DELETE ON {tabla} {viejo}
+    BEGIN
+        UPDATE stock SET
+            {total} = {total} - OLD.cantidad,
+            disponible = disponible - ({signo} OLD.cantidad),
+            movimientos = movimientos - 1
+        WHERE producto_id = OLD.producto_id;
+        DELETE FROM stock WHERE producto_id = OLD.producto_id AND movimientos <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_update AFTER UPDATE OF producto_id, cantidad ON {tabla} {viejo}
+    BEGIN
+        UPDATE stock SET
+            {total} = {total} - OLD.cantidad,
+            disponible = disponible - ({signo} OLD.cantidad),
+            movimientos = movimientos - 1
+        WHERE producto_id = OLD.producto_id;
+        INSERT INTO stock (producto_id, {total}, disponible, movimientos)
+        VALUES (NEW.producto_id, NEW.cantidad, {signo} NEW.cantidad, 1)
+        ON CONFLICT(producto_id) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+        DELETE FROM stock WHERE producto_id = OLD.producto_id AND movimientos <= 0;
+    END;
+"""
+
+# Recalcula stock desde cero a partir de los movimientos ({where} deja
+# fuera las transferencias desde la migración 9)
+_SQL_STOCK_DESDE_MOVIMIENTOS = """
+    SELECT producto_id, SUM(e), SUM(s), SUM(e) - SUM(s), SUM(n)
+    FROM (
+        SELECT producto_id, cantidad AS e, 0 AS s, 1 AS n FROM entradas {where}
+        UNION ALL
+        SELECT producto_id, 0, cantidad, 1 FROM salidas {where}
+    )
+    GROUP BY producto_id
+"""
+
+# Renombrar un producto reindexa sus movimientos en la búsqueda de texto
+_TRIGGER_FTS_PRODUCTOS = """
+    CREATE TRIGGER IF NOT EXISTS trg_productos_fts_update AFTER UPDATE OF nombre ON productos BEGIN
+        INSERT INTO entradas_fts (entradas_fts, rowid, nombre, factura, comentario)
+            SELECT 'delete', id, OLD.nombre, factura, comentario FROM entradas WHERE producto_id = OLD.id;
+        INSERT INTO entradas_fts (rowid, nombre, factura, comentario)
+            SELECT id, NEW.nombre, factura, comentario FROM entradas WHERE producto_id = NEW.id;
+        INSERT INTO salidas_fts (salidas_fts, rowid, nombre, destino)
+            SELECT 'delete', id, OLD.nombre, destino FROM salidas WHERE producto_id = OLD.id;
+        INSERT INTO salidas_fts (rowid, nombre, destino)
+            SELECT id, NEW.nombre, destino FROM salidas WHERE producto_id = NEW.id;
+    END;
+"""
+
+
+def _ejecutar_triggers(conn, sql):
+    for sentencia in sql.split("END;"):
+        if sentencia.strip():
+            conn.execute(sentencia + "END;")
+
+
+def _migracion_6(conn):
+    """Tabla de productos: entradas, salidas y stock por id de producto"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            sku TEXT UNIQUE,
+            unidad TEXT
+        )
+    """)
+
+    # Un producto por nombre sin distinguir mayúsculas ni espacios; la
+    # grafía más usada queda como nombre del producto
+    usos = {}
+    for nombre, veces in conn.execute("""
+        SELECT nombre, COUNT(*) FROM (SELECT nombre FROM entradas UNION ALL SELECT nombre FROM salidas)
+        GROUP BY nombre
+    """):
+        limpio = normalizar_nombre(nombre)
+        usos[limpio] = usos.get(limpio, 0) + veces
+    conn.executemany("INSERT OR IGNORE INTO productos (nombre) VALUES (?)",
+                     [(n,) for n in sorted(usos, key=lambda n: -usos[n])])
+    conn.execute("CREATE TEMP TABLE mapa_productos (nombre TEXT PRIMARY KEY, producto_id INTEGER NOT NULL)")
+    conn.execute("""
+        INSERT INTO mapa_productos (nombre, producto_id)
+        SELECT DISTINCT m.nombre, 0 FROM (SELECT nombre FROM entradas UNION SELECT nombre FROM salidas) AS m
+    """)
+    for (nombre,) in conn.execute("SELECT nombre FROM mapa_productos").fetchall():
+        producto_id = conn.execute("SELECT id FROM productos WHERE nombre = ?",
+                                   (normalizar_nombre(nombre),)).fetchone()[0]
+        conn.execute("UPDATE mapa_productos SET producto_id = ? WHERE nombre = ?", (producto_id, nombre))
+
+    secuencias = dict(conn.execute("SELECT name, seq FROM sqlite_sequence"))
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"DROP TABLE IF EXISTS {tabla}_fts")
+    conn.execute("DROP TABLE stock")
+    conn.execute("""
+        CREATE TABLE entradas_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            fecha TEXT NOT NULL DEFAULT '',
+            factura TEXT NOT NULL DEFAULT '',
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            comentario TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    conn.execute("""
+        INSERT INTO entradas_nueva (id, producto_id, fecha, factura, cantidad, comentario)
+        SELECT e.id, m.producto_id, e.fecha, e.factura, e.cantidad, e.comentario
+        FROM entradas AS e JOIN mapa_productos AS m ON m.nombre = e.nombre
+    """)
+    conn.execute("""
+        CREATE TABLE salidas_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            fecha TEXT NOT NULL DEFAULT '',
+            estado TEXT NOT NULL DEFAULT '',
+            destino TEXT NOT NULL DEFAULT '',
+            cantidad INTEGER NOT NULL DEFAULT 0,
+            comentario TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    conn.execute("""
+        INSERT INTO salidas_nueva (id, producto_id, fecha, estado, destino, cantidad, comentario)
+        SELECT s.id, m.producto_id, s.fecha, s.estado, s.destino, s.cantidad, s.comentario
+        FROM salidas AS s JOIN mapa_productos AS m ON m.nombre = s.nombre
+    """)
+    conn.execute("DROP TABLE mapa_productos")
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"DROP TABLE {tabla}")
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"ALTER TABLE {tabla}_nueva RENAME TO {tabla}")
+        # Conservar la secuencia para no reutilizar ids de filas borradas
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (tabla,))
+        conn.execute(f"INSERT INTO sqlite_sequence (name, seq) SELECT ?, MAX(?, IFNULL(MAX(id), 0)) FROM {tabla}",
+                     (tabla, secuencias.get(tabla, 0)))
+
+    conn.execute("CREATE INDEX idx_entradas_producto ON entradas(producto_id)")
+    conn.execute("CREATE INDEX idx_entradas_fecha ON entradas(fecha)")
+    conn.execute("CREATE INDEX idx_entradas_factura ON entradas(factura)")
+    conn.execute("CREATE INDEX idx_entradas_factura_nocase ON entradas(factura COLLATE NOCASE)")
+    conn.execute("CREATE INDEX idx_entradas_cantidad ON entradas(cantidad)")
+    conn.execute("CREATE INDEX idx_salidas_producto ON salidas(producto_id)")
+    conn.execute("CREATE INDEX idx_salidas_fecha ON salidas(fecha)")
+    conn.execute("CREATE INDEX idx_salidas_estado_nocase ON salidas(estado COLLATE NOCASE)")
+    conn.execute("CREATE INDEX idx_salidas_destino_nocase ON salidas(destino COLLATE NOCASE)")
+    conn.execute("CREATE INDEX idx_salidas_cantidad ON salidas(cantidad)")
+
+    conn.execute("""
+        CREATE TABLE stock (
+            producto_id INTEGER PRIMARY KEY REFERENCES productos(id),
+            total_entradas INTEGER NOT NULL DEFAULT 0,
+            total_salidas INTEGER NOT NULL DEFAULT 0,
+            disponible INTEGER NOT NULL DEFAULT 0,
+            movimientos INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO stock (producto_id, total_entradas, total_salidas, disponible, movimientos)
+        {_SQL_STOCK_DESDE_MOVIMIENTOS.format(where="")}
+    """)
+    conn.execute("CREATE INDEX idx_stock_total_entradas ON stock(total_entradas)")
+    conn.execute("CREATE INDEX idx_stock_total_salidas ON stock(total_salidas)")
+    conn.execute("CREATE INDEX idx_stock_disponible ON stock(disponible)")
+    for tabla, total, signo in (("entradas", "total_entradas", ""), ("salidas", "total_salidas", "-")):
+        _ejecutar_triggers(conn, _TRIGGERS_STOCK.format(tabla=tabla, total=total, signo=signo, nuevo="", viejo=""))
+
+    # La búsqueda de texto indexa el nombre del producto junto con el resto
+    # de columnas; el contenido se lee de una vista con el JOIN
+    for tabla, columnas in (("entradas", ("factura", "comentario")), ("salidas", ("destino",))):
+        conn.execute(f"""
+            CREATE VIEW {tabla}_texto AS
+            SELECT t.id, p.nombre, {", ".join(f"t.{c}" for c in columnas)}
+            FROM {tabla} AS t JOIN productos AS p ON p.id = t.producto_id
+        """)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE {tabla}_fts USING fts5(
+                nombre, {", ".join(columnas)},
+                content='{tabla}_texto', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        nombre = "(SELECT nombre FROM productos WHERE id = {}.producto_id)"
+        _ejecutar_triggers(conn, _TRIGGERS_FTS.format(
+            tabla=tabla,
+            columnas=", ".join(("nombre",) + columnas),
+            vigiladas=", ".join(("producto_id",) + columnas),
+            nuevos=", ".join([nombre.format("NEW")] + [f"NEW.{c}" for c in columnas]),
+            viejos=", ".join([nombre.format("OLD")] + [f"OLD.{c}" for c in columnas]),
+        ))
+        conn.execute(f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')")
+    _ejecutar_triggers(conn, _TRIGGER_FTS_PRODUCTOS)
+    conn.execute("ANALYZE")
+
+
+def _migracion_7(conn):
+    """Índices por fecha y producto para rangos y resúmenes por período"""
+    # (fecha, producto_id, cantidad) cubre los totales de un rango de fechas
+    # y (producto_id, fecha, cantidad) los de cada producto en ese rango,
+    # ya agrupados en el orden del índice.
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_fecha_producto ON {tabla}(fecha, producto_id, cantidad)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_producto_fecha ON {tabla}(producto_id, fecha, cantidad)")
+    conn.execute("ANALYZE")
+
+
+# Un movimiento con fecha anterior a un cierre lo deja desactualizado; se
+# recalcula en la misma transacción que escribe el movimiento (ver
+# _actualizar_cierres).
+_TRIGGERS_CIERRES = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cierres_insert AFTER INSERT ON {tabla} BEGIN
+        UPDATE cierres SET valido = 0 WHERE fecha >= NEW.fecha AND valido;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cierres_delete AFTER DELETE ON {tabla} BEGIN
+        UPDATE cierres SET valido = 0 WHERE fecha >= OLD.fecha AND valido;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cierres_update AFTER UPDATE OF producto_id, fecha, cantidad ON {tabla}
+    BEGIN
+        UPDATE cierres SET valido = 0 WHERE fecha >= MIN(OLD.fecha, NEW.fecha) AND valido;
+    END;
+"""
+
+
+def _migracion_8(conn):
+    """Cierres mensuales de stock para consultar el stock a una fecha"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cierres (
+            fecha TEXT PRIMARY KEY,
+            valido INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_cierre (
+            fecha TEXT NOT NULL,
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            total_entradas INTEGER NOT NULL,
+            total_salidas INTEGER NOT NULL,
+            PRIMARY KEY (fecha, producto_id)
+        ) WITHOUT ROWID
+    """)
+    for tabla in ("entradas", "salidas"):
+        _ejecutar_triggers(conn, _TRIGGERS_CIERRES.format(tabla=tabla))
+
+
+# Stock por ubicación, mantenido igual que la tabla stock pero por
+# (ubicacion_id, producto_id); mover un movimiento de ubicación lo resta
+# de la vieja y lo suma a la nueva.
+_TRIGGERS_STOCK_UBICACION = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_ubicacion_insert AFTER INSERT ON {tabla}
+    BEGIN
+        INSERT INTO stock_ubicacion (ubicacion_id, producto_id, {total}, disponible, movimientos)
+        VALUES (NEW.ubicacion_id, NEW.producto_id, NEW.cantidad, {signo} NEW.cantidad, 1)
+        ON CONFLICT(ubicacion_id, producto_id) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_ubicacion_delete AFTER DELETE ON {tabla}
+    BEGIN
+        UPDATE stock_ubicacion SET
+            {total} = {total} - OLD.cantidad,
+            disponible = disponible - ({signo} OLD.cantidad),
+            movimientos = movimientos - 1
+        WHERE ubicacion_id = OLD.ubicacion_id AND producto_id = OLD.producto_id;
+        DELETE FROM stock_ubicacion
+        WHERE ubicacion_id = OLD.ubicacion_id AND producto_id = OLD.producto_id AND movimientos <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_stock_ubicacion_update
+    AFTER UPDATE OF producto_id, ubicacion_id, cantidad ON {tabla}
+    BEGIN
+        UPDATE stock_ubicacion SET
+            {total} = {total} - OLD.cantidad,
+            disponible = disponible - ({signo} OLD.cantidad),
+            movimientos = movimientos - 1
+        WHERE ubicacion_id = OLD.ubicacion_id AND producto_id = OLD.producto_id;
+        INSERT INTO stock_ubicacion (ubicacion_id, producto_id, {total}, disponible, movimientos)
+        VALUES (NEW.ubicacion_id, NEW.producto_id, NEW.cantidad, {signo} NEW.cantidad, 1)
+        ON CONFLICT(ubicacion_id, producto_id) DO UPDATE SET
+            {total} = {total} + excluded.{total},
+            disponible = disponible + excluded.disponible,
+            movimientos = movimientos + 1;
+        DELETE FROM stock_ubicacion
+        WHERE ubicacion_id = OLD.ubicacion_id AND producto_id = OLD.producto_id AND movimientos <= 0;
+    END;
+"""
+
+# Stock por ubicación calculado desde los movimientos
+_SQL_STOCK_UBICACION_DESDE_MOVIMIENTOS = """
+    SELECT ubicacion_id, producto_id, SUM(e), SUM(s), SUM(e) - SUM(s), SUM(n)
+    FROM (
+        SELECT ubicacion_id, producto_id, cantidad AS e, 0 AS s, 1 AS n FROM entradas
+        UNION ALL
+        SELECT ubicacion_id, producto_id, 0, cantidad, 1 FROM salidas
+    )
+    GROUP BY ubicacion_id, producto_id
+"""
+
+# Los cierres por ubicación también quedan desactualizados si un
+# movimiento cambia de ubicación (reemplaza al trigger de la migración 8)
+_TRIGGER_CIERRES_UBICACION = """
+    CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cierres_update
+    AFTER UPDATE OF producto_id, fecha, cantidad, ubicacion_id ON {tabla}
+    BEGIN
+        UPDATE cierres SET valido = 0 WHERE fecha >= MIN(OLD.fecha, NEW.fecha) AND valido;
+    END;
+"""
+
+# Una transferencia solo mueve stock entre ubicaciones: sus dos mitades
+# cuentan en el stock de cada ubicación, pero no en los totales generales
+# (tabla stock, períodos, cierres y resúmenes), que se filtran con esto.
+_SIN_TRANSFERENCIAS = "transferencia_id IS NULL"
+
+# Las dos mitades de una transferencia se borran juntas
+_TRIGGERS_TRANSFERENCIAS = """
+    CREATE TRIGGER IF NOT EXISTS trg_entradas_transferencia_delete AFTER DELETE ON entradas
+    WHEN OLD.transferencia_id IS NOT NULL
+    BEGIN
+        DELETE FROM salidas WHERE transferencia_id = OLD.transferencia_id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_salidas_transferencia_delete AFTER DELETE ON salidas
+    WHEN OLD.transferencia_id IS NOT NULL
+    BEGIN
+        DELETE FROM entradas WHERE transferencia_id = OLD.transferencia_id;
+    END;
+"""
+
+
+def _migracion_9(conn):
+    """Ubicaciones: stock por ubicación y transferencias entre ellas"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ubicaciones (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+    """)
+    # Todo lo registrado hasta ahora queda en la ubicación 1
+    conn.execute("INSERT OR IGNORE INTO ubicaciones (id, nombre) VALUES (1, 'Principal')")
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN ubicacion_id INTEGER NOT NULL DEFAULT 1 REFERENCES ubicaciones(id)")
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN transferencia_id INTEGER")
+        # Como los índices de la migración 7, pero dentro de una ubicación:
+        # (producto, fecha) para el stock de un producto a una fecha y
+        # (fecha, producto) para los totales de un período
+        conn.execute(f"""CREATE INDEX IF NOT EXISTS idx_{tabla}_ubicacion_producto_fecha
+                         ON {tabla}(ubicacion_id, producto_id, fecha, cantidad)""")
+        conn.execute(f"""CREATE INDEX IF NOT EXISTS idx_{tabla}_ubicacion_fecha_producto
+                         ON {tabla}(ubicacion_id, fecha, producto_id, cantidad)""")
+        conn.execute(f"""CREATE INDEX IF NOT EXISTS idx_{tabla}_transferencia
+                         ON {tabla}(transferencia_id) WHERE transferencia_id IS NOT NULL""")
+        # Los índices de la migración 7 llevan también transferencia_id, para
+        # que los totales sin transferencias se sigan leyendo solo del índice
+        for indice, columnas in (("fecha_producto", "fecha, producto_id"), ("producto_fecha", "producto_id, fecha")):
+            conn.execute(f"DROP INDEX IF EXISTS idx_{tabla}_{indice}")
+            conn.execute(f"CREATE INDEX idx_{tabla}_{indice} ON {tabla}({columnas}, cantidad, transferencia_id)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_ubicacion (
+            ubicacion_id INTEGER NOT NULL REFERENCES ubicaciones(id),
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            total_entradas INTEGER NOT NULL DEFAULT 0,
+            total_salidas INTEGER NOT NULL DEFAULT 0,
+            disponible INTEGER NOT NULL DEFAULT 0,
+            movimientos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (ubicacion_id, producto_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        INSERT INTO stock_ubicacion (ubicacion_id, producto_id, total_entradas, total_salidas, disponible, movimientos)
+        {_SQL_STOCK_UBICACION_DESDE_MOVIMIENTOS}
+    """)
+    # "Todo el stock de una ubicación" ordenado por cualquier columna de la
+    # pestaña, y "dónde está un producto"
+    conn.execute("CREATE INDEX idx_stock_ubicacion_entradas ON stock_ubicacion(ubicacion_id, total_entradas)")
+    conn.execute("CREATE INDEX idx_stock_ubicacion_salidas ON stock_ubicacion(ubicacion_id, total_salidas)")
+    conn.execute("CREATE INDEX idx_stock_ubicacion_disponible ON stock_ubicacion(ubicacion_id, disponible)")
+    conn.execute("CREATE INDEX idx_stock_ubicacion_producto ON stock_ubicacion(producto_id, ubicacion_id, disponible)")
+    for tabla, total, signo in (("entradas", "total_entradas", ""), ("salidas", "total_salidas", "-")):
+        _ejecutar_triggers(conn, _TRIGGERS_STOCK_UBICACION.format(tabla=tabla, total=total, signo=signo))
+        # La tabla stock deja fuera las transferencias
+        for accion in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{tabla}_stock_{accion}")
+        _ejecutar_triggers(conn, _TRIGGERS_STOCK.format(
+            tabla=tabla, total=total, signo=signo,
+            nuevo=f"WHEN NEW.{_SIN_TRANSFERENCIAS}", viejo=f"WHEN OLD.{_SIN_TRANSFERENCIAS}"))
+    _ejecutar_triggers(conn, _TRIGGERS_TRANSFERENCIAS)
+
+    # Cierres mensuales por ubicación; los existentes se recalculan con ellos
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_cierre_ubicacion (
+            fecha TEXT NOT NULL,
+            ubicacion_id INTEGER NOT NULL REFERENCES ubicaciones(id),
+            producto_id INTEGER NOT NULL REFERENCES productos(id),
+            total_entradas INTEGER NOT NULL,
+            total_salidas INTEGER NOT NULL,
+            PRIMARY KEY (fecha, ubicacion_id, producto_id)
+        ) WITHOUT ROWID
+    """)
+    for tabla in ("entradas", "salidas"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{tabla}_cierres_update")
+        _ejecutar_triggers(conn, _TRIGGER_CIERRES_UBICACION.format(tabla=tabla))
+    conn.execute("UPDATE cierres SET valido = 0")
+    _actualizar_cierres(conn)
+    # Los índices por ubicación de entradas y salidas quedan sin
+    # estadísticas: hoy todo está en la principal y con esos números el
+    # planificador no los usaría para las ubicaciones nuevas. Las toman en
+    # el próximo optimizar(), ya con movimientos repartidos. Los de la
+    # migración 7, recreados, recuperan las suyas.
+    conn.execute("ANALYZE stock_ubicacion")
+    for tabla in ("entradas", "salidas"):
+        for indice in ("fecha_producto", "producto_fecha"):
+            conn.execute(f"ANALYZE idx_{tabla}_{indice}")
+
+
+def _migracion_10(conn):
+    """Contador de escrituras para distinguir las de otros procesos"""
+    # Una sola fila; ver _anotar_escritura y _revisar_escrituras
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS escrituras (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            n INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO escrituras (id, n) VALUES (1, 0)")
+
+
+MIGRACIONES = [
+    (1, _migracion_1),
+    (2, _migracion_2),
+    (3, _migracion_3),
+    (4, _migracion_4),
+    (5, _migracion_5),
+    (6, _migracion_6),
+    (7, _migracion_7),
+    (8, _migracion_8),
+    (9, _migracion_9),
+    (10, _migracion_10),
+]
+
+
+def version_esquema():
+    """Versión del esquema guardada en la base de datos."""
+    return connect().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migraciones_pendientes():
+    """Lista de (version, descripcion) que faltan por aplicar."""
+    actual = version_esquema()
+    return [(v, fn.__doc__) for v, fn in MIGRACIONES if v > actual]
+
+
+def migrar(progreso=None):
+    """Aplica las migraciones pendientes y devuelve [(version, segundos), ...].
+
+    `progreso(version, descripcion)` se llama antes de cada migración; puede
+    usarse desde un hilo secundario para informar a la interfaz.
+    """
+    aplicadas = []
+    for version, fn in MIGRACIONES:
+        with transaccion("IMMEDIATE") as conn:
+            # Se relee dentro del bloqueo por si otro proceso ya migró
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            if progreso:
+                progreso(version, fn.__doc__)
+            inicio = time.perf_counter()
+            fn(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        duracion = time.perf_counter() - inicio
+        aplicadas.append((version, duracion))
+        print(f"🛠️ Migración {version} ({fn.__doc__}) aplicada en {duracion:.2f} s")
+    return aplicadas
+
+
+def crear_tablas():
+    """Crea o actualiza el esquema de la base de datos."""
+    return migrar()
+
+# 🔁 Generaciones por tabla
+# Cada escritura incrementa el contador de la tabla afectada; los valores
+# cacheados (conteos, páginas, búsquedas) guardan la generación con la que
+# se calcularon y se descartan si ya no coincide.
+_generaciones = {"entradas": 0, "salidas": 0, "productos": 0, "ubicaciones": 0}
+_generaciones_lock = threading.Lock()
+
+def _invalidar(*tablas):
+    with _generaciones_lock:
+        for tabla in tablas:
+            _generaciones[tabla] += 1
+
+def _invalidar_todo():
+    with _generaciones_lock:
+        for tabla in _generaciones:
+            _generaciones[tabla] += 1
+
+def _generacion(tablas):
+    """Generación actual de `tablas`.
+
+    PRAGMA data_version cambia cuando otra conexión (otro hilo u otro
+    proceso, p. ej. la línea de comandos) confirma una escritura; entonces
+    se mira si fue de este proceso (ver _revisar_escrituras).
+    """
     conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO entradas (nombre, fecha, factura, cantidad, comentario) VALUES (?, ?, ?, ?, ?)",
-                (nombre, fecha, factura, cantidad, comentario))
-    conn.commit()
-    conn.close()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, "data_version", None) != version:
+        primera = getattr(_local, "data_version", None) is None
+        _local.data_version = version
+        _revisar_escrituras(conn, primera)
+    return tuple(_generaciones[t] for t in tablas)
+
+
+# ✍️ Escrituras propias y ajenas
+# data_version es de cada conexión y no dice quién escribió: las
+# escrituras de los hilos de este proceso también lo cambian. Por eso cada
+# transacción que escribe suma uno a escrituras.n antes del COMMIT y anota
+# ese número como conocido; sus tablas ya las invalida quien escribe
+# (_invalidar). Si una conexión ve números que nadie anotó, escribió otro
+# proceso y se invalida todo. Si data_version cambió y n no, la escritura
+# vino de otro programa (sin contador) y también se invalida todo.
+MAX_ESCRITURAS_CONOCIDAS = 4096
+_escrituras = {"conocidas": set(), "vista": None}   # vista: el n más alto ya revisado
+
+
+def _anotar_escritura(conn):
+    """Cuenta la escritura de la transacción en curso y devuelve su número
+    (None si la base todavía no tiene la migración 10)."""
+    try:
+        conn.execute("UPDATE escrituras SET n = n + 1")
+    except sqlite3.OperationalError:
+        return None
+    n = conn.execute("SELECT n FROM escrituras").fetchone()[0]
+    with _generaciones_lock:
+        _escrituras["conocidas"].add(n)
+    return n
+
+
+def _olvidar_escritura(n):
+    """El COMMIT falló: otro podría usar el mismo número."""
+    if n is not None:
+        with _generaciones_lock:
+            _escrituras["conocidas"].discard(n)
+
+
+def _revisar_escrituras(conn, primera):
+    """Invalida todo si hubo escrituras de otro proceso o programa desde la
+    última revisión de esta conexión. `primera` es su primer uso."""
+    try:
+        n = conn.execute("SELECT n FROM escrituras").fetchone()[0]
+    except sqlite3.OperationalError:
+        n = None
+    with _generaciones_lock:
+        conocidas = _escrituras["conocidas"]
+        desde = _escrituras["vista"] if primera else getattr(_local, "escrituras", None)
+        if n is None or desde is None:
+            # Sin contador, o el primer uso en el proceso (la caché está vacía)
+            ajena = n is None
+        elif n == desde:
+            ajena = not primera
+        else:
+            ajena = n < desde or any(i not in conocidas for i in range(desde + 1, n + 1))
+            conocidas.update(range(desde + 1, n + 1))
+        _local.escrituras = n
+        if n is not None:
+            _escrituras["vista"] = max(n, _escrituras["vista"] or 0)
+            if len(conocidas) > MAX_ESCRITURAS_CONOCIDAS:
+                # Una conexión que quedó más atrás invalida todo, por las dudas
+                conocidas.difference_update([i for i in conocidas if i <= n - MAX_ESCRITURAS_CONOCIDAS])
+        if ajena:
+            for tabla in _generaciones:
+                _generaciones[tabla] += 1
+            _estadisticas_cache["cambios_externos"] += 1
+
+
+# 🧠 Caché de lecturas
+# Las funciones marcadas con @_cacheado guardan su resultado por argumentos
+# junto con la generación de las tablas que leen; una escritura cambia la
+# generación y el valor viejo se ignora. Los resultados no deben
+# modificarse porque se comparten entre llamadas.
+MAX_CACHE = 256                 # resultados guardados
+MAX_FILAS_CACHE = 5000          # listas más grandes no se guardan
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_estadisticas_cache = {"cambios_externos": 0, "consultas": {}}
+
+
+def _filas_resultado(valor):
+    if isinstance(valor, tuple) and valor and isinstance(valor[0], list):
+        valor = valor[0]  # (filas, cursor) de obtener_pagina
+    return len(valor) if isinstance(valor, list) else 0
+
+
+def _cacheado(*tablas):
+    """Decorador de caché. Sin `tablas`, el primer argumento es el nombre de la
+    tabla y se usan sus dependencias de _TABLAS."""
+    def decorador(funcion):
+        nombre = funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            generacion = _generacion(tablas or _TABLAS[args[0]]["depende"])
+            clave = (nombre, args, tuple(sorted(kwargs.items())))
+            with _cache_lock:
+                contador = _estadisticas_cache["consultas"].setdefault(nombre, {"aciertos": 0, "fallos": 0})
+                guardado = _cache.get(clave)
+                if guardado is not None and guardado[0] == generacion:
+                    _cache.move_to_end(clave)
+                    contador["aciertos"] += 1
+                    return guardado[1]
+                contador["fallos"] += 1
+            valor = funcion(*args, **kwargs)
+            if _filas_resultado(valor) <= MAX_FILAS_CACHE:
+                with _cache_lock:
+                    _cache[clave] = (generacion, valor)
+                    _cache.move_to_end(clave)
+                    while len(_cache) > MAX_CACHE:
+                        _cache.popitem(last=False)
+            return valor
+        return envoltura
+    return decorador
+
+
+def estadisticas_cache():
+    """Aciertos y fallos de la caché de lecturas, en total y por función."""
+    with _cache_lock:
+        consultas = {n: dict(c) for n, c in _estadisticas_cache["consultas"].items()}
+        guardados = len(_cache)
+    aciertos = sum(c["aciertos"] for c in consultas.values())
+    fallos = sum(c["fallos"] for c in consultas.values())
+    return {
+        "aciertos": aciertos,
+        "fallos": fallos,
+        "tasa_aciertos": aciertos / (aciertos + fallos) if aciertos + fallos else 0.0,
+        "guardados": guardados,
+        "busquedas_guardadas": len(_busquedas),
+        "cambios_externos": _estadisticas_cache["cambios_externos"],
+        "consultas": consultas,
+    }
+
+
+def limpiar_cache():
+    """Vacía la caché de lecturas y de búsquedas (las estadísticas se conservan)."""
+    with _cache_lock:
+        _cache.clear()
+    with _busquedas_lock:
+        _busquedas.clear()
+
+# Funciones de CRUD Productos
+def _producto_id(conn, nombre, crear=True):
+    """Id del producto `nombre` (sin distinguir mayúsculas ni espacios).
+
+    Con `crear` lo da de alta si no existe; sin él devuelve None. El
+    segundo valor indica si se creó.
+    """
+    nombre = normalizar_nombre(nombre)
+    fila = conn.execute("SELECT id FROM productos WHERE nombre = ?", (nombre,)).fetchone()
+    if fila:
+        return fila[0], False
+    if not crear:
+        return None, False
+    return conn.execute("INSERT INTO productos (nombre) VALUES (?)", (nombre,)).lastrowid, True
+
+@_cacheado("productos")
+def obtener_productos():
+    """Devuelve [(id, nombre, sku, unidad), ...] en orden alfabético."""
+    cur = connect().execute("SELECT id, nombre, sku, unidad FROM productos ORDER BY nombre")
+    return cur.fetchall()
 
+def agregar_producto(nombre, sku=None, unidad=None):
+    """Da de alta un producto y devuelve su id. ValueError si el nombre o el SKU ya existen."""
+    try:
+        with transaccion() as conn:
+            producto_id = conn.execute("INSERT INTO productos (nombre, sku, unidad) VALUES (?, ?, ?)",
+                                       (normalizar_nombre(nombre), sku or None, unidad or None)).lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Ya existe un producto llamado {nombre!r}" + (f" o con el SKU {sku!r}" if sku else "")) from None
+    _invalidar("productos")
+    return producto_id
+
+def actualizar_producto(producto_id, nombre, sku=None, unidad=None):
+    """Renombra un producto o cambia su SKU y unidad; sus movimientos muestran el nombre nuevo."""
+    try:
+        with transaccion() as conn:
+            conn.execute("UPDATE productos SET nombre = ?, sku = ?, unidad = ? WHERE id = ?",
+                         (normalizar_nombre(nombre), sku or None, unidad or None, producto_id))
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Ya existe un producto llamado {nombre!r}" + (f" o con el SKU {sku!r}" if sku else "")) from None
+    _invalidar("productos")
+
+# 📍 Ubicaciones
+# Cada entrada y salida pertenece a una ubicación (bodega, sucursal...);
+# la 1 es la que tenían los movimientos anteriores a la migración 9. Una
+# transferencia es una salida en el origen y una entrada en el destino
+# con el mismo transferencia_id. stock_ubicacion guarda el stock de cada
+# producto en cada ubicación; la tabla stock sigue siendo el total.
+UBICACION_PRINCIPAL = 1
+ESTADO_TRANSFERENCIA = "Transferencia"
+
+
+def _ubicacion_id(conn, ubicacion):
+    """Id de `ubicacion` (id o nombre); None si es None. ValueError si no existe."""
+    if ubicacion is None:
+        return None
+    if isinstance(ubicacion, int):
+        fila = conn.execute("SELECT id FROM ubicaciones WHERE id = ?", (ubicacion,)).fetchone()
+    else:
+        fila = conn.execute("SELECT id FROM ubicaciones WHERE nombre = ?", (normalizar_nombre(ubicacion),)).fetchone()
+    if fila is None:
+        raise ValueError(f"No existe la ubicación {ubicacion!r}")
+    return fila[0]
+
+@_cacheado("ubicaciones")
+def obtener_ubicaciones():
+    """Devuelve [(id, nombre), ...] con la ubicación principal primero."""
+    cur = connect().execute("SELECT id, nombre FROM ubicaciones ORDER BY id <> ?, nombre", (UBICACION_PRINCIPAL,))
+    return cur.fetchall()
+
+def agregar_ubicacion(nombre):
+    """Da de alta una ubicación y devuelve su id. ValueError si el nombre ya existe."""
+    nombre = normalizar_nombre(nombre)
+    if not nombre:
+        raise ValueError("La ubicación necesita un nombre")
+    try:
+        with transaccion() as conn:
+            ubicacion_id = conn.execute("INSERT INTO ubicaciones (nombre) VALUES (?)", (nombre,)).lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Ya existe una ubicación llamada {nombre!r}") from None
+    _invalidar("ubicaciones")
+    return ubicacion_id
+
+def actualizar_ubicacion(ubicacion_id, nombre):
+    """Renombra una ubicación. ValueError si el nombre ya existe."""
+    nombre = normalizar_nombre(nombre)
+    if not nombre:
+        raise ValueError("La ubicación necesita un nombre")
+    try:
+        with transaccion() as conn:
+            conn.execute("UPDATE ubicaciones SET nombre = ? WHERE id = ?", (nombre, ubicacion_id))
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Ya existe una ubicación llamada {nombre!r}") from None
+    _invalidar("ubicaciones")
+
+def eliminar_ubicacion(ubicacion_id):
+    """Borra una ubicación sin movimientos. ValueError si es la principal o tiene movimientos."""
+    if ubicacion_id == UBICACION_PRINCIPAL:
+        raise ValueError("La ubicación principal no se puede eliminar")
+    with transaccion("IMMEDIATE") as conn:
+        if conn.execute("""
+            SELECT 1 FROM entradas WHERE ubicacion_id = ?
+            UNION ALL SELECT 1 FROM salidas WHERE ubicacion_id = ? LIMIT 1
+        """, (ubicacion_id, ubicacion_id)).fetchone():
+            raise ValueError("La ubicación tiene movimientos; transfiere o elimina sus movimientos primero")
+        conn.execute("DELETE FROM ubicaciones WHERE id = ?", (ubicacion_id,))
+    _invalidar("ubicaciones")
+
+def _no_es_transferencia(conn, tabla, id_movimiento):
+    fila = conn.execute(f"SELECT transferencia_id FROM {tabla} WHERE id = ?", (id_movimiento,)).fetchone()
+    if fila and fila[0] is not None:
+        raise ValueError("Es parte de una transferencia: elimínala y regístrala de nuevo para cambiarla")
+
+# Funciones de CRUD Entradas
+def agregar_entrada(nombre, fecha, factura, cantidad, comentario, ubicacion=None):
+    """`ubicacion` es el id o el nombre de la ubicación (por defecto la principal)."""
+    fecha = normalizar_fecha(fecha)
+    with transaccion() as conn:
+        producto_id, creado = _producto_id(conn, nombre)
+        ubicacion_id = _ubicacion_id(conn, ubicacion) or UBICACION_PRINCIPAL
+        conn.execute("""
+            INSERT INTO entradas (producto_id, fecha, factura, cantidad, comentario, ubicacion_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (producto_id, fecha, factura, cantidad, comentario, ubicacion_id))
+        _actualizar_cierres(conn)
+    _invalidar("entradas", *(("productos",) if creado else ()))
+
+@_cacheado("entradas", "productos")
 def obtener_entradas(filtro=None):
     conn = connect()
-    cur = conn.cursor()
-    if filtro:
-        cur.execute("SELECT * FROM entradas WHERE nombre LIKE ?", (f"%{filtro}%",))
+    sql = """
+        SELECT e.id, p.nombre, e.fecha, e.factura, e.cantidad, e.comentario
+        FROM entradas AS e JOIN productos AS p ON p.id = e.producto_id
+    """
+    if consulta_fts(filtro):
+        cur = conn.execute(
+            sql + " WHERE e.id IN (SELECT rowid FROM entradas_fts WHERE entradas_fts MATCH ?)",
+            (f"nombre : ({consulta_fts(filtro)})",),
+        )
     else:
-        cur.execute("SELECT * FROM entradas")
-    resultados = cur.fetchall()
-    conn.close()
-    return resultados
+        cur = conn.execute(sql)
+    return cur.fetchall()
 
 def eliminar_entrada(id_entrada):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM entradas WHERE id = ?", (id_entrada,))
-    conn.commit()
-    conn.close()
+    """Borra la entrada; si es parte de una transferencia se borra también su salida."""
+    with transaccion() as conn:
+        fila = conn.execute("SELECT transferencia_id FROM entradas WHERE id = ?", (id_entrada,)).fetchone()
+        conn.execute("DELETE FROM entradas WHERE id = ?", (id_entrada,))
+        _actualizar_cierres(conn)
+    _invalidar("entradas", *(("salidas",) if fila and fila[0] is not None else ()))
 
-def actualizar_entrada(id_entrada, nombre, fecha, factura, cantidad, comentario):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE entradas
-        SET nombre = ?, fecha = ?, factura = ?, cantidad = ?, comentario = ?
-        WHERE id = ?
-    """, (nombre, fecha, factura, cantidad, comentario, id_entrada))
-    conn.commit()
-    conn.close()
+def actualizar_entrada(id_entrada, nombre, fecha, factura, cantidad, comentario, ubicacion=None):
+    """Sin `ubicacion` la entrada se queda en la suya. ValueError si es parte de una transferencia."""
+    fecha = normalizar_fecha(fecha)
+    with transaccion() as conn:
+        _no_es_transferencia(conn, "entradas", id_entrada)
+        producto_id, creado = _producto_id(conn, nombre)
+        conn.execute("""
+            UPDATE entradas
+            SET producto_id = ?, fecha = ?, factura = ?, cantidad = ?, comentario = ?,
+                ubicacion_id = COALESCE(?, ubicacion_id)
+            WHERE id = ?
+        """, (producto_id, fecha, factura, cantidad, comentario, _ubicacion_id(conn, ubicacion), id_entrada))
+        _actualizar_cierres(conn)
+    _invalidar("entradas", *(("productos",) if creado else ()))
 
 # Funciones de CRUD Salidas
-def agregar_salida(nombre, fecha, estado, destino, cantidad, comentario):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO salidas (nombre, fecha, estado, destino, cantidad, comentario)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (nombre, fecha, estado, destino, cantidad, comentario))
-    conn.commit()
-    conn.close()
+def agregar_salida(nombre, fecha, estado, destino, cantidad, comentario, ubicacion=None):
+    """`ubicacion` es de donde sale (id o nombre; por defecto la principal)."""
+    fecha = normalizar_fecha(fecha)
+    with transaccion() as conn:
+        producto_id, creado = _producto_id(conn, nombre)
+        ubicacion_id = _ubicacion_id(conn, ubicacion) or UBICACION_PRINCIPAL
+        conn.execute("""
+            INSERT INTO salidas (producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id))
+        _actualizar_cierres(conn)
+    _invalidar("salidas", *(("productos",) if creado else ()))
 
 
+@_cacheado("salidas", "productos")
 def obtener_salidas(filtro=None):
     conn = connect()
-    cur = conn.cursor()
-    if filtro:
-        cur.execute("SELECT * FROM salidas WHERE nombre LIKE ?", (f"%{filtro}%",))
+    sql = """
+        SELECT s.id, p.nombre, s.fecha, s.estado, s.destino, s.cantidad, s.comentario
+        FROM salidas AS s JOIN productos AS p ON p.id = s.producto_id
+    """
+    if consulta_fts(filtro):
+        cur = conn.execute(
+            sql + " WHERE s.id IN (SELECT rowid FROM salidas_fts WHERE salidas_fts MATCH ?)",
+            (f"nombre : ({consulta_fts(filtro)})",),
+        )
     else:
-        cur.execute("SELECT * FROM salidas")
-    resultados = cur.fetchall()
-    conn.close()
-    return resultados
+        cur = conn.execute(sql)
+    return cur.fetchall()
 
 def eliminar_salida(id_salida):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM salidas WHERE id = ?", (id_salida,))
-    conn.commit()
-    conn.close()
+    """Borra la salida; si es parte de una transferencia se borra también su entrada."""
+    with transaccion() as conn:
+        fila = conn.execute("SELECT transferencia_id FROM salidas WHERE id = ?", (id_salida,)).fetchone()
+        conn.execute("DELETE FROM salidas WHERE id = ?", (id_salida,))
+        _actualizar_cierres(conn)
+    _invalidar("salidas", *(("entradas",) if fila and fila[0] is not None else ()))
 
-def actualizar_salida(id_salida, nombre, fecha, estado, destino, cantidad, comentario):
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE salidas
-        SET nombre = ?, fecha = ?, estado = ?, destino = ?, cantidad = ?, comentario = ?
-        WHERE id = ?
-    """, (nombre, fecha, estado, destino, cantidad, comentario, id_salida))
-    conn.commit()
-    conn.close()
+def actualizar_salida(id_salida, nombre, fecha, estado, destino, cantidad, comentario, ubicacion=None):
+    """Sin `ubicacion` la salida se queda en la suya. ValueError si es parte de una transferencia."""
+    fecha = normalizar_fecha(fecha)
+    with transaccion() as conn:
+        _no_es_transferencia(conn, "salidas", id_salida)
+        producto_id, creado = _producto_id(conn, nombre)
+        conn.execute("""
+            UPDATE salidas
+            SET producto_id = ?, fecha = ?, estado = ?, destino = ?, cantidad = ?, comentario = ?,
+                ubicacion_id = COALESCE(?, ubicacion_id)
+            WHERE id = ?
+        """, (producto_id, fecha, estado, destino, cantidad, comentario, _ubicacion_id(conn, ubicacion), id_salida))
+        _actualizar_cierres(conn)
+    _invalidar("salidas", *(("productos",) if creado else ()))
+
+class StockInsuficiente(Exception):
+    """La salida pide más unidades de las disponibles."""
+
+    def __init__(self, nombre, disponible, solicitado):
+        super().__init__(f"Stock insuficiente para {nombre}: disponible {disponible}, solicitado {solicitado}")
+        self.nombre = nombre
+        self.disponible = disponible
+        self.solicitado = solicitado
+
+
+def registrar_salida(nombre, fecha, estado, destino, cantidad, comentario, id_salida=None, ubicacion=None):
+    """Registra una salida (o edita `id_salida`) solo si hay stock suficiente.
+
+    La comprobación y la escritura van en una transacción IMMEDIATE, que
+    toma el bloqueo de escritura antes de leer el stock: dos equipos no
+    pueden aprobar a la vez la misma unidad. El stock que cuenta es el de
+    la ubicación de la salida (`ubicacion`, id o nombre; por defecto la
+    principal, o la que ya tenía al editar). Al editar se valida la
+    diferencia con la cantidad anterior (o la cantidad completa si cambia
+    el producto o la ubicación). Lanza StockInsuficiente; `disponible` es
+    el máximo que se podía registrar; ValueError si `cantidad` no es
+    positiva. Devuelve el id de la salida.
+    """
+    fecha = normalizar_fecha(fecha)
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser mayor que cero")
+    with transaccion("IMMEDIATE") as conn:
+        producto_id, _ = _producto_id(conn, nombre, crear=False)
+        if producto_id is None:
+            raise StockInsuficiente(nombre, 0, cantidad)
+        ubicacion_id = _ubicacion_id(conn, ubicacion)
+        anterior = None
+        if id_salida is not None:
+            _no_es_transferencia(conn, "salidas", id_salida)
+            anterior = conn.execute("SELECT producto_id, cantidad, ubicacion_id FROM salidas WHERE id = ?",
+                                    (id_salida,)).fetchone()
+            if anterior is None:
+                raise ValueError(f"La salida {id_salida} ya no existe")
+            ubicacion_id = ubicacion_id or anterior[2]
+        ubicacion_id = ubicacion_id or UBICACION_PRINCIPAL
+        fila = conn.execute("SELECT disponible FROM stock_ubicacion WHERE ubicacion_id = ? AND producto_id = ?",
+                            (ubicacion_id, producto_id)).fetchone()
+        disponible = fila[0] if fila else 0
+        if anterior is not None and (anterior[0], anterior[2]) == (producto_id, ubicacion_id):
+            disponible += anterior[1]  # sus unidades vuelven al stock
+        if cantidad > disponible:
+            raise StockInsuficiente(nombre, disponible, cantidad)
+        if id_salida is None:
+            cur = conn.execute("""
+                INSERT INTO salidas (producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id))
+            id_salida = cur.lastrowid
+        else:
+            conn.execute("""
+                UPDATE salidas
+                SET producto_id = ?, fecha = ?, estado = ?, destino = ?, cantidad = ?, comentario = ?,
+                    ubicacion_id = ?
+                WHERE id = ?
+            """, (producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id, id_salida))
+        _actualizar_cierres(conn)
+    _invalidar("salidas")
+    return id_salida
+
+
+def transferir(nombre, fecha, origen, destino, cantidad, comentario=""):
+    """Mueve `cantidad` unidades de `nombre` de la ubicación `origen` a `destino` (ids o nombres).
+
+    Se registra una salida en el origen (estado "Transferencia", destino el
+    nombre de la otra ubicación) y una entrada en el destino (factura
+    "TR-<id>"), las dos con transferencia_id igual al id de la salida.
+    Las dos mitades se insertan ya marcadas: los triggers de la tabla stock
+    no las cuentan y el stock total no cambia. Como registrar_salida, valida
+    el stock del origen en la misma transacción IMMEDIATE. Lanza
+    StockInsuficiente o ValueError; devuelve el id de la transferencia.
+    """
+    fecha = normalizar_fecha(fecha)
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser mayor que cero")
+    with transaccion("IMMEDIATE") as conn:
+        origen_id, destino_id = _ubicacion_id(conn, origen), _ubicacion_id(conn, destino)
+        if origen_id is None or destino_id is None:
+            raise ValueError("Indica la ubicación de origen y la de destino")
+        if origen_id == destino_id:
+            raise ValueError("El origen y el destino son la misma ubicación")
+        producto_id, _ = _producto_id(conn, nombre, crear=False)
+        fila = producto_id and conn.execute(
+            "SELECT disponible FROM stock_ubicacion WHERE ubicacion_id = ? AND producto_id = ?",
+            (origen_id, producto_id)).fetchone()
+        disponible = fila[0] if fila else 0
+        if cantidad > disponible:
+            raise StockInsuficiente(nombre, disponible, cantidad)
+        destino_nombre = conn.execute("SELECT nombre FROM ubicaciones WHERE id = ?", (destino_id,)).fetchone()[0]
+        # El próximo id de salidas (AUTOINCREMENT); nadie más escribe mientras
+        # dure la transacción IMMEDIATE
+        transferencia_id = conn.execute(
+            "SELECT IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'salidas'), 0) + 1").fetchone()[0]
+        conn.execute("""
+            INSERT INTO salidas (id, producto_id, fecha, estado, destino, cantidad, comentario, ubicacion_id,
+                                 transferencia_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (transferencia_id, producto_id, fecha, ESTADO_TRANSFERENCIA, destino_nombre, cantidad, comentario,
+              origen_id, transferencia_id))
+        conn.execute("""
+            INSERT INTO entradas (producto_id, fecha, factura, cantidad, comentario, ubicacion_id, transferencia_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (producto_id, fecha, f"TR-{transferencia_id}", cantidad, comentario, destino_id, transferencia_id))
+        _actualizar_cierres(conn)
+    _invalidar("entradas", "salidas")
+    return transferencia_id
+
+
+def eliminar_transferencia(transferencia_id):
+    """Borra las dos mitades de una transferencia."""
+    with transaccion() as conn:
+        conn.execute("DELETE FROM salidas WHERE transferencia_id = ?", (transferencia_id,))
+        conn.execute("DELETE FROM entradas WHERE transferencia_id = ?", (transferencia_id,))
+        _actualizar_cierres(conn)
+    _invalidar("entradas", "salidas")
 
 # Función para Inventario
+@_cacheado("entradas", "salidas", "productos")
 def calcular_inventario():
+    """Devuelve [(nombre, entradas, salidas, disponible), ...] desde la tabla stock."""
+    cur = connect().execute("""
+        SELECT p.nombre, s.total_entradas, s.total_salidas, s.disponible
+        FROM stock AS s JOIN productos AS p ON p.id = s.producto_id
+    """)
+    return cur.fetchall()
+
+@_cacheado("entradas", "salidas", "productos")
+def nombres_productos():
+    """Nombres de producto con entradas, en orden alfabético (para los combos)."""
+    cur = connect().execute("""
+        SELECT p.nombre FROM productos AS p JOIN stock AS s ON s.producto_id = p.id
+        WHERE s.total_entradas > 0 AND p.nombre <> '' ORDER BY p.nombre
+    """)
+    return [fila[0] for fila in cur]
+
+def stock_disponible(nombre, ubicacion=None):
+    """Stock disponible de un producto (0 si no tiene movimientos), en total o en `ubicacion`."""
     conn = connect()
-    cur = conn.cursor()
-    
-    # Total de entradas por producto
-    cur.execute("SELECT nombre, SUM(cantidad) FROM entradas GROUP BY nombre")
-    entradas = {row[0]: row[1] for row in cur.fetchall()}
-
-    # Total de salidas por producto
-    cur.execute("SELECT nombre, SUM(cantidad) FROM salidas GROUP BY nombre")
-    salidas = {row[0]: row[1] for row in cur.fetchall()}
-
-    inventario = []
-    for nombre in set(entradas) | set(salidas):
-        entrada = entradas.get(nombre, 0)
-        salida = salidas.get(nombre, 0)
-        total = entrada - salida
-        inventario.append((nombre, entrada, salida, total))
-
-    conn.close()
-    return inventario
+    if ubicacion is None:
+        cur = conn.execute("""
+            SELECT s.disponible FROM stock AS s JOIN productos AS p ON p.id = s.producto_id
+            WHERE p.nombre = ?
+        """, (normalizar_nombre(nombre),))
+    else:
+        cur = conn.execute("""
+            SELECT s.disponible FROM stock_ubicacion AS s JOIN productos AS p ON p.id = s.producto_id
+            WHERE s.ubicacion_id = ? AND p.nombre = ?
+        """, (_ubicacion_id(conn, ubicacion), normalizar_nombre(nombre)))
+    row = cur.fetchone()
+    return row[0] if row else 0
 
-# Función para verificar si una factura ya existe
-def factura_existe(factura):
+@_cacheado("entradas", "salidas", "productos", "ubicaciones")
+def stock_ubicacion(ubicacion, producto=None):
+    """Stock de cada producto en `ubicacion` (id o nombre).
+
+    Devuelve [(nombre, entradas, salidas, disponible), ...] en orden
+    alfabético, como stock_al; `producto` limita el resultado a ese nombre.
+    Se lee de stock_ubicacion por su clave (ubicacion_id, producto_id).
+    """
     conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM entradas WHERE factura = ?", (factura,))
-    count = cur.fetchone()[0]
-    conn.close()
-    return count > 0
+    params = [_ubicacion_id(conn, ubicacion)]
+    condicion = ""
+    if producto is not None:
+        condicion = "AND p.nombre = ?"
+        params.append(normalizar_nombre(producto))
+    cur = conn.execute(f"""
+        SELECT p.nombre, s.total_entradas, s.total_salidas, s.disponible
+        FROM stock_ubicacion AS s JOIN productos AS p ON p.id = s.producto_id
+        WHERE s.ubicacion_id = ? {condicion}
+        ORDER BY p.nombre
+    """, params)
+    return cur.fetchall()
+
+@_cacheado("entradas", "salidas", "productos", "ubicaciones")
+def stock_por_ubicacion(producto):
+    """Dónde está `producto`: [(ubicacion, entradas, salidas, disponible), ...] por nombre de ubicación."""
+    cur = connect().execute("""
+        SELECT u.nombre, s.total_entradas, s.total_salidas, s.disponible
+        FROM productos AS p
+        JOIN stock_ubicacion AS s ON s.producto_id = p.id
+        JOIN ubicaciones AS u ON u.id = s.ubicacion_id
+        WHERE p.nombre = ?
+        ORDER BY u.nombre
+    """, (normalizar_nombre(producto),))
+    return cur.fetchall()
+
+def verificar_stock():
+    """Compara la tabla stock con los movimientos (sin transferencias) y
+    stock_ubicacion con todos ellos.
+
+    Devuelve una lista de (nombre, guardado, calculado) con las diferencias;
+    cada valor es una tupla (entradas, salidas, disponible) o None si falta.
+    """
+    with transaccion() as conn:
+        calculado = {r[0]: tuple(r[1:]) for r in conn.execute(
+            _SQL_STOCK_DESDE_MOVIMIENTOS.format(where=f"WHERE {_SIN_TRANSFERENCIAS}"))}
+        guardado = {r[0]: tuple(r[1:]) for r in conn.execute(
+            "SELECT producto_id, total_entradas, total_salidas, disponible, movimientos FROM stock"
+        )}
+        # El stock por ubicación se compara igual; sus diferencias se
+        # muestran como "producto @ ubicación"
+        calculado.update({r[:2]: tuple(r[2:]) for r in conn.execute(_SQL_STOCK_UBICACION_DESDE_MOVIMIENTOS)})
+        guardado.update({r[:2]: tuple(r[2:]) for r in conn.execute("""
+            SELECT ubicacion_id, producto_id, total_entradas, total_salidas, disponible, movimientos
+            FROM stock_ubicacion
+        """)})
+        nombres = dict(conn.execute("SELECT id, nombre FROM productos"))
+        ubicaciones = dict(conn.execute("SELECT id, nombre FROM ubicaciones"))
+
+    def nombre(clave):
+        if isinstance(clave, tuple):
+            ubicacion_id, producto_id = clave
+            return f"{nombres.get(producto_id, producto_id)} @ {ubicaciones.get(ubicacion_id, ubicacion_id)}"
+        return nombres.get(clave, clave)
+
+    diferencias = []
+    for clave in sorted(set(calculado) | set(guardado), key=lambda c: (isinstance(c, tuple), c)):
+        g, c = guardado.get(clave), calculado.get(clave)
+        if g != c:
+            diferencias.append((nombre(clave), g and g[:3], c and c[:3]))
+    return diferencias
+
+def reconstruir_stock():
+    """Recalcula las tablas stock y stock_ubicacion desde entradas y salidas
+    y pone al día los cierres mensuales. Devuelve las diferencias corregidas."""
+    with transaccion("IMMEDIATE") as conn:
+        diferencias = verificar_stock()
+        if diferencias:
+            conn.execute("DELETE FROM stock")
+            conn.execute(f"""
+                INSERT INTO stock (producto_id, total_entradas, total_salidas, disponible, movimientos)
+                {_SQL_STOCK_DESDE_MOVIMIENTOS.format(where=f"WHERE {_SIN_TRANSFERENCIAS}")}
+            """)
+            conn.execute("DELETE FROM stock_ubicacion")
+            conn.execute(f"""
+                INSERT INTO stock_ubicacion (ubicacion_id, producto_id, total_entradas, total_salidas,
+                                             disponible, movimientos)
+                {_SQL_STOCK_UBICACION_DESDE_MOVIMIENTOS}
+            """)
+        _actualizar_cierres(conn)
+    if diferencias:
+        _invalidar_todo()
+    return diferencias
+
+# 🧰 Mantenimiento
+def optimizar(vacuum=False):
+    """Pone al día los cierres mensuales, actualiza las estadísticas del
+    planificador, compacta los índices de texto completo y, con `vacuum`,
+    reescribe el archivo sin espacio libre.
+
+    Devuelve el tamaño del archivo (bytes_antes, bytes_despues).
+    """
+    antes = os.path.getsize(DB_PATH)
+    with transaccion("IMMEDIATE") as conn:
+        _actualizar_cierres(conn)
+        conn.execute("ANALYZE")
+        for fts in ("entradas_fts", "salidas_fts"):
+            conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")
+    if vacuum:
+        conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"bytes_antes": antes, "bytes_despues": os.path.getsize(DB_PATH)}
+
+def respaldar(destino):
+    """Copia la base de datos en `destino` con la API de respaldo de SQLite,
+    consistente aunque otra conexión esté escribiendo. Devuelve el tamaño."""
+    copia = sqlite3.connect(destino)
+    try:
+        connect().backup(copia)
+    finally:
+        copia.close()
+    return os.path.getsize(destino)
+
+# Función para verificar si una factura ya existe
+def factura_existe(factura, excluir_id=None):
+    """True si otra entrada (distinta de `excluir_id`) usa esa factura."""
+    if excluir_id is None:
+        cur = connect().execute("SELECT 1 FROM entradas WHERE factura = ? LIMIT 1", (factura,))
+    else:
+        cur = connect().execute("SELECT 1 FROM entradas WHERE factura = ? AND id <> ? LIMIT 1",
+                                (factura, excluir_id))
+    return cur.fetchone() is not None
+
+
+# 📄 Paginación por cursor (keyset)
+# Cada pestaña pide una página con filtro, columna de orden y el cursor de
+# la última fila vista. La consulta continúa desde ese punto usando el
+# índice, en lugar de cargar toda la tabla y recortarla en Python. El
+# nombre sale de productos (alias p, ver _origen) y "expresiones" dice de
+# qué tabla se lee cada columna que no es de t.
+_JOIN_PRODUCTOS = " JOIN productos AS p ON p.id = t.producto_id"
+# El nombre de la ubicación solo se busca para las filas devueltas
+_NOMBRE_UBICACION = "(SELECT u.nombre FROM ubicaciones AS u WHERE u.id = t.ubicacion_id)"
+
+_TABLAS = {
+    "entradas": {
+        "columnas": ("id", "nombre", "fecha", "factura", "cantidad", "comentario", "ubicacion"),
+        "clave": "id",
+        "expresiones": {"nombre": "p.nombre", "ubicacion": _NOMBRE_UBICACION},
+        "busqueda": ("nombre", "factura", "comentario"),
+        "fts": "entradas_fts",
+        "orden": {
+            "nombre": ("nombre", "NOCASE"),
+            "fecha": ("fecha", None),
+            "factura": ("factura", "NOCASE"),
+            "cantidad": ("cantidad", None),
+        },
+        "depende": ("entradas", "productos", "ubicaciones"),
+    },
+    "salidas": {
+        "columnas": ("id", "nombre", "fecha", "estado", "destino", "cantidad", "comentario", "ubicacion"),
+        "clave": "id",
+        "expresiones": {"nombre": "p.nombre", "ubicacion": _NOMBRE_UBICACION},
+        "busqueda": ("nombre", "destino"),
+        "fts": "salidas_fts",
+        "orden": {
+            "nombre": ("nombre", "NOCASE"),
+            "fecha": ("fecha", None),
+            "estado": ("estado", "NOCASE"),
+            "destino": ("destino", "NOCASE"),
+            "cantidad": ("cantidad", None),
+        },
+        "depende": ("salidas", "productos", "ubicaciones"),
+    },
+    "stock": {
+        "columnas": ("nombre", "total_entradas", "total_salidas", "disponible"),
+        "clave": "nombre",
+        "expresiones": {"nombre": "p.nombre"},
+        "busqueda": ("nombre",),
+        "orden": {
+            "nombre": ("nombre", "NOCASE"),
+            "entradas": ("total_entradas", None),
+            "salidas": ("total_salidas", None),
+            "stock": ("disponible", None),
+        },
+        "depende": ("entradas", "salidas", "productos", "ubicaciones"),
+    },
+}
+
+# Por encima de este número de coincidencias ordenar por relevancia cuesta
+# más que lo que aporta (términos muy comunes); se usa el orden normal.
+LIMITE_RELEVANCIA = 20000
+
+
+def consulta_fts(texto):
+    """Convierte el texto de la barra de búsqueda en una consulta FTS5.
+
+    Cada palabra se busca como prefijo y todas deben aparecer:
+    'epson l32' -> '"epson"* "l32"*'. Devuelve "" si no hay palabras.
+    """
+    return " ".join(f'"{palabra}"*' for palabra in re.findall(r"\w+", texto or ""))
+
+
+def _expr(spec, col):
+    return spec["expresiones"].get(col, f"t.{col}")
+
+
+def _condicion_rango(columna, rango):
+    """Condición para `columna` entre las fechas de `rango` (desde, hasta), ambas incluidas.
+
+    Cualquiera de las dos puede ser None. Devuelve ("", []) sin rango.
+    """
+    desde, hasta = rango or (None, None)
+    condiciones, params = [], []
+    if desde:
+        condiciones.append(f"{columna} >= ?")
+        params.append(normalizar_fecha(desde))
+    if hasta:
+        condiciones.append(f"{columna} <= ?")
+        params.append(normalizar_fecha(hasta))
+    return " AND ".join(condiciones), params
+
+
+# Stock de un período: los movimientos del rango sumados por producto, con
+# el stock disponible al final del período ({disponible}). Cada tabla se
+# agrupa por su índice (producto_id, fecha, cantidad) antes de juntarlas;
+# con una ubicación, por (ubicacion_id, producto_id, fecha, cantidad).
+_SQL_STOCK_PERIODO = """(
+    SELECT producto_id, SUM(e) AS total_entradas, SUM(s) AS total_salidas, {disponible} AS disponible
+    FROM (
+        SELECT producto_id, SUM(cantidad) AS e, 0 AS s FROM entradas {where} GROUP BY producto_id
+        UNION ALL
+        SELECT producto_id, 0, SUM(cantidad) FROM salidas {where} GROUP BY producto_id
+    ) AS m
+    GROUP BY producto_id
+) AS t"""
+
+def _origen(tabla, rango, con_productos=True, ubicacion=None):
+    """FROM de `tabla` como (sql, params).
+
+    Con `rango`, en stock cada fila suma los movimientos del período en
+    lugar de leer la tabla stock, y el disponible es el del último día
+    del período (desde el cierre mensual más cercano). Con `ubicacion`
+    (id), el stock sale de stock_ubicacion o, con rango, de los
+    movimientos de esa ubicación; en entradas y salidas la ubicación es
+    una condición más (ver _condiciones_rango_ubicacion). Sin
+    `con_productos` se omite el JOIN (para contar cuando el filtro no usa
+    el nombre).
+    """
+    if tabla == "stock" and rango:
+        where, params = _condicion_rango("fecha", rango)
+        if ubicacion is not None:
+            where = " AND ".join(["ubicacion_id = ?"] + ([where] if where else []))
+            params = [ubicacion] + params
+        else:
+            where = " AND ".join([_SIN_TRANSFERENCIAS] + ([where] if where else []))
+        hasta = rango[1] and normalizar_fecha(rango[1])
+        if hasta and hasta < date.today().isoformat():
+            disponible, params_disponible = _sql_disponible_al(_ultimo_cierre(connect(), hasta), ubicacion)
+            params = params_disponible(hasta) + params * 2
+        elif ubicacion is None:
+            disponible = "(SELECT disponible FROM stock WHERE stock.producto_id = m.producto_id)"
+            params = params * 2
+        else:
+            disponible = """(SELECT disponible FROM stock_ubicacion
+                             WHERE stock_ubicacion.ubicacion_id = ? AND stock_ubicacion.producto_id = m.producto_id)"""
+            params = [ubicacion] + params * 2
+        sql = _SQL_STOCK_PERIODO.format(where=f"WHERE {where}" if where else "", disponible=disponible)
+    elif tabla == "stock" and ubicacion is not None:
+        sql, params = "stock_ubicacion AS t", []
+    else:
+        sql, params = f"{tabla} AS t", []
+    if con_productos:
+        sql += _JOIN_PRODUCTOS
+    return sql, params
+
+
+def _condiciones_rango_ubicacion(tabla, rango, ubicacion, paginando=False):
+    """Condiciones sobre t para el rango de fechas y la ubicación que _origen
+    no aplica. Devuelve ([condiciones], params).
+
+    Al `paginando` entradas o salidas la ubicación se escribe +t.ubicacion_id,
+    que SQLite no usa como índice: la página sigue el índice del orden y
+    descarta las filas de otras ubicaciones, en lugar de leer y ordenar
+    todos los movimientos de la ubicación en cada página.
+    """
+    condiciones, params = [], []
+    if tabla != "stock":
+        en_rango, params = _condicion_rango("t.fecha", rango)
+        condiciones += [en_rango] if en_rango else []
+    if ubicacion is not None and not (tabla == "stock" and rango):
+        mas = "+" if paginando and tabla != "stock" else ""
+        condiciones.append(f"{mas}t.ubicacion_id = ?")
+        params.append(ubicacion)
+    return condiciones, params
+
+
+def _condicion_filtro(spec, filtro):
+    if not filtro:
+        return "", []
+    if "fts" in spec:
+        consulta = consulta_fts(filtro)
+        if not consulta:
+            return "", []
+        fts = spec["fts"]
+        return f"t.{spec['clave']} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)", [consulta]
+    condicion = " OR ".join(f"{_expr(spec, col)} LIKE ?" for col in spec["busqueda"])
+    return f"({condicion})", [f"%{filtro}%"] * len(spec["busqueda"])
+
+
+@_cacheado()
+def contar_filas(tabla, filtro=None, rango=None, ubicacion=None):
+    """Total de filas de `tabla` que cumplen el filtro, el rango de fechas y
+    la ubicación (id o nombre), cacheado hasta la próxima escritura."""
+    spec = _TABLAS[tabla]
+    ubicacion = _ubicacion_id(connect(), ubicacion)
+    consulta = consulta_fts(filtro) if "fts" in spec else ""
+    if consulta:
+        base = _busqueda_base(tabla, _terminos_busqueda(filtro), _generacion(spec["depende"]),
+                              rango=rango, ubicacion=ubicacion)
+        if base is not None:
+            return len(_refinar(base, _terminos_busqueda(filtro))[0])
+    if consulta and not rango and ubicacion is None:
+        sql, params = f"SELECT COUNT(*) FROM {spec['fts']} WHERE {spec['fts']} MATCH ?", [consulta]
+    else:
+        where, params = _condicion_filtro(spec, filtro)
+        desde, params_desde = _origen(tabla, rango, con_productos=bool(where) and not consulta,
+                                      ubicacion=ubicacion)
+        condiciones = [where] if where else []
+        extra, params_extra = _condiciones_rango_ubicacion(tabla, rango, ubicacion)
+        condiciones += extra
+        params += params_extra
+        sql = f"SELECT COUNT(*) FROM {desde}" + (f" WHERE {' AND '.join(condiciones)}" if condiciones else "")
+        params = params_desde + params
+    return connect().execute(sql, params).fetchone()[0]
+
+
+# 🔎 Búsquedas recientes
+# Una búsqueda con pocas coincidencias se guarda completa, en su orden, en
+# una LRU. Las páginas siguientes salen de memoria y, si el texto nuevo solo
+# alarga el anterior ("eps" -> "epson l"), se filtra ese resultado en Python
+# en lugar de volver a consultar. Cada resultado guarda la generación de su
+# tabla, así cualquier escritura lo invalida.
+MAX_FILAS_BUSQUEDA = 5000
+MAX_BUSQUEDAS = 32
+_busquedas = OrderedDict()
+_busquedas_lock = threading.Lock()
+
+
+def _normalizar_busqueda(texto):
+    """Minúsculas y sin tildes, como el tokenizador unicode61 del índice FTS."""
+    texto = str(texto or "")
+    if texto.isascii():
+        return texto.lower()
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).casefold()
+
+
+def _terminos_busqueda(filtro):
+    return tuple(re.findall(r"\w+", _normalizar_busqueda(filtro)))
+
+
+def _palabras(spec, fila):
+    texto = " ".join(str(fila[spec["columnas"].index(c)] or "") for c in spec["busqueda"])
+    return tuple(re.findall(r"[^\W_]+", _normalizar_busqueda(texto)))
+
+
+def _refinar(base, terminos):
+    """Filas y palabras de `base` en las que cada término es prefijo de alguna palabra."""
+    filas, palabras = [], []
+    for fila, suyas in zip(base[1], base[3]):
+        if all(any(p.startswith(t) for p in suyas) for t in terminos):
+            filas.append(fila)
+            palabras.append(suyas)
+    return filas, palabras
+
+
+def _busqueda_base(tabla, terminos, generacion, orden=None, rango=None, ubicacion=None):
+    """El resultado guardado más chico que contiene todas las filas de `terminos`.
+
+    Sirve una búsqueda anterior (con el mismo `rango` y `ubicacion`) en la que cada
+    término es prefijo de uno nuevo. Con `orden` (orden, descendente) solo
+    se usan resultados en ese orden; sin él, cualquiera (para contar).
+    """
+    if not all(re.fullmatch(r"[^\W_]+", t) for t in terminos):
+        return None
+    base = None
+    with _busquedas_lock:
+        for (t, anteriores, o, d, r, u), (gen, res) in _busquedas.items():
+            if t != tabla or gen != generacion or (r, u) != (rango, ubicacion) or (
+                    orden is not None and (o, d) != orden):
+                continue
+            if all(any(n.startswith(a) for n in terminos) for a in anteriores):
+                if base is None or len(res[1]) < len(base[1]):
+                    base = res
+    return base
+
+
+def _resultado_busqueda(tabla, filtro, orden, descendente, rango=None, ubicacion=None):
+    """Resultado completo de una búsqueda chica como (relevancia, filas, posiciones, palabras), o None.
+
+    `filas` son las filas de _consulta_pagina (con rank al final si se
+    ordena por relevancia), `posiciones` va de la clave al índice en filas y
+    `palabras` tiene las palabras normalizadas de cada fila para refinar.
+    """
+    spec = _TABLAS[tabla]
+    terminos = _terminos_busqueda(filtro)
+    if "fts" not in spec or not terminos:
+        return None
+    generacion = _generacion(spec["depende"])
+    clave = (tabla, terminos, orden, descendente, rango, ubicacion)
+
+    with _busquedas_lock:
+        guardado = _busquedas.get(clave)
+        if guardado and guardado[0] == generacion:
+            _busquedas.move_to_end(clave)
+            return guardado[1]
+    base = _busqueda_base(tabla, terminos, generacion, (orden, descendente), rango, ubicacion)
+    # Por relevancia no se refina: el rank depende de todos los términos y
+    # conservar el orden anterior cambiaría según lo escrito antes
+    if base is not None and base[0]:
+        base = None
+
+    if base is not None:
+        relevancia = False
+        filas, palabras = _refinar(base, terminos)
+    elif contar_filas(tabla, filtro, rango, ubicacion) <= MAX_FILAS_BUSQUEDA:
+        sql, params, relevancia, _ = _consulta_pagina(tabla, filtro, orden, descendente, None, None,
+                                                      rango=rango, ubicacion=ubicacion)
+        filas = connect().execute(sql, params).fetchall()
+        palabras = [_palabras(spec, fila) for fila in filas]
+    else:
+        return None
+
+    idx_clave = spec["columnas"].index(spec["clave"])
+    resultado = (relevancia, filas, {fila[idx_clave]: i for i, fila in enumerate(filas)}, palabras)
+    with _busquedas_lock:
+        _busquedas[clave] = (generacion, resultado)
+        _busquedas.move_to_end(clave)
+        while len(_busquedas) > MAX_BUSQUEDAS:
+            _busquedas.popitem(last=False)
+    return resultado
+
+
+def _consulta_pagina(tabla, filtro, orden, descendente, cursor, limite, desplazamiento=0, rango=None,
+                     ubicacion=None):
+    """Arma el SELECT de obtener_pagina. Devuelve (sql, params, relevancia, col_orden)."""
+    spec = _TABLAS[tabla]
+    ubicacion = _ubicacion_id(connect(), ubicacion)
+    columnas = spec["columnas"]
+    clave = spec["clave"]
+    if orden in spec["orden"]:
+        col_orden, colacion = spec["orden"][orden]
+        expr = _expr(spec, col_orden) + (f" COLLATE {colacion}" if colacion else "")
+    elif tabla == "stock":
+        col_orden, expr = "nombre", "p.nombre COLLATE NOCASE"
+    else:
+        col_orden = expr = None
+
+    # Relevancia: la decisión se toma en la primera página y el cursor
+    # (rank, id) la mantiene en las siguientes.
+    consulta = consulta_fts(filtro) if "fts" in spec else ""
+    relevancia = bool(consulta) and expr is None and (
+        len(cursor) == 2 if cursor is not None
+        else contar_filas(tabla, filtro, rango, ubicacion) <= LIMITE_RELEVANCIA
+    )
+
+    desde, params = _origen(tabla, rango, ubicacion=ubicacion)
+    if relevancia:
+        fts = spec["fts"]
+        desde = f"{fts} AS f JOIN {desde}"
+        condiciones = [f"{fts} MATCH ?", f"t.{clave} = f.rowid"]
+        params.append(consulta)
+        col_orden, expr, descendente = "rank", "f.rank", False
+    else:
+        where, params_filtro = _condicion_filtro(spec, filtro)
+        condiciones = [where] if where else []
+        params += params_filtro
+    extra, params_extra = _condiciones_rango_ubicacion(tabla, rango, ubicacion, paginando=limite is not None)
+    condiciones += extra
+    params += params_extra
+
+    op, sentido = ("<", "DESC") if descendente else (">", "ASC")
+    if cursor is not None:
+        if expr:
+            condiciones.append(f"{expr} {op}= ? AND ({expr} {op} ? OR {_expr(spec, clave)} {op} ?)")
+            params += [cursor[0], cursor[0], cursor[1]]
+        else:
+            condiciones.append(f"{_expr(spec, clave)} {op} ?")
+            params.append(cursor[-1])
+
+    seleccion = [_expr(spec, c) for c in columnas] + (["f.rank"] if relevancia else [])
+    sql = f"SELECT {', '.join(seleccion)} FROM {desde}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    orden_sql = [f"{expr} {sentido}"] if expr else []
+    sql += " ORDER BY " + ", ".join(orden_sql + [f"{_expr(spec, clave)} {sentido}"])
+    if limite is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limite + 1, desplazamiento]
+    return sql, params, relevancia, col_orden
+
+
+@_cacheado()
+def obtener_pagina(tabla, filtro=None, orden=None, descendente=False, cursor=None, limite=10, desplazamiento=0,
+                   rango=None, ubicacion=None):
+    """Devuelve (filas, cursor_siguiente) de `tabla` (entradas, salidas o stock).
+
+    `orden` es el nombre de una columna visible de la pestaña (None = orden
+    de inserción, o por nombre en stock). Si hay filtro y no hay orden, las
+    entradas y salidas se ordenan por relevancia. `cursor` es el valor
+    devuelto por la página anterior; cursor_siguiente es None si no hay más
+    filas. `desplazamiento` salta ese número de filas después del cursor
+    (para saltos largos sin un cursor cercano). Con `limite=None` se
+    devuelven todas las filas desde el cursor. `rango` (desde, hasta)
+    limita las fechas; en stock, las columnas pasan a ser las entradas y
+    salidas de ese período. `ubicacion` (id o nombre) deja solo los
+    movimientos de esa ubicación y, en stock, el stock que hay en ella.
+    """
+    columnas, clave = _TABLAS[tabla]["columnas"], _TABLAS[tabla]["clave"]
+    ubicacion = _ubicacion_id(connect(), ubicacion)
+    guardado = _resultado_busqueda(tabla, filtro, orden, descendente, rango, ubicacion) if filtro else None
+    if guardado and (cursor is None or cursor[-1] in guardado[2]):
+        relevancia, todas, posiciones, _ = guardado
+        col_orden = _TABLAS[tabla]["orden"].get(orden, (None,))[0]
+        inicio = (0 if cursor is None else posiciones[cursor[-1]] + 1) + desplazamiento
+        fin = None if limite is None else inicio + limite + 1
+        filas = todas[inicio:fin]
+    else:
+        sql, params, relevancia, col_orden = _consulta_pagina(
+            tabla, filtro, orden, descendente, cursor, limite, desplazamiento, rango, ubicacion)
+        filas = connect().execute(sql, params).fetchall()
+    siguiente = None
+    if limite is not None and len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        idx_clave = columnas.index(clave)
+        if relevancia:
+            siguiente = (ultima[-1], ultima[idx_clave])
+        elif col_orden:
+            siguiente = (ultima[columnas.index(col_orden)], ultima[idx_clave])
+        else:
+            siguiente = (ultima[idx_clave],)
+    if relevancia:
+        filas = [fila[:-1] for fila in filas]
+    return filas, siguiente
+
+
+def iterar_filas(tabla, filtro=None, orden=None, descendente=False, tamano_lote=2000, rango=None, ubicacion=None):
+    """Genera lotes de filas de `tabla` con el mismo filtro y orden que obtener_pagina.
+
+    Lee directamente del cursor con fetchmany, sin cargar la tabla en memoria.
+    """
+    sql, params, relevancia, _ = _consulta_pagina(tabla, filtro, orden, descendente, None, None,
+                                                  rango=rango, ubicacion=ubicacion)
+    cur = connect().cursor()
+    try:
+        cur.execute(sql, params)
+        while True:
+            lote = cur.fetchmany(tamano_lote)
+            if not lote:
+                break
+            yield [fila[:-1] for fila in lote] if relevancia else lote
+    finally:
+        cur.close()
+
+
+# 📊 Resúmenes por período
+# Cada tabla se suma por día (o por producto) recorriendo sus índices
+# (fecha, producto_id, cantidad) y (producto_id, fecha, cantidad), que ya
+# entregan las filas agrupadas; las semanas y meses se juntan en Python.
+AGRUPACIONES = ("producto", "dia", "semana", "mes")
+
+
+def _clave_periodo(fecha, por):
+    """Día, lunes de la semana o 'YYYY-mm' de una fecha ISO."""
+    if por == "mes":
+        return fecha[:7]
+    if por == "semana":
+        try:
+            dia = date.fromisoformat(fecha)
+        except ValueError:
+            return fecha
+        return (dia - timedelta(days=dia.weekday())).isoformat()
+    return fecha
+
+
+@_cacheado("entradas", "salidas", "productos")
+def resumen_periodo(por="mes", desde=None, hasta=None, producto=None):
+    """Totales de entradas y salidas entre `desde` y `hasta` por producto, día, semana o mes.
+
+    Devuelve [(clave, entradas, salidas), ...] ordenado por clave: el nombre
+    del producto, la fecha del día, la del lunes de la semana o 'YYYY-mm'.
+    `producto` limita el resumen a ese nombre. Las transferencias entre
+    ubicaciones no cuentan.
+    """
+    if por not in AGRUPACIONES:
+        raise ValueError(f"Agrupación desconocida: {por!r}")
+    where, params = _condicion_rango("fecha", (desde, hasta))
+    condiciones = [_SIN_TRANSFERENCIAS] + ([where] if where else [])
+    grupo = "producto_id" if por == "producto" else "fecha"
+    totales = {}
+    with transaccion() as conn:
+        if producto is not None:
+            producto_id, _ = _producto_id(conn, producto, crear=False)
+            if producto_id is None:
+                return []
+            condiciones.append("producto_id = ?")
+            params.append(producto_id)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        for i, tabla in enumerate(("entradas", "salidas")):
+            for clave, cantidad in conn.execute(
+                f"SELECT {grupo}, SUM(cantidad) FROM {tabla} {where} GROUP BY {grupo}", params
+            ):
+                if grupo == "fecha":
+                    clave = _clave_periodo(clave, por)
+                totales.setdefault(clave, [0, 0])[i] += cantidad
+        if por == "producto":
+            nombres = dict(conn.execute("SELECT id, nombre FROM productos"))
+            filas = [(nombres[clave], e, s) for clave, (e, s) in totales.items()]
+            return sorted(filas, key=lambda fila: fila[0].casefold())
+    return [(clave, e, s) for clave, (e, s) in sorted(totales.items())]
+
+
+# 📸 Cierres de stock
+# Al final de cada mes cerrado se guarda el total acumulado de entradas y
+# salidas de cada producto. El stock a una fecha es el del último cierre
+# anterior más los movimientos desde entonces, que nunca son más de un
+# mes. Los cierres se crean y se recalculan al escribir: un movimiento con
+# fecha anterior los marca como no válidos (triggers de la migración 8) y
+# la misma transacción los recalcula en orden, cada uno desde el anterior
+# (_actualizar_cierres). Las consultas nunca escriben: parten del último
+# cierre válido, aunque sea más viejo, y suman los movimientos desde
+# entonces. Desde la migración 9 cada cierre también guarda los totales
+# por ubicación.
+def _fin_de_mes(dia):
+    siguiente = (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return siguiente - timedelta(days=1)
+
+
+def _cierres_esperados(conn, fecha):
+    """Fechas de los cierres de meses ya terminados hasta `fecha` (ISO)."""
+    limite = min(fecha, (date.today().replace(day=1) - timedelta(days=1)).isoformat())
+    primera = conn.execute("""
+        SELECT MIN(fecha) FROM (
+            SELECT MIN(fecha) AS fecha FROM entradas WHERE fecha >= '1900-01-01'
+            UNION ALL
+            SELECT MIN(fecha) FROM salidas WHERE fecha >= '1900-01-01'
+        )
+    """).fetchone()[0]
+    if primera is None or primera > limite:
+        return []
+    fechas = []
+    cierre = _fin_de_mes(date.fromisoformat(primera))
+    while cierre.isoformat() <= limite:
+        fechas.append(cierre.isoformat())
+        cierre = _fin_de_mes(cierre + timedelta(days=1))
+    return fechas
+
+
+def _ultimo_cierre(conn, fecha):
+    """Fecha del último cierre válido ≤ `fecha` (ISO), o None."""
+    return conn.execute("SELECT MAX(fecha) FROM cierres WHERE fecha <= ? AND valido", (fecha,)).fetchone()[0]
+
+
+def _sql_acumulado(cierre, hasta):
+    """SELECT de (producto_id, e, s) con las entradas y salidas acumuladas
+    de cada producto hasta `hasta` (sin transferencias), partiendo del
+    cierre `cierre` (o de cero si es None). Devuelve (sql, params)."""
+    if cierre is None:
+        base, desde, params = "", "", [hasta, hasta]
+    else:
+        base = """
+            SELECT producto_id, total_entradas AS e, total_salidas AS s FROM stock_cierre WHERE fecha = ?
+            UNION ALL"""
+        desde = "fecha > ? AND"
+        params = [cierre, cierre, hasta, cierre, hasta]
+    sql = f"""
+        SELECT producto_id, SUM(e) AS e, SUM(s) AS s FROM ({base}
+            SELECT producto_id, SUM(cantidad) AS e, 0 AS s FROM entradas
+            WHERE {_SIN_TRANSFERENCIAS} AND {desde} fecha <= ? GROUP BY producto_id
+            UNION ALL
+            SELECT producto_id, 0, SUM(cantidad) FROM salidas
+            WHERE {_SIN_TRANSFERENCIAS} AND {desde} fecha <= ? GROUP BY producto_id
+        )
+        GROUP BY producto_id
+    """
+    return sql, params
+
+
+def _sql_acumulado_ubicacion(cierre, hasta, ubicacion=None):
+    """Como _sql_acumulado, pero por (ubicacion_id, producto_id) y partiendo
+    de stock_cierre_ubicacion; con `ubicacion` (id) solo esa ubicación."""
+    filtro, p = ("ubicacion_id = ? AND", [ubicacion]) if ubicacion is not None else ("", [])
+    if cierre is None:
+        base, desde, params = "", "", p + [hasta] + p + [hasta]
+    else:
+        base = f"""
+            SELECT ubicacion_id, producto_id, total_entradas AS e, total_salidas AS s
+            FROM stock_cierre_ubicacion WHERE {filtro} fecha = ?
+            UNION ALL"""
+        desde = "fecha > ? AND"
+        params = p + [cierre] + p + [cierre, hasta] + p + [cierre, hasta]
+    sql = f"""
+        SELECT ubicacion_id, producto_id, SUM(e) AS e, SUM(s) AS s FROM ({base}
+            SELECT ubicacion_id, producto_id, SUM(cantidad) AS e, 0 AS s FROM entradas
+            WHERE {filtro} {desde} fecha <= ? GROUP BY ubicacion_id, producto_id
+            UNION ALL
+            SELECT ubicacion_id, producto_id, 0, SUM(cantidad) FROM salidas
+            WHERE {filtro} {desde} fecha <= ? GROUP BY ubicacion_id, producto_id
+        )
+        GROUP BY ubicacion_id, producto_id
+    """
+    return sql, params
+
+
+def _reconstruir_cierres(conn, esperados):
+    conn.executemany("INSERT OR IGNORE INTO cierres (fecha) VALUES (?)", [(f,) for f in esperados])
+    pendientes = [f for (f,) in conn.execute(
+        "SELECT fecha FROM cierres WHERE fecha <= ? AND NOT valido ORDER BY fecha", (esperados[-1],))]
+    for cierre in pendientes:
+        anterior = conn.execute("SELECT MAX(fecha) FROM cierres WHERE fecha < ?", (cierre,)).fetchone()[0]
+        acumulado, params = _sql_acumulado(anterior, cierre)
+        conn.execute("DELETE FROM stock_cierre WHERE fecha = ?", (cierre,))
+        conn.execute(f"""
+            INSERT INTO stock_cierre (fecha, producto_id, total_entradas, total_salidas)
+            SELECT ?, producto_id, e, s FROM ({acumulado})
+        """, [cierre] + params)
+        acumulado, params = _sql_acumulado_ubicacion(anterior, cierre)
+        conn.execute("DELETE FROM stock_cierre_ubicacion WHERE fecha = ?", (cierre,))
+        conn.execute(f"""
+            INSERT INTO stock_cierre_ubicacion (fecha, ubicacion_id, producto_id, total_entradas, total_salidas)
+            SELECT ?, ubicacion_id, producto_id, e, s FROM ({acumulado})
+        """, [cierre] + params)
+        conn.execute("UPDATE cierres SET valido = 1 WHERE fecha = ?", (cierre,))
+
+
+def _actualizar_cierres(conn):
+    """Crea los cierres de los meses ya terminados y recalcula los que un
+    movimiento con fecha anterior dejó sin validez. Se llama dentro de la
+    transacción que escribe los movimientos."""
+    esperados = _cierres_esperados(conn, date.today().isoformat())
+    if not esperados:
+        return
+    fila = conn.execute("SELECT valido FROM cierres WHERE fecha = ?", (esperados[-1],)).fetchone()
+    # Los válidos son siempre los más viejos: si el último lo es, todos
+    if fila is None or not fila[0]:
+        _reconstruir_cierres(conn, esperados)
+
+
+def _sql_disponible_al(cierre, ubicacion=None):
+    """Expresión SQL con el stock de m.producto_id al final de un día,
+    partiendo de `cierre`; con `ubicacion` (id), el de esa ubicación.
+    Devuelve (sql, params), donde params(hasta) da los parámetros para ese día."""
+    if ubicacion is None:
+        # stock_cierre ya no cuenta las transferencias
+        tabla_cierre, en_cierre, filtro, p = "stock_cierre", "", f"{_SIN_TRANSFERENCIAS} AND", []
+    else:
+        tabla_cierre, p = "stock_cierre_ubicacion", [ubicacion]
+        en_cierre = filtro = "ubicacion_id = ? AND"
+    if cierre is None:
+        movimientos = f"{filtro} producto_id = m.producto_id AND fecha <= ?"
+        return f"""(
+            IFNULL((SELECT SUM(cantidad) FROM entradas WHERE {movimientos}), 0)
+            - IFNULL((SELECT SUM(cantidad) FROM salidas WHERE {movimientos}), 0)
+        )""", lambda hasta: p + [hasta] + p + [hasta]
+    movimientos = f"{filtro} producto_id = m.producto_id AND fecha > ? AND fecha <= ?"
+    return f"""(
+        IFNULL((SELECT total_entradas - total_salidas FROM {tabla_cierre}
+                WHERE fecha = ? AND {en_cierre} producto_id = m.producto_id), 0)
+        + IFNULL((SELECT SUM(cantidad) FROM entradas WHERE {movimientos}), 0)
+        - IFNULL((SELECT SUM(cantidad) FROM salidas WHERE {movimientos}), 0)
+    )""", lambda hasta: [cierre] + p + p + [cierre, hasta] + p + [cierre, hasta]
+
+
+@_cacheado("entradas", "salidas", "productos", "ubicaciones")
+def stock_al(fecha, producto=None, ubicacion=None):
+    """Stock de cada producto al final del día `fecha`.
+
+    Devuelve [(nombre, entradas, salidas, disponible), ...] con los totales
+    acumulados hasta esa fecha, en orden alfabético. `producto` limita el
+    resultado a ese nombre y `ubicacion` (id o nombre) a esa ubicación.
+    """
+    fecha = normalizar_fecha(fecha)
+    cierre = _ultimo_cierre(connect(), fecha)
+    if ubicacion is None:
+        acumulado, params = _sql_acumulado(cierre, fecha)
+    else:
+        ubicacion_id = _ubicacion_id(connect(), ubicacion)
+        acumulado, params = _sql_acumulado_ubicacion(cierre, fecha, ubicacion_id)
+    condicion = ""
+    if producto is not None:
+        condicion = "WHERE p.nombre = ?"
+        params.append(normalizar_nombre(producto))
+    cur = connect().execute(f"""
+        SELECT p.nombre, m.e, m.s, m.e - m.s
+        FROM ({acumulado}) AS m JOIN productos AS p ON p.id = m.producto_id
+        {condicion}
+        ORDER BY p.nombre
+    """, params)
+    return cur.fetchall()
+
+
+# 💾 Exportación a CSV
+_ENCABEZADOS_EXPORTACION = {
+    "entradas": ["Nombre", "Fecha", "Factura", "Cantidad", "Comentario", "Ubicación"],
+    "salidas": ["Nombre", "Fecha", "Operativo/No operativo", "Destino", "Cantidad", "Comentario", "Ubicación"],
+    "stock": ["Producto", "Entradas", "Salidas", "Stock disponible"],
+}
+
+
+FORMATOS_EXPORTACION = ("csv", "jsonl")
+
+
+def escribir_filas(f, tabla, formato="csv", filtro=None, orden=None, descendente=False,
+                   progreso=None, cancelado=None, tamano_lote=2000, rango=None, ubicacion=None):
+    """Escribe `tabla` en el archivo de texto abierto `f`, leyendo por lotes desde el cursor.
+
+    En "csv" se usan los encabezados de la pestaña y se omite el id; en
+    "jsonl" va un objeto por línea con los nombres de columna de la base.
+    `progreso(filas, total)` se llama tras cada lote y `cancelado()` permite
+    detenerse entre lotes. Devuelve un dict con filas y cancelado.
+    """
+    import csv
+    import json
+
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación desconocido: {formato!r}")
+    total = contar_filas(tabla, filtro, rango, ubicacion)
+    columnas = _TABLAS[tabla]["columnas"]
+    omitir_id = _TABLAS[tabla]["clave"] == "id"
+    if formato == "csv":
+        writer = csv.writer(f)
+        writer.writerow(_ENCABEZADOS_EXPORTACION[tabla])
+    escritas = 0
+    for lote in iterar_filas(tabla, filtro, orden, descendente, tamano_lote, rango, ubicacion):
+        if formato == "jsonl":
+            f.writelines(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n" for fila in lote)
+        else:
+            writer.writerows([fila[1:] for fila in lote] if omitir_id else lote)
+        escritas += len(lote)
+        if progreso:
+            progreso(escritas, total)
+        if cancelado and cancelado():
+            return {"filas": escritas, "cancelado": True}
+    return {"filas": escritas, "cancelado": False}
+
+
+def exportar_csv(tabla, ruta, filtro=None, orden=None, descendente=False,
+                 progreso=None, cancelado=None, tamano_lote=2000, rango=None, formato="csv", ubicacion=None):
+    """Escribe `tabla` en `ruta` como CSV (o JSON lines con formato="jsonl").
+
+    Se escribe primero en un archivo temporal que reemplaza a `ruta` al
+    terminar; si `cancelado()` devuelve True se borra y `ruta` no cambia.
+    `progreso(filas, total)` se llama tras cada lote. Devuelve un dict con
+    filas y cancelado.
+    """
+    temporal = ruta + ".tmp"
+    try:
+        with open(temporal, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+            resultado = escribir_filas(f, tabla, formato, filtro, orden, descendente,
+                                       progreso, cancelado, tamano_lote, rango, ubicacion)
+        if resultado["cancelado"]:
+            os.remove(temporal)
+        else:
+            os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return resultado
+
+
+# 📥 Importación masiva desde CSV
+# El archivo se lee por lotes: cada lote se valida, se comprueban sus
+# facturas (o el stock, en salidas) con una sola consulta y se inserta con
+# executemany dentro de su propia transacción. La memoria usada depende del
+# tamaño del lote, no del archivo. La ubicación es opcional (vacía = la
+# principal) y debe existir.
+_COLUMNAS_IMPORTACION = {
+    "entradas": ("nombre", "fecha", "factura", "cantidad", "comentario", "ubicacion"),
+    "salidas": ("nombre", "fecha", "estado", "destino", "cantidad", "comentario", "ubicacion"),
+}
+
+# Encabezados aceptados (sin tildes y en minúsculas) -> columna
+_ALIAS_ENCABEZADOS = {
+    "nombre": "nombre", "producto": "nombre", "nombre del producto": "nombre",
+    "fecha": "fecha",
+    "factura": "factura", "factura/guia": "factura", "guia": "factura",
+    "cantidad": "cantidad",
+    "comentario": "comentario", "comentarios": "comentario",
+    "estado": "estado", "operativo/no operativo": "estado",
+    "destino": "destino",
+    "ubicacion": "ubicacion", "bodega": "ubicacion",
+}
+
+MAX_RECHAZOS_GUARDADOS = 1000
+
+
+def _normalizar_encabezado(texto):
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return texto.strip().lower()
+
+
+def _validar_fila(tabla, valores):
+    """Devuelve la tupla lista para insertar o lanza ValueError con el motivo."""
+    fila = dict(valores)
+    if not fila.get("nombre"):
+        raise ValueError("falta el nombre")
+    fila["fecha"] = normalizar_fecha(fila.get("fecha"))
+    try:
+        fila["cantidad"] = int(str(fila.get("cantidad", "")).strip())
+    except ValueError:
+        raise ValueError(f"cantidad inválida {fila.get('cantidad')!r}") from None
+    if fila["cantidad"] <= 0:
+        raise ValueError("la cantidad debe ser mayor que cero")
+    if tabla == "entradas" and not fila.get("factura"):
+        raise ValueError("falta la factura")
+    if tabla == "salidas" and not fila.get("destino"):
+        raise ValueError("falta el destino")
+    return tuple(fila.get(col, "") for col in _COLUMNAS_IMPORTACION[tabla])
+
+
+def _en_grupos(valores, tamano=500):
+    valores = list(valores)
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def _insertar_lote(tabla, lote, rechazar):
+    """Comprueba e inserta un lote de (linea, fila). Devuelve cuántas filas se insertaron."""
+    columnas = ("producto_id",) + _COLUMNAS_IMPORTACION[tabla][1:-1] + ("ubicacion_id",)
+    aceptadas = []
+    creados = False
+    with transaccion("IMMEDIATE") as conn:
+        # Nombre -> id de producto; las entradas crean los que faltan
+        productos = {}
+        for nombre in dict.fromkeys(fila[0] for _, fila in lote):
+            productos[nombre], creado = _producto_id(conn, nombre, crear=tabla == "entradas")
+            creados = creados or creado
+        ubicaciones = {}
+        for nombre in dict.fromkeys(fila[-1] for _, fila in lote):
+            try:
+                ubicaciones[nombre] = _ubicacion_id(conn, nombre or None) or UBICACION_PRINCIPAL
+            except ValueError:
+                ubicaciones[nombre] = None
+        validas = []
+        for linea, fila in lote:
+            if ubicaciones[fila[-1]] is None:
+                rechazar(linea, f"la ubicación {fila[-1]!r} no existe")
+            else:
+                validas.append((linea, fila[:-1] + (ubicaciones[fila[-1]],)))
+        if tabla == "entradas":
+            existentes = set()
+            facturas = {fila[2] for _, fila in validas}
+            for grupo in _en_grupos(facturas):
+                marcas = ", ".join("?" * len(grupo))
+                existentes.update(r[0] for r in conn.execute(
+                    f"SELECT factura FROM entradas WHERE factura IN ({marcas})", grupo))
+            for linea, fila in validas:
+                if fila[2] in existentes:
+                    rechazar(linea, f"la factura {fila[2]!r} ya existe")
+                    continue
+                existentes.add(fila[2])
+                aceptadas.append((productos[fila[0]],) + fila[1:])
+        else:
+            # Stock de cada (ubicación, producto) del lote
+            disponible = {}
+            pares = {(fila[-1], productos[fila[0]]) for _, fila in validas if productos[fila[0]] is not None}
+            for ubicacion_id in {u for u, _ in pares}:
+                ids = [p for u, p in pares if u == ubicacion_id]
+                for grupo in _en_grupos(ids):
+                    marcas = ", ".join("?" * len(grupo))
+                    disponible.update(((ubicacion_id, p), d) for p, d in conn.execute(
+                        f"""SELECT producto_id, disponible FROM stock_ubicacion
+                            WHERE ubicacion_id = ? AND producto_id IN ({marcas})""", [ubicacion_id] + grupo))
+            for linea, fila in validas:
+                nombre, cantidad = fila[0], fila[4]
+                clave = (fila[-1], productos[nombre])
+                if cantidad > disponible.get(clave, 0):
+                    rechazar(linea, f"stock insuficiente para {nombre!r} (disponible: {disponible.get(clave, 0)})")
+                    continue
+                disponible[clave] = disponible.get(clave, 0) - cantidad
+                aceptadas.append((productos[nombre],) + fila[1:])
+        conn.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+            aceptadas,
+        )
+        _actualizar_cierres(conn)
+    if aceptadas:
+        _invalidar(tabla)
+    if creados:
+        _invalidar("productos")
+    return len(aceptadas)
+
+
+def importar_csv(tabla, ruta, tamano_lote=1000, progreso=None, cancelado=None):
+    """Importa movimientos de `tabla` (entradas o salidas) desde un CSV.
+
+    Acepta ',' o ';' como separador y, si la primera fila es un encabezado
+    reconocible, usa sus nombres de columna; si no, el orden de
+    _COLUMNAS_IMPORTACION. `progreso(lineas, fraccion)` se llama tras cada
+    lote, con 1.0 solo si se leyó el archivo entero, y `cancelado()` permite
+    detener la importación entre lotes (los lotes ya insertados se conservan).
+
+    Devuelve un dict con lineas, insertadas, rechazadas (total),
+    errores [(linea, motivo), ...] (hasta MAX_RECHAZOS_GUARDADOS) y cancelado.
+    """
+    import csv
+
+    columnas = _COLUMNAS_IMPORTACION[tabla]
+    resultado = {"lineas": 0, "insertadas": 0, "rechazadas": 0, "errores": [], "cancelado": False}
+
+    def rechazar(linea, motivo):
+        resultado["rechazadas"] += 1
+        if len(resultado["errores"]) < MAX_RECHAZOS_GUARDADOS:
+            resultado["errores"].append((linea, motivo))
+
+    tamano_total = max(1, os.path.getsize(ruta))
+    leido = 0
+
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+
+        def lineas_contadas():
+            nonlocal leido
+            for texto in f:
+                leido += len(texto.encode("utf-8"))
+                yield texto
+
+        reader = csv.reader(lineas_contadas(), dialecto)
+        orden = None
+        lote = []
+        for fila in reader:
+            if not any(c.strip() for c in fila):
+                continue
+            if orden is None:
+                encabezados = [_ALIAS_ENCABEZADOS.get(_normalizar_encabezado(c)) for c in fila]
+                if "nombre" in encabezados and "cantidad" in encabezados:
+                    orden = encabezados
+                    continue
+                orden = columnas
+            resultado["lineas"] += 1
+            try:
+                valores = ((col, c.strip()) for col, c in zip(orden, fila) if col)
+                lote.append((reader.line_num, _validar_fila(tabla, valores)))
+            except ValueError as e:
+                rechazar(reader.line_num, str(e))
+
+            if len(lote) >= tamano_lote:
+                resultado["insertadas"] += _insertar_lote(tabla, lote, rechazar)
+                lote = []
+                if progreso:
+                    progreso(resultado["lineas"], min(1.0, leido / tamano_total))
+                if cancelado and cancelado():
+                    resultado["cancelado"] = True
+                    break
+
+        # El último lote incompleto también respeta la cancelación
+        if lote and not resultado["cancelado"]:
+            if cancelado and cancelado():
+                resultado["cancelado"] = True
+            else:
+                resultado["insertadas"] += _insertar_lote(tabla, lote, rechazar)
+        # El 100 % solo si se leyó el archivo entero
+        if progreso and not resultado["cancelado"]:
+            progreso(resultado["lineas"], 1.0)
+    resultado["errores"].sort()
+    return resultado
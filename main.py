@@ -1,30 +1,156 @@
+import time
+
+_INICIO = time.perf_counter()  # antes de cualquier import pesado
+
+import os
+import sys
+import threading
+import multiprocessing
 import customtkinter as ctk
-from tabs.tab_entradas import TabEntradas
-from tabs.tab_salidas import TabSalidas
-from tabs.tab_inventario import TabInventario
-from database import crear_tablas
+from tkinter import messagebox
+from database import DB_PATH, migrar, migraciones_pendientes
+
+# ⏱️ Tiempos de arranque: (etapa, segundos desde _INICIO). Se imprimen y se
+# guardan en arranque.log junto a la base de datos al mostrarse los datos
+# de la primera pestaña.
+tiempos = [("importaciones", time.perf_counter() - _INICIO)]
+
+
+def marcar(etapa):
+    tiempos.append((etapa, time.perf_counter() - _INICIO))
+
+
+def informe_arranque():
+    marcar("primeros datos")
+    texto = " | ".join(f"{etapa} {segundos:.2f} s" for etapa, segundos in tiempos)
+    print(f"⏱️ Arranque: {texto}")
+    try:
+        with open(os.path.join(os.path.dirname(DB_PATH), "arranque.log"), "w", encoding="utf-8") as f:
+            f.writelines(f"{etapa}\t{segundos:.3f}\n" for etapa, segundos in tiempos)
+    except OSError:
+        pass
+
+
+# Cada pestaña se importa y se construye la primera vez que se selecciona.
+# Los imports van dentro de funciones (no con importlib) para que
+# PyInstaller los siga encontrando al empaquetar.
+def _tab_entradas(master, al_cargar):
+    from tabs.tab_entradas import TabEntradas
+    return TabEntradas(master, al_cargar=al_cargar)
+
+
+def _tab_salidas(master, al_cargar):
+    from tabs.tab_salidas import TabSalidas
+    return TabSalidas(master, al_cargar=al_cargar)
+
+
+def _tab_inventario(master, al_cargar):
+    from tabs.tab_inventario import TabInventario
+    return TabInventario(master, al_cargar=al_cargar)
+
+
+# Perfil de la interfaz (perfil_ui.py): solo si se pide al arrancar
+PERFIL_UI = "--perfil-ui" in sys.argv or os.environ.get("INVENTARIO_PERFIL_UI") == "1"
+
+
+def abrir_diagnostico(event=None):
+    # Ctrl+Shift+D: contadores y consultas lentas de database.py
+    from ui_utils import diagnostics_dialog
+    diagnostics_dialog(app)
+
+
+PESTANAS = {"Entradas": _tab_entradas, "Salidas": _tab_salidas, "Inventario": _tab_inventario}
+
+
+def iniciar_pestanas():
+    # Crear pestañas (vacías hasta que se seleccionan)
+    construidas = {}
+
+    def construir(nombre, al_cargar=None):
+        if nombre in construidas:
+            return
+        inicio = time.perf_counter()
+        construidas[nombre] = PESTANAS[nombre](tabview.tab(nombre), al_cargar)
+        print(f"⏱️ Pestaña {nombre} construida en {time.perf_counter() - inicio:.2f} s")
+
+    tabview = ctk.CTkTabview(app, width=980, height=680, command=lambda: construir(tabview.get()))
+    tabview.pack(padx=10, pady=10)
+    for nombre in PESTANAS:
+        tabview.add(nombre)
+        if PERFIL_UI:
+            import perfil_ui
+            perfil_ui.registrar_pestana(nombre, tabview.tab(nombre))
+
+    # Mostrar la ventana antes de construir la primera pestaña
+    app.update()
+    marcar("ventana visible")
+    construir(tabview.get(), al_cargar=informe_arranque)
+    marcar(f"pestaña {tabview.get()}")
+
+
+def actualizar_base_datos():
+    """Aplica las migraciones pendientes en segundo plano y luego carga las pestañas."""
+    estado = {"texto": "Actualizando base de datos..."}
+
+    aviso = ctk.CTkLabel(app, text=estado["texto"], font=("Segoe UI", 14))
+    aviso.pack(pady=(250, 10))
+    barra = ctk.CTkProgressBar(app, mode="indeterminate", width=300)
+    barra.pack()
+    barra.start()
+
+    def progreso(version, descripcion):
+        estado["texto"] = f"Actualizando base de datos...\n{descripcion}"
+
+    def trabajo():
+        try:
+            migrar(progreso)
+        except Exception as e:
+            estado["error"] = e
+
+    def esperar():
+        aviso.configure(text=estado["texto"])
+        if hilo.is_alive():
+            app.after(100, esperar)
+            return
+        barra.stop()
+        barra.destroy()
+        aviso.destroy()
+        if "error" in estado:
+            messagebox.showerror("Error", f"No se pudo actualizar la base de datos:\n{estado['error']}")
+            app.destroy()
+            return
+        marcar("migraciones")
+        iniciar_pestanas()
+
+    hilo = threading.Thread(target=trabajo, daemon=True)
+    hilo.start()
+    esperar()
+
 
 if __name__ == "__main__":
-    crear_tablas()
-    
-ctk.set_appearance_mode("System")
-ctk.set_default_color_theme("blue")
+    # El PDF se genera en otro proceso: en el .exe de PyInstaller ese
+    # proceso vuelve a arrancar main y freeze_support lo desvía
+    multiprocessing.freeze_support()
 
-app = ctk.CTk()
-app.title("Sistema de Inventario")
-app.geometry("1000x700")
+    ctk.set_appearance_mode("System")
+    ctk.set_default_color_theme("blue")
 
-# Crear pestañas
-tabview = ctk.CTkTabview(app, width=980, height=680)
-tabview.pack(padx=10, pady=10)
+    app = ctk.CTk()
+    app.title("Sistema de Inventario")
+    app.geometry("1000x700")
+    if PERFIL_UI:
+        import perfil_ui
+        perfil_ui.activar(app)
+    marcar("ventana creada")
+    app.bind_all("<Control-Shift-D>", abrir_diagnostico)
 
-tab_entradas = tabview.add("Entradas")
-tab_salidas = tabview.add("Salidas")
-tab_inventario = tabview.add("Inventario")
+    if migraciones_pendientes():
+        actualizar_base_datos()
+    else:
+        iniciar_pestanas()
 
-# Iniciar pestañas
-TabEntradas(tab_entradas)
-TabSalidas(tab_salidas)
-TabInventario(tab_inventario)
+    app.mainloop()
 
-app.mainloop()
+    if PERFIL_UI:
+        traza = os.path.join(os.path.dirname(DB_PATH), f"perfil_ui_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        print(f"⏱️ Perfil de la interfaz: {perfil_ui.guardar_traza(traza)} eventos en {traza}")
@@ -0,0 +1,201 @@
+# perfil_ui.py
+# ----------------------------------------------------
+# Perfil de la interfaz (opcional): cuánto tarda cada callback de Tk y
+# cuánto tiempo queda bloqueado el bucle de eventos.
+#
+# Se activa arrancando con  python main.py --perfil-ui  (o la variable
+# INVENTARIO_PERFIL_UI=1). Todos los callbacks que Tk llama en Python
+# (command de botones, bind de <Motion>, <Double-1>, encabezados, after)
+# pasan por tkinter.CallWrapper; activar() lo envuelve para medirlos y un
+# latido con after() detecta los bloqueos del bucle, tengan o no un
+# callback culpable (p. ej. dibujo y geometría de Tk).
+#
+# La traza usa el formato Trace Event de Chrome: se abre en
+# chrome://tracing, https://ui.perfetto.dev o https://speedscope.app
+# (gráfico de llamas).
+# ----------------------------------------------------
+
+import json
+import os
+import threading
+import time
+import tkinter
+from collections import deque
+
+INTERVALO_LATIDO_MS = 50        # cada cuánto se revisa el bucle de eventos
+UMBRAL_BLOQUEO_MS = 50          # retraso del latido que cuenta como bloqueo
+MIN_TRAZA_MS = 0.2              # callbacks más cortos solo suman en los contadores
+MAX_EVENTOS = 200000            # eventos guardados para la traza (los más viejos se descartan)
+
+_INICIO = time.perf_counter()
+_original = tkinter.CallWrapper.__call__
+_estado = {"activo": False, "raiz": None, "esperado": None, "ultimo_largo": None}
+_pestanas = {}                  # ruta del widget de la pestaña -> nombre
+_estadisticas = {}              # (pestaña, nombre) -> contadores
+_bloqueos = {"veces": 0, "total_ms": 0.0, "max_ms": 0.0}
+_eventos = deque(maxlen=MAX_EVENTOS)
+_lock = threading.Lock()
+
+
+def activo():
+    return _estado["activo"]
+
+
+def activar(raiz):
+    """Empieza a medir los callbacks y el bucle de eventos de `raiz`.
+
+    Debe llamarse antes de crear los widgets: los callbacks que Tk ya
+    registró siguen sin medirse.
+    """
+    if _estado["activo"]:
+        return
+    _estado.update(activo=True, raiz=raiz)
+    tkinter.CallWrapper.__call__ = _llamar
+    _estado["esperado"] = time.perf_counter() + INTERVALO_LATIDO_MS / 1000
+    raiz.after(INTERVALO_LATIDO_MS, _latido)
+
+
+def registrar_pestana(nombre, widget):
+    """Los callbacks de `widget` y sus hijos se cuentan en la pestaña `nombre`."""
+    _pestanas[str(widget)] = nombre
+
+
+def limpiar():
+    """Pone en cero los contadores y descarta la traza."""
+    with _lock:
+        _estadisticas.clear()
+        _eventos.clear()
+        _bloqueos.update(veces=0, total_ms=0.0, max_ms=0.0)
+
+
+# ---------------------------------------------------
+# Medición
+# ---------------------------------------------------
+def _pestana(widget):
+    ruta = str(widget)
+    mejor = None
+    for prefijo in _pestanas:
+        if (ruta == prefijo or ruta.startswith(prefijo + ".")) and (mejor is None or len(prefijo) > len(mejor)):
+            mejor = prefijo
+    return _pestanas[mejor] if mejor else "Ventana"
+
+
+def _funcion_real(func):
+    """La función que escribió alguien, no el envoltorio de after() o de CTk."""
+    codigo = getattr(func, "__code__", None)
+    if codigo is not None and func.__closure__ and codigo.co_name == "callit":
+        celdas = dict(zip(codigo.co_freevars, func.__closure__))
+        if "func" in celdas:
+            return celdas["func"].cell_contents  # Misc.after
+    dueno = getattr(func, "__self__", None)
+    comando = getattr(dueno, "_command", None)
+    if callable(comando) and getattr(func, "__name__", "") == "_clicked":
+        return comando  # CTkButton y parecidos llaman a su command desde un bind
+    return func
+
+
+def _describir(func):
+    func = _funcion_real(func)
+    nombre = getattr(func, "__qualname__", None) or getattr(func, "__name__", None) or type(func).__name__
+    codigo = getattr(getattr(func, "__func__", func), "__code__", None)
+    ubicacion = f"{os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno}" if codigo else ""
+    return func, nombre, ubicacion
+
+
+def _tipo_evento(envoltura, args):
+    if not envoltura.subst or len(args) != len(tkinter.Misc._subst_format):
+        return None
+    try:
+        return tkinter.EventType(args[tkinter.Misc._subst_format.index("%T")]).name
+    except ValueError:
+        return None
+
+
+def _llamar(self, *args):
+    inicio = time.perf_counter()
+    try:
+        return _original(self, *args)
+    finally:
+        fin = time.perf_counter()
+        _registrar(self, args, inicio, fin)
+
+
+def _registrar(envoltura, args, inicio, fin):
+    func, nombre, ubicacion = _describir(envoltura.func)
+    if func is _latido:
+        return
+    tipo = _tipo_evento(envoltura, args)
+    if tipo:
+        nombre = f"{nombre} <{tipo}>"
+    pestana = _pestana(envoltura.widget)
+    ms = (fin - inicio) * 1000
+    with _lock:
+        datos = _estadisticas.setdefault((pestana, nombre), {
+            "veces": 0, "total_ms": 0.0, "max_ms": 0.0, "ubicacion": ubicacion})
+        datos["veces"] += 1
+        datos["total_ms"] += ms
+        datos["max_ms"] = max(datos["max_ms"], ms)
+        if ms >= MIN_TRAZA_MS:
+            _eventos.append({"name": nombre, "cat": pestana, "ph": "X",
+                             "ts": round((inicio - _INICIO) * 1e6), "dur": round(ms * 1000),
+                             "pid": os.getpid(), "tid": threading.get_ident(),
+                             "args": {"ubicacion": ubicacion}})
+    if ms >= UMBRAL_BLOQUEO_MS:
+        _estado["ultimo_largo"] = (f"{pestana}: {nombre}", fin)
+
+
+def _latido():
+    ahora = time.perf_counter()
+    retraso = (ahora - _estado["esperado"]) * 1000
+    if retraso >= UMBRAL_BLOQUEO_MS:
+        # El culpable es el último callback largo que terminó durante el bloqueo
+        culpable = "trabajo de Tk (dibujo, geometría) o código fuera de callbacks"
+        ultimo = _estado["ultimo_largo"]
+        if ultimo and ultimo[1] >= _estado["esperado"]:
+            culpable = ultimo[0]
+        with _lock:
+            _bloqueos["veces"] += 1
+            _bloqueos["total_ms"] += retraso
+            _bloqueos["max_ms"] = max(_bloqueos["max_ms"], retraso)
+            _eventos.append({"name": "bucle bloqueado", "cat": "bloqueo", "ph": "X",
+                             "ts": round((_estado["esperado"] - _INICIO) * 1e6), "dur": round(retraso * 1000),
+                             "pid": os.getpid(), "tid": threading.get_ident(),
+                             "args": {"culpable": culpable}})
+    _estado["esperado"] = ahora + INTERVALO_LATIDO_MS / 1000
+    try:
+        _estado["raiz"].after(INTERVALO_LATIDO_MS, _latido)
+    except tkinter.TclError:
+        pass  # la ventana se cerró
+
+
+# ---------------------------------------------------
+# Resultados
+# ---------------------------------------------------
+def peores(limite=10):
+    """{pestaña: [callbacks con más tiempo total]} y los bloqueos del bucle."""
+    with _lock:
+        filas = [(clave, dict(datos)) for clave, datos in _estadisticas.items()]
+        bloqueos = dict(_bloqueos)
+    por_pestana = {}
+    for (pestana, nombre), datos in sorted(filas, key=lambda f: f[1]["total_ms"], reverse=True):
+        lista = por_pestana.setdefault(pestana, [])
+        if limite is None or len(lista) < limite:
+            lista.append({"nombre": nombre, **datos,
+                          "total_ms": round(datos["total_ms"], 1), "max_ms": round(datos["max_ms"], 1),
+                          "medio_ms": round(datos["total_ms"] / datos["veces"], 2)})
+    bloqueos["total_ms"] = round(bloqueos["total_ms"], 1)
+    bloqueos["max_ms"] = round(bloqueos["max_ms"], 1)
+    return {"pestanas": por_pestana, "bloqueos": bloqueos}
+
+
+def guardar_traza(ruta):
+    """Escribe la traza en formato Trace Event de Chrome; devuelve cuántos eventos tiene."""
+    with _lock:
+        eventos = list(_eventos)
+    meta = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "Sistema de Inventario"}},
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": threading.main_thread().ident,
+             "args": {"name": "Tk"}}]
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": meta + eventos, "displayTimeUnit": "ms",
+                   "otherData": {"resumen": peores(limite=None)}}, f, ensure_ascii=False)
+    return len(eventos)
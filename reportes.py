@@ -0,0 +1,185 @@
+# reportes.py
+# ----------------------------------------------------
+# Reporte PDF del inventario con reportlab.
+#
+# Las filas se leen por lotes desde el cursor (database.iterar_filas) y se
+# dibujan página a página: cada página es una tabla con su encabezado, el
+# color del stock y el pie "Página X de Y". En memoria hay una página de
+# filas a la vez (el canvas guarda las anteriores ya comprimidas). La
+# interfaz lo ejecuta en otro proceso (proceso_pdf) para que la ventana
+# siga respondiendo con catálogos grandes.
+# ----------------------------------------------------
+
+import os
+from datetime import datetime
+
+from database import contar_filas, iterar_filas
+
+TITULO = "Reporte de Inventario"
+ENCABEZADOS = ["Producto", "Entradas", "Salidas", "Stock disponible"]
+ANCHOS = [255, 80, 80, 100]
+
+MARGEN = 40
+ALTO_ENCABEZADO = 20
+ALTO_FILA = 16
+STOCK_BAJO = 3  # mismo umbral que el resaltado de la pestaña Inventario
+
+
+def _fecha_corta(iso):
+    return datetime.strptime(iso, "%Y-%m-%d").strftime("%d-%m-%Y")
+
+
+def _subtitulo(filtro, rango, ubicacion):
+    partes = [f"Generado el {datetime.now().strftime('%d-%m-%Y %H:%M')}"]
+    if rango:
+        partes.append(f"Período {_fecha_corta(rango[0])} al {_fecha_corta(rango[1])}")
+    if ubicacion is not None:
+        partes.append(f"Ubicación: {ubicacion}")
+    if filtro:
+        partes.append(f"Búsqueda: {filtro}")
+    return "  ·  ".join(partes)
+
+
+def _recortar(texto, ancho, fuente, tamano):
+    """Acorta `texto` con '…' para que quepa en `ancho` puntos."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    texto = str(texto)
+    if stringWidth(texto, fuente, tamano) <= ancho:
+        return texto
+    while texto and stringWidth(texto + "…", fuente, tamano) > ancho:
+        texto = texto[:-1]
+    return texto + "…"
+
+
+def generar_pdf_inventario(ruta, filtro=None, orden=None, descendente=False, rango=None,
+                           progreso=None, cancelado=None, ubicacion=None):
+    """Escribe en `ruta` el inventario con el mismo filtro, orden, período y ubicación que la pestaña.
+
+    Como exportar_csv, se escribe en un archivo temporal que reemplaza a
+    `ruta` al terminar; si `cancelado()` devuelve True no se escribe nada y
+    `ruta` no cambia. `progreso(filas, total)` se llama tras cada página. Devuelve un
+    dict con filas, paginas y cancelado.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+
+    ancho, alto = A4
+    total = contar_filas("stock", filtro, rango, ubicacion)
+    stock = "Stock disponible"
+    if rango and rango[1] < datetime.now().strftime("%Y-%m-%d"):
+        stock = f"Stock al {_fecha_corta(rango[1])}"
+    encabezados = ENCABEZADOS[:3] + [stock]
+    subtitulo = _subtitulo(filtro, rango, ubicacion)
+
+    # La primera página lleva el título completo; las demás, uno más chico
+    arriba_primera = alto - 85
+    arriba_resto = alto - 55
+    filas_primera = int((arriba_primera - MARGEN - ALTO_ENCABEZADO) // ALTO_FILA)
+    filas_resto = int((arriba_resto - MARGEN - ALTO_ENCABEZADO) // ALTO_FILA)
+
+    estilo_base = [
+        ("FONT", (0, 0), (-1, 0), "Helvetica-Bold", 10),
+        ("FONT", (0, 1), (-1, -1), "Helvetica", 9),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f6aa5")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f0f0f0")]),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.HexColor("#c8c8c8")),
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.HexColor("#808080")),
+    ]
+
+    pdf = None
+    paginas = 0
+    hechas = 0
+
+    def dibujar_pagina(filas):
+        nonlocal paginas, hechas
+        paginas += 1
+        if paginas == 1:
+            pdf.setFont("Helvetica-Bold", 16)
+            pdf.drawString(MARGEN, alto - 50, TITULO)
+            pdf.setFont("Helvetica", 9)
+            pdf.drawString(MARGEN, alto - 68, subtitulo)
+            arriba = arriba_primera
+        else:
+            pdf.setFont("Helvetica-Bold", 10)
+            pdf.drawString(MARGEN, alto - 35, TITULO)
+            arriba = arriba_resto
+
+        datos = [encabezados]
+        estilo = list(estilo_base)
+        for i, (nombre, entradas, salidas, disponible) in enumerate(filas, start=1):
+            datos.append([_recortar(nombre, ANCHOS[0] - 12, "Helvetica", 9), entradas, salidas, disponible])
+            if int(disponible) <= 0:
+                estilo.append(("TEXTCOLOR", (0, i), (-1, i), colors.red))
+            elif int(disponible) <= STOCK_BAJO:
+                estilo.append(("TEXTCOLOR", (0, i), (-1, i), colors.darkorange))
+        tabla = Table(datos, colWidths=ANCHOS, rowHeights=[ALTO_ENCABEZADO] + [ALTO_FILA] * len(filas))
+        tabla.setStyle(TableStyle(estilo))
+        _, alto_tabla = tabla.wrapOn(pdf, ancho, alto)
+        tabla.drawOn(pdf, MARGEN, arriba - alto_tabla)
+
+        # Pie: el total de páginas es un formulario que se define al final
+        pdf.setFont("Helvetica", 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawString(MARGEN, 22, TITULO)
+        pdf.drawRightString(ancho - MARGEN - 14, 22, f"Página {paginas} de")
+        pdf.doForm("total_paginas")
+        pdf.setFillColor(colors.black)
+        pdf.showPage()
+
+        hechas += len(filas)
+        if progreso:
+            progreso(hechas, total)
+
+    # El canvas solo escribe el archivo en save(): al cancelar no queda nada
+    temporal = ruta + ".tmp"
+    try:
+        pdf = canvas.Canvas(temporal, pagesize=A4, pageCompression=1)
+        pdf.setTitle(TITULO)
+        pendientes = []
+        capacidad = filas_primera
+        for lote in iterar_filas("stock", filtro, orden, descendente, filas_resto, rango, ubicacion):
+            pendientes.extend(lote)
+            while len(pendientes) >= capacidad:
+                dibujar_pagina(pendientes[:capacidad])
+                del pendientes[:capacidad]
+                capacidad = filas_resto
+            if cancelado and cancelado():
+                return {"filas": hechas, "paginas": paginas, "cancelado": True}
+        if pendientes or not paginas:
+            dibujar_pagina(pendientes)
+
+        pdf.beginForm("total_paginas")
+        pdf.setFont("Helvetica", 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawString(ancho - MARGEN - 12, 22, str(paginas))
+        pdf.endForm()
+        pdf.save()
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return {"filas": hechas, "paginas": paginas, "cancelado": False}
+
+
+def proceso_pdf(cola, cancelar, ruta, opciones):
+    """Punto de entrada del proceso que genera el PDF.
+
+    Envía por `cola` ("progreso", filas, total) y al final ("listo", resultado)
+    o ("error", mensaje); `cancelar` es un multiprocessing.Event.
+    """
+    try:
+        resultado = generar_pdf_inventario(
+            ruta, **opciones,
+            progreso=lambda filas, total: cola.put(("progreso", filas, total)),
+            cancelado=cancelar.is_set,
+        )
+        cola.put(("listo", resultado))
+    except Exception as e:
+        cola.put(("error", str(e) or type(e).__name__))
@@ -4,18 +4,18 @@
 # ----------------------------------------------------
 
 import customtkinter as ctk
-import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from tkcalendar import DateEntry
 from datetime import datetime
-import csv
 
 from database import (
-    obtener_entradas,
+    obtener_pagina,
+    contar_filas,
     agregar_entrada,
     eliminar_entrada,
     actualizar_entrada,
-    factura_existe
+    factura_existe,
+    normalizar_fecha,
+    obtener_ubicaciones,
 )
 
 from ui_utils import (
@@ -26,68 +26,37 @@ from ui_utils import (
     create_combobox,
     create_button,
     create_search_bar,
+    DateRangeBar,
     apply_table_style,
+    import_csv_dialog,
+    export_csv_dialog,
+    QueryExecutor,
+    VirtualTable,
+    CellTooltip,
     COLORES,
 )
 
-# Simple tooltip class (Toplevel) to show long comments
-class Tooltip:
-    def __init__(self, parent):
-        self.parent = parent
-        self.tw = None
-
-    def show(self, text, x, y):
-        self.hide()
-        if not text:
-            return
-        self.tw = tw = tk.Toplevel(self.parent)
-        tw.wm_overrideredirect(True)
-        tw.attributes("-topmost", True)
-        lbl = tk.Label(tw, text=text, justify="left", background="#ffffe0",
-                       relief="solid", borderwidth=1, font=("Segoe UI", 9), wraplength=500)
-        lbl.pack(ipadx=4, ipady=3)
-        tw.wm_geometry("+%d+%d" % (x, y))
-
-    def hide(self):
-        if self.tw:
-            try:
-                self.tw.destroy()
-            finally:
-                self.tw = None
-
-
 class TabEntradas:
-    def __init__(self, master):
+    def __init__(self, master, al_cargar=None):
         self.master = master
         aplicar_estilo_general(self.master)
 
         # state
-        self.page = 0
-        self.items_per_page = 10
         self.sort_by = None
         self.sort_reverse = False
         self.selected_id = None  # id from DB of selected row
-        self.entradas_full = []
+        self.consulta = ("", None, False, None)  # (filter, sort, reverse, date range) the table is showing
+        self.page_text = ""
 
-        # tooltip helper
-        self.tooltip = Tooltip(self.master)
+        # DB calls run in worker threads; results come back through after()
+        self.db = QueryExecutor(self.master, on_busy=self._set_busy)
 
         # build UI
         self._crear_interfaz()
-        # load data
-        self.actualizar_tabla()
+        # load data (al_cargar runs once the first rows are shown)
+        self.actualizar_tabla(after_render=al_cargar)
 
     # ---------- date helpers ----------
-    def _to_db_date(self, display_date_str):
-        """Converts 'dd-mm-YYYY' or 'YYYY-mm-dd' to 'YYYY-mm-dd' for DB"""
-        for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
-            try:
-                d = datetime.strptime(display_date_str, fmt)
-                return d.strftime("%Y-%m-%d")
-            except Exception:
-                continue
-        return display_date_str
-
     def _to_display_date(self, db_date_str):
         """Converts 'YYYY-mm-dd' to 'dd-mm-YYYY' for display"""
         try:
@@ -98,6 +67,8 @@ class TabEntradas:
 
     # ---------- UI ----------
     def _crear_interfaz(self):
+        from tkcalendar import DateEntry  # slow to import (loads babel)
+
         # Top outer frame
         top_outer = create_frame(self.master, fg_color=COLORES["recuadro"])
         top_outer.pack(fill="x", padx=12, pady=(12, 6))
@@ -125,6 +96,8 @@ class TabEntradas:
         lbl_cantidad.grid(row=0, column=4, sticky="s", pady=(0, 4))
         lbl_comentario = create_label(form_frame, "Comentario", font=("Segoe UI", 11, "bold"))
         lbl_comentario.grid(row=0, column=5, columnspan=2, sticky="s", pady=(0, 4))
+        lbl_ubicacion = create_label(form_frame, "Ubicación", font=("Segoe UI", 11, "bold"))
+        lbl_ubicacion.grid(row=0, column=7, sticky="s", pady=(0, 4))
 
         # Inputs (second row) - widths tuned, date selector for fecha
         self.nombre_entry = create_entry(form_frame, placeholder="Ingresa Nombre", width=320)
@@ -143,6 +116,10 @@ class TabEntradas:
         self.comentario_entry = create_entry(form_frame, placeholder="Ingresa Comentario", width=300)
         self.comentario_entry.grid(row=1, column=5, columnspan=2, padx=6, sticky="we")
 
+        # where the goods arrive; filled from the DB in _actualizar_ubicaciones
+        self.ubicacion_combo = create_combobox(form_frame, values=[], width=150)
+        self.ubicacion_combo.grid(row=1, column=7, padx=6)
+
         # Buttons centered below form
         btns_frame = create_frame(top_outer, fg_color="transparent")
         btns_frame.pack(pady=(6, 10))
@@ -164,39 +141,41 @@ class TabEntradas:
         #self.btn_actualizar = create_button(btns_frame, "🔄 Actualizar", command=self.actualizar_tabla, style="primary", width=160)
         #self.btn_actualizar.grid(row=0, column=4, padx=8, pady=6)
 
+        self.btn_importar = create_button(btns_frame, "📥 Importar CSV", command=self._importar_csv, style="primary", width=160)
+        self.btn_importar.grid(row=0, column=4, padx=8, pady=6)
+
         self.btn_exportar = create_button(btns_frame, "💾 Exportar CSV", command=self._exportar_csv, style="success", width=160)
         self.btn_exportar.grid(row=0, column=5, padx=8, pady=6)
 
-        # ----- Lower section (search + table + pagination) -----
+        # ----- Lower section (search + table) -----
         lower_outer = create_frame(self.master, fg_color=COLORES["recuadro"])
         lower_outer.pack(fill="both", expand=True, padx=12, pady=(6, 12))
 
-        # top bar: search (left) and pagination (right)
+        # top bar: search and date range (left), visible rows (right)
         top_bar = create_frame(lower_outer, fg_color="transparent")
         top_bar.pack(fill="x", padx=10, pady=(8, 4))
 
         # search
-        search_frame, self.search_entry = create_search_bar(top_bar, self._on_search)
+        search_frame, self.search_entry = create_search_bar(top_bar, self._on_search, live=True)
         search_frame.pack(side="left", fill="x", expand=True)
 
-        # pagination controls on the right
-        pag_frame = create_frame(top_bar, fg_color="transparent")
-        pag_frame.pack(side="right")
-        pag_frame.grid_columnconfigure((0,1,2), weight=1)
-
-        self.btn_prev = create_button(pag_frame, "⬅", command=self._pagina_anterior, style="primary", width=40)
-        self.btn_prev.grid(row=0, column=0, padx=6)
-        self.lbl_pagina = create_label(pag_frame, "Página 1", font=("Segoe UI", 12, "bold"))
-        self.lbl_pagina.grid(row=0, column=1)
-        self.btn_next = create_button(pag_frame, "➡", command=self._pagina_siguiente, style="primary", width=40)
-        self.btn_next.grid(row=0, column=2, padx=6)
-
-        # Treeview area
-        tree_frame = create_frame(lower_outer, fg_color="transparent")
-        tree_frame.pack(fill="both", expand=True, padx=10, pady=(6,8))
-
-        cols = ("nombre", "fecha", "factura", "cantidad", "comentario")
-        self.tree = ttk.Treeview(tree_frame, columns=cols, show="headings", selectmode="browse", height=14)
+        # date range: only entries dated inside it
+        self.periodo = DateRangeBar(top_bar, self._on_search)
+        self.periodo.frame.pack(side="left", padx=6)
+
+        # visible range on the right
+        self.lbl_pagina = create_label(top_bar, "", font=("Segoe UI", 12, "bold"))
+        self.lbl_pagina.pack(side="right", padx=6)
+
+        # Treeview area: only the visible rows live in the tree, the rest
+        # is fetched block by block while scrolling
+        cols = ("nombre", "fecha", "factura", "cantidad", "ubicacion", "comentario")
+        self.table = VirtualTable(
+            lower_outer, cols, self.db, self._consultar_bloque, self._contar,
+            row_values=self._valores_fila, on_change=self._mostrar_rango, selectmode="browse",
+        )
+        self.table.frame.pack(fill="both", expand=True, padx=10, pady=(6,8))
+        self.tree = self.table.tree
         apply_table_style(self.tree)
 
         # headings with sorting commands
@@ -204,6 +183,7 @@ class TabEntradas:
         self.tree.heading("fecha", text="Fecha", command=lambda: self._ordenar("fecha"))
         self.tree.heading("factura", text="Factura/Guía", command=lambda: self._ordenar("factura"))
         self.tree.heading("cantidad", text="Cantidad", command=lambda: self._ordenar("cantidad"))
+        self.tree.heading("ubicacion", text="Ubicación")
         self.tree.heading("comentario", text="Comentario")
 
         # column widths
@@ -211,90 +191,57 @@ class TabEntradas:
         self.tree.column("fecha", width=110, anchor="center", stretch=False)
         self.tree.column("factura", width=160, anchor="center", stretch=False)
         self.tree.column("cantidad", width=100, anchor="center", stretch=False)
+        self.tree.column("ubicacion", width=140, anchor="center", stretch=False)
         self.tree.column("comentario", width=360, anchor="w", stretch=True)
 
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=vsb.set)
-        vsb.pack(side="right", fill="y")
-        self.tree.pack(fill="both", expand=True, side="left")
 
         # bind events
         self.tree.bind("<Double-1>", self._on_double_click)
-        self.tree.bind("<Motion>", self._on_motion)
-        self.tree.bind("<Leave>", lambda e: self.tooltip.hide())
+        # long comments show in a tooltip over the comentario column ("#6")
+        self.tooltip = CellTooltip(self.tree, "#6", self._comentario_de)
 
     # ---------- Data load / display ----------
-    def actualizar_tabla(self):
-        """Fetch all entries from DB and display first page"""
-        try:
-            self.entradas_full = obtener_entradas()
-        except Exception:
-            self.entradas_full = []
-        self.page = 0
-        self._mostrar_pagina()
-
-    def _apply_search_and_sort(self):
-        filtro = (self.search_entry.get() or "").strip().lower()
-        lista = list(self.entradas_full)
-        if filtro:
-            lista = [r for r in lista if filtro in str(r[1]).lower() or filtro in str(r[3]).lower() or filtro in str(r[5]).lower()]
-        if self.sort_by:
-            idx_map = {"nombre": 1, "fecha": 2, "factura": 3, "cantidad": 4}
-            idx = idx_map.get(self.sort_by, 1)
-            def keyfn(x):
-                v = x[idx]
-                if self.sort_by == "fecha":
-                    try:
-                        return datetime.strptime(v, "%Y-%m-%d")
-                    except:
-                        return datetime.min
-                if self.sort_by == "cantidad":
-                    try:
-                        return int(v)
-                    except:
-                        return 0
-                return str(v).lower() if v is not None else ""
-            lista.sort(key=keyfn, reverse=self.sort_reverse)
-        return lista
-
-    def _mostrar_pagina(self):
-        data = self._apply_search_and_sort()
-        total = len(data)
-        start = self.page * self.items_per_page
-        end = start + self.items_per_page
-        page_items = data[start:end]
-
-        # clear
-        for r in self.tree.get_children():
-            self.tree.delete(r)
-
-        # insert with iid as DB id
-        for row in page_items:
-            # row is (id, nombre, fecha, factura, cantidad, comentario) per DB
-            iid = str(row[0])
-            values = (row[1], self._to_display_date(row[2]), row[3], row[4], row[5])
-            self.tree.insert("", "end", iid=iid, values=values)
-
-        total_pages = max(1, (total + self.items_per_page - 1) // self.items_per_page)
-        self.lbl_pagina.configure(text=f"Página {self.page + 1} de {total_pages}")
-
-        # enable/disable buttons
-        self.btn_prev.configure(state="normal" if self.page > 0 else "disabled")
-        self.btn_next.configure(state="normal" if end < total else "disabled")
-
-    # ---------- Pagination ----------
-    def _pagina_anterior(self):
-        if self.page > 0:
-            self.page -= 1
-            self._mostrar_pagina()
-
-    def _pagina_siguiente(self):
-        # calculate total pages to prevent overflow
-        total = len(self._apply_search_and_sort())
-        max_pages = max(1, (total + self.items_per_page - 1) // self.items_per_page)
-        if self.page < max_pages - 1:
-            self.page += 1
-            self._mostrar_pagina()
+    def actualizar_tabla(self, after_render=None):
+        """Reload from DB and display from the first row"""
+        self._actualizar_ubicaciones()
+        self.consulta = (self._filtro(), self.sort_by, self.sort_reverse, self.periodo.rango())
+        self.table.reload(then=after_render)
+
+    def _filtro(self):
+        return (self.search_entry.get() or "").strip()
+
+    def _actualizar_ubicaciones(self):
+        def aplicar(ubicaciones):
+            nombres = [nombre for _, nombre in ubicaciones]
+            self.ubicacion_combo.configure(values=nombres)
+            if self.ubicacion_combo.get() not in nombres and nombres:
+                self.ubicacion_combo.set(nombres[0])  # the main location comes first
+
+        self.db.submit("ubicaciones", obtener_ubicaciones, on_done=aplicar)
+
+    def _consultar_bloque(self, cursor, offset, limit):
+        # runs in a worker thread
+        filtro, orden, descendente, rango = self.consulta
+        return obtener_pagina("entradas", filtro, orden, descendente,
+                              cursor=cursor, limite=limit, desplazamiento=offset, rango=rango)
+
+    def _contar(self):
+        # runs in a worker thread
+        return contar_filas("entradas", self.consulta[0], self.consulta[3])
+
+    def _valores_fila(self, row):
+        # row is (id, nombre, fecha, factura, cantidad, comentario, ubicacion) per DB;
+        # the comment stays as the last (widest) column
+        return (row[1], self._to_display_date(row[2]), row[3], row[4], row[6], row[5])
+
+    def _mostrar_rango(self, first, last, total):
+        self.tooltip.hide()  # the rows under the pointer changed
+        self.page_text = f"Filas {first}–{last} de {total}" if total else "Sin resultados"
+        self.lbl_pagina.configure(text=self.page_text)
+
+    def _set_busy(self, busy):
+        self.tree.configure(cursor="watch" if busy else "")
+        self.lbl_pagina.configure(text="⏳ Cargando..." if busy else self.page_text)
 
     # ---------- Sorting ----------
     def _ordenar(self, columna):
@@ -303,17 +250,16 @@ class TabEntradas:
         else:
             self.sort_by = columna
             self.sort_reverse = False
-        self.page = 0
-        self._mostrar_pagina()
+        self.actualizar_tabla()
 
     # ---------- Add / Update / Delete ----------
     def _guardar_entrada(self):
         nombre = self.nombre_entry.get().strip()
-        fecha_display = self.fecha_entry.get_date().strftime("%d-%m-%Y")
-        fecha_db = self._to_db_date(fecha_display)
+        fecha_db = normalizar_fecha(self.fecha_entry.get_date())
         factura = self.factura_entry.get().strip()
         cantidad_str = self.cantidad_entry.get().strip()
         comentario = self.comentario_entry.get().strip()
+        ubicacion = self.ubicacion_combo.get().strip() or None
 
         if not all([nombre, fecha_db, factura, cantidad_str]):
             messagebox.showwarning("Campos incompletos", "Completa todos los campos obligatorios.")
@@ -326,35 +272,47 @@ class TabEntradas:
             return
 
         # If editing (selected_id set), then update; otherwise add.
-        if self.selected_id:
-            # When editing, allow same factura as existing; but if user changed factura to one that exists on another id, block.
-            if factura_existe(factura):
-                # need to ensure it belongs to same record or is unique
-                # find entry with same factura
-                same = [r for r in self.entradas_full if r[3] == factura]
-                if same and str(same[0][0]) != str(self.selected_id):
+        id_editar = int(self.selected_id) if self.selected_id else None
+
+        def guardar():
+            # runs in a worker thread. When editing, allow same factura as
+            # existing; but if it is used by another id, block.
+            if factura_existe(factura, excluir_id=id_editar):
+                return False
+            if id_editar:
+                actualizar_entrada(id_editar, nombre, fecha_db, factura, cantidad, comentario, ubicacion=ubicacion)
+            else:
+                agregar_entrada(nombre, fecha_db, factura, cantidad, comentario, ubicacion=ubicacion)
+            return True
+
+        def terminado(guardado):
+            self.btn_agregar.configure(state="normal")
+            if not guardado:
+                if id_editar:
                     messagebox.showerror("Factura existente", "Otra entrada usa esa factura. Usa otra o elimina la otra entrada.")
-                    return
-            try:
-                actualizar_entrada(int(self.selected_id), nombre, fecha_db, factura, cantidad, comentario)
-                messagebox.showinfo("Actualizado", "Entrada actualizada correctamente.")
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo actualizar: {e}")
-        else:
-            # adding new -> enforce factura unique
-            if factura_existe(factura):
-                messagebox.showerror("Factura existente", "Ya existe una entrada con ese número de factura.")
+                else:
+                    messagebox.showerror("Factura existente", "Ya existe una entrada con ese número de factura.")
                 return
-            try:
-                agregar_entrada(nombre, fecha_db, factura, cantidad, comentario)
+            if id_editar:
+                messagebox.showinfo("Actualizado", "Entrada actualizada correctamente.")
+            else:
                 messagebox.showinfo("Agregado", "Entrada agregada correctamente.")
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo agregar: {e}")
+            if id_editar:
+                # same rows in the same place: only the edited row is repainted
+                self.table.reload(keep_position=True)
+            else:
+                # reload and highlight the recently added row
+                self.actualizar_tabla(after_render=self._highlight_recent)
+            self._limpiar_formulario()
 
-        # reload and highlight recently added/edited
-        self.actualizar_tabla()
-        self._highlight_recent()
-        self._limpiar_formulario()
+        def fallo(e):
+            self.btn_agregar.configure(state="normal")
+            accion = "actualizar" if id_editar else "agregar"
+            messagebox.showerror("Error", f"No se pudo {accion}: {e}")
+
+        self.btn_agregar.configure(state="disabled")
+        # writes use no key so a later request can never discard them
+        self.db.submit(None, guardar, on_done=terminado, on_error=fallo)
 
     def _eliminar_entrada(self):
         sel = self.tree.selection()
@@ -362,22 +320,28 @@ class TabEntradas:
             messagebox.showwarning("Selecciona", "Selecciona una entrada para eliminar.")
             return
         iid = sel[0]
+        if self.table.is_placeholder(iid):
+            return
         if not messagebox.askyesno("Confirmar", "¿Eliminar la entrada seleccionada?"):
             return
-        try:
-            eliminar_entrada(int(iid))
+
+        def terminado(_):
             messagebox.showinfo("Eliminado", "Entrada eliminada correctamente.")
-        except Exception as e:
+            self.table.reload(keep_position=True)
+
+        def fallo(e):
             messagebox.showerror("Error", f"No se pudo eliminar: {e}")
-        self.actualizar_tabla()
+            self.table.reload(keep_position=True)
+
+        self.db.submit(None, eliminar_entrada, int(iid), on_done=terminado, on_error=fallo)
 
     # ---------- Double click loads into form ----------
     def _on_double_click(self, event):
         rowid = self.tree.identify_row(event.y)
-        if not rowid:
+        if not rowid or self.table.is_placeholder(rowid):
             return
         vals = self.tree.item(rowid, "values")
-        # row values = (nombre, fecha_display, factura, cantidad, comentario)
+        # row values = (nombre, fecha_display, factura, cantidad, ubicacion, comentario)
         self.selected_id = rowid
         try:
             self.nombre_entry.delete(0, "end"); self.nombre_entry.insert(0, vals[0])
@@ -394,7 +358,10 @@ class TabEntradas:
             self.cantidad_entry.delete(0, "end"); self.cantidad_entry.insert(0, vals[3])
         except: pass
         try:
-            self.comentario_entry.delete(0, "end"); self.comentario_entry.insert(0, vals[4])
+            self.ubicacion_combo.set(vals[4])
+        except: pass
+        try:
+            self.comentario_entry.delete(0, "end"); self.comentario_entry.insert(0, vals[5])
         except: pass
         # change add button label to indicate update mode
         try:
@@ -404,6 +371,10 @@ class TabEntradas:
 
     # ---------- Highlight recent (last row) ----------
     def _highlight_recent(self):
+        if self.table.visible_range()[1] < self.table.total:
+            # the newest row is at the end of the default order
+            self.table.scroll_to(self.table.total, then=self._highlight_recent)
+            return
         try:
             children = self.tree.get_children()
             if not children:
@@ -419,29 +390,14 @@ class TabEntradas:
             pass
 
     # ---------- Tooltip for comment column ----------
-    def _on_motion(self, event):
-        rowid = self.tree.identify_row(event.y)
-        col = self.tree.identify_column(event.x)
-        if not rowid or not col:
-            self.tooltip.hide()
-            return
-        # comment column is "#5"
-        if col == "#5":
-            vals = self.tree.item(rowid, "values")
-            comment = vals[4] if len(vals) > 4 else ""
-            if comment:
-                x_root = self.tree.winfo_rootx() + event.x + 20
-                y_root = self.tree.winfo_rooty() + event.y + 10
-                self.tooltip.show(comment, x_root, y_root)
-            else:
-                self.tooltip.hide()
-        else:
-            self.tooltip.hide()
+    def _comentario_de(self, rowid):
+        # read from the table's row cache instead of asking Tk
+        row = self.table.row(rowid)
+        return row[5] if row else ""
 
     # ---------- Search wrapper ----------
     def _on_search(self, *args):
-        self.page = 0
-        self._mostrar_pagina()
+        self.actualizar_tabla()
 
     def _limpiar_formulario(self):
         self.selected_id = None
@@ -450,6 +406,8 @@ class TabEntradas:
         self.factura_entry.delete(0, "end")
         self.cantidad_entry.delete(0, "end")
         self.comentario_entry.delete(0, "end")
+        valores = self.ubicacion_combo.cget("values")
+        self.ubicacion_combo.set(valores[0] if valores else "")
         try:
             self.btn_agregar.configure(text="➕ Agregar")
         except:
@@ -457,20 +415,27 @@ class TabEntradas:
 
     # ---------- Export CSV ----------
     def _exportar_csv(self):
-        salidas = self._apply_search_and_sort()
         archivo = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
         if not archivo:
             return
-        try:
-            with open(archivo, mode="w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Nombre", "Fecha", "Factura", "Cantidad", "Comentario"])
-                for row in salidas:
-                    # row: (id, nombre, fecha, factura, cantidad, comentario)
-                    writer.writerow([row[1], row[2], row[3], row[4], row[5]])
-            messagebox.showinfo("Exportado", f"Datos exportados correctamente a:\n{archivo}")
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo exportar: {e}")
+        self.btn_exportar.configure(state="disabled")
+        # export what the table shows: current search, date range and sort
+        export_csv_dialog(self.master, "entradas", archivo, self._filtro(), self.sort_by, self.sort_reverse,
+                          on_finish=lambda: self.btn_exportar.configure(state="normal"),
+                          rango=self.periodo.rango())
+
+    # ---------- Import CSV ----------
+    def _importar_csv(self):
+        archivo = filedialog.askopenfilename(filetypes=[("CSV Files", "*.csv"), ("Todos", "*.*")])
+        if not archivo:
+            return
+        self.btn_importar.configure(state="disabled")
+
+        def terminar():
+            self.btn_importar.configure(state="normal")
+            self.actualizar_tabla()
+
+        import_csv_dialog(self.master, "entradas", archivo, on_finish=terminar)
 
 # -------------------------------
 # FIN TAB ENTRADAS
\ No newline at end of file
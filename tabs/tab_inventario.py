@@ -1,51 +1,86 @@
 # tabs/tab_inventario.py
 # ----------------------------------------------------
-# Módulo de pestaña INVENTARIO con estilo unificado, exportación CSV/PDF
-# y resaltado de stock bajo o agotado
+# Módulo de pestaña INVENTARIO con estilo unificado, exportación CSV/PDF,
+# resaltado de stock bajo o agotado, filtro por ubicación y transferencias
 # ----------------------------------------------------
 
+import importlib.util
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-import csv
-
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-except ImportError:
-    messagebox.showerror(
-        "Falta dependencia",
-        "El módulo 'reportlab' no está instalado.\n\nEjecuta en la terminal:\n\npip install reportlab"
-    )
-
-from database import calcular_inventario
+
+from database import (
+    obtener_pagina,
+    contar_filas,
+    resumen_periodo,
+    nombres_productos,
+    obtener_ubicaciones,
+    agregar_ubicacion,
+    actualizar_ubicacion,
+    eliminar_ubicacion,
+    stock_disponible,
+    transferir,
+    StockInsuficiente,
+)
 from ui_utils import (
     create_frame,
     create_label,
+    create_entry,
+    create_combobox,
     create_button,
     create_search_bar,
-    apply_table_style
+    DateRangeBar,
+    apply_table_style,
+    export_csv_dialog,
+    export_pdf_dialog,
+    QueryExecutor,
+    VirtualTable,
 )
 
 
+TODAS_LAS_UBICACIONES = "Todas las ubicaciones"
+
+
+def _fecha_corta(iso):
+    """'YYYY-mm-dd' -> 'dd-mm-YYYY'."""
+    return datetime.strptime(iso, "%Y-%m-%d").strftime("%d-%m-%Y")
+
+
+def _clave_resumen(clave, por):
+    if por == "producto":
+        return clave
+    try:
+        if por == "mes":
+            return datetime.strptime(clave, "%Y-%m").strftime("%m-%Y")
+        fecha = _fecha_corta(clave)
+    except ValueError:
+        return clave  # fecha sin normalizar en los datos
+    return f"Semana del {fecha}" if por == "semana" else fecha
+
+
 class TabInventario:
-    def __init__(self, master):
+    def __init__(self, master, al_cargar=None):
         self.master = master
         try:
             self.master.configure(fg_color="#2f2f2f")
         except Exception:
             pass
 
-        # Control de páginas
-        self.page = 0
-        self.items_per_page = 10
-        self.inventario_full = []
+        # Control de la tabla
+        self.texto_pagina = ""
         self.sort_by = None
         self.sort_reverse = False
+        # (filtro, orden, descendente, rango, ubicacion) que muestra la tabla
+        self.consulta = ("", None, False, None, None)
+        self.ubicaciones = []  # [(id, nombre)], la principal primero
+
+        # Las consultas corren en hilos de trabajo y vuelven con after()
+        self.db = QueryExecutor(self.master, on_busy=self._set_busy)
 
         self._crear_interfaz()
-        self.mostrar_inventario()
+        self._actualizar_ubicaciones()
+        self.mostrar_inventario(despues=al_cargar)
 
     # ---------------------------------------------------
     # Interfaz
@@ -64,7 +99,7 @@ class TabInventario:
         # Botones superiores
         btns_frame = create_frame(top_outer)
         btns_frame.pack(pady=(6, 10))
-        btns_frame.grid_columnconfigure((0, 1, 2), weight=1)
+        btns_frame.grid_columnconfigure((0, 1, 2, 3, 4, 5), weight=1)
 
         self.btn_actualizar = create_button(
             btns_frame, "🔄 Actualizar", command=self.actualizar_tabla, style="primary", width=160
@@ -81,232 +116,444 @@ class TabInventario:
         )
         self.btn_exportar_pdf.grid(row=0, column=2, padx=6, pady=4)
 
+        self.btn_resumen = create_button(
+            btns_frame, "📊 Resumen", command=self.mostrar_resumen, style="neutral", width=160
+        )
+        self.btn_resumen.grid(row=0, column=3, padx=6, pady=4)
+
+        self.btn_transferir = create_button(
+            btns_frame, "🚚 Transferir", command=self.mostrar_transferencia, style="primary", width=160
+        )
+        self.btn_transferir.grid(row=0, column=4, padx=6, pady=4)
+
+        self.btn_ubicaciones = create_button(
+            btns_frame, "📍 Ubicaciones", command=self.mostrar_ubicaciones, style="neutral", width=160
+        )
+        self.btn_ubicaciones.grid(row=0, column=5, padx=6, pady=4)
+
         # ---------------------------------------------------
         # Sección inferior con búsqueda y tabla
         # ---------------------------------------------------
         lower_outer = create_frame(self.master)
         lower_outer.pack(fill="both", expand=True, padx=12, pady=(6, 12))
 
-        # Búsqueda + paginación
+        # Búsqueda + rango visible
         top_table_controls = create_frame(lower_outer)
         top_table_controls.pack(fill="x", padx=10, pady=(4, 6))
 
         # Búsqueda (izquierda)
-        search_frame, self.search_entry = create_search_bar(top_table_controls, self._on_search)
+        search_frame, self.search_entry = create_search_bar(top_table_controls, self._on_search, live=True)
         search_frame.pack(side="left", fill="x", expand=True)
 
-        # Paginación (derecha)
-        pag_frame = create_frame(top_table_controls)
-        pag_frame.pack(side="right")
-        pag_frame.grid_columnconfigure((0, 1, 2), weight=1)
-        self.btn_prev = create_button(pag_frame, "⬅", command=self.anterior_pagina, style="primary", width=40)
-        self.btn_prev.grid(row=0, column=0, sticky="e", padx=5)
-        self.lbl_pagina = create_label(pag_frame, "Página 1 de 1")
-        self.lbl_pagina.grid(row=0, column=1, sticky="e")
-        self.btn_next = create_button(pag_frame, "➡", command=self.siguiente_pagina, style="primary", width=40)
-        self.btn_next.grid(row=0, column=2, sticky="e", padx=5)
+        # Período: con un rango, entradas y salidas son las de esas fechas
+        self.periodo = DateRangeBar(top_table_controls, self._on_search)
+        self.periodo.frame.pack(side="left", padx=6)
+
+        # Ubicación: el stock de una sola bodega o el total de todas
+        self.ubicacion_combo = ctk.CTkComboBox(
+            top_table_controls, values=[TODAS_LAS_UBICACIONES], width=180,
+            state="readonly", command=self._on_search,
+        )
+        self.ubicacion_combo.set(TODAS_LAS_UBICACIONES)
+        self.ubicacion_combo.pack(side="left", padx=6)
+
+        # Filas visibles (derecha)
+        self.lbl_pagina = create_label(top_table_controls, "")
+        self.lbl_pagina.pack(side="right", padx=5)
 
         # ---------------------------------------------------
-        # Tabla principal
+        # Tabla principal (virtual: se carga por bloques al desplazarse)
         # ---------------------------------------------------
-        self.tree_frame = create_frame(lower_outer)
-        self.tree_frame.pack(fill="both", expand=True, padx=10, pady=(4, 8))
-
         columns = ("nombre", "entradas", "salidas", "stock")
-        self.tree = ttk.Treeview(self.tree_frame, columns=columns, show="headings", height=14)
+        self.table = VirtualTable(
+            lower_outer, columns, self.db, self._consultar_bloque, self._contar,
+            row_values=lambda fila: fila, row_tags=self._etiquetas_stock, on_change=self._mostrar_rango,
+        )
+        self.tree_frame = self.table.frame
+        self.tree_frame.pack(fill="both", expand=True, padx=10, pady=(4, 8))
+        self.tree = self.table.tree
         apply_table_style(self.tree)
 
-        for col, txt in zip(columns, ["Producto", "Entradas", "Salidas", "Stock disponible"]):
-            self.tree.heading(col, text=txt, command=lambda c=col: self.ordenar_col(c))
+        for col in columns:
+            self.tree.heading(col, command=lambda c=col: self.ordenar_col(c))
+        self._titulos_columnas()
 
         self.tree.column("nombre", width=260, anchor="center")
         self.tree.column("entradas", width=120, anchor="center")
         self.tree.column("salidas", width=120, anchor="center")
         self.tree.column("stock", width=140, anchor="center")
 
-        vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=vsb.set)
-        vsb.pack(side="right", fill="y")
-        self.tree.pack(fill="both", expand=True, side="left")
+        # Colores según stock
+        self.tree.tag_configure("agotado", background="#e05a5a")   # rojo
+        self.tree.tag_configure("bajo", background="#e6b85c")      # ámbar
 
     # ---------------------------------------------------
     # Lógica de datos
     # ---------------------------------------------------
-    def mostrar_inventario(self):
-        self.inventario_full = calcular_inventario() or []
-        filtro = (self.search_entry.get() or "").lower()
-        filtered = [i for i in self.inventario_full if filtro in str(i[0]).lower()] if filtro else self.inventario_full
-        if self.sort_by:
-            idx_map = {"nombre": 0, "entradas": 1, "salidas": 2, "stock": 3}
-            idx = idx_map.get(self.sort_by, 0)
-            def key(x):
-                try:
-                    return int(x[idx]) if idx > 0 else str(x[idx]).lower()
-                except:
-                    return 0
-            filtered.sort(key=key, reverse=self.sort_reverse)
-        self._display_page(filtered)
-
-    def _display_page(self, data):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-
-        total = len(data)
-        start, end = self.page * self.items_per_page, (self.page + 1) * self.items_per_page
-        for row in data[start:end]:
-            iid = str(row[0])
-            stock = int(row[3])
-            self.tree.insert("", "end", values=row)
-
-            # Colorear según stock
-            if stock == 0:
-                self.tree.item(self.tree.get_children()[-1], tags=("agotado",))
-            elif stock <= 3:
-                self.tree.item(self.tree.get_children()[-1], tags=("bajo",))
-
-        # Configurar colores
-        self.tree.tag_configure("agotado", background="#e05a5a")   # rojo
-        self.tree.tag_configure("bajo", background="#e6b85c")      # ámbar
-
-        total_pages = max(1, (total + self.items_per_page - 1) // self.items_per_page)
-        self.lbl_pagina.configure(text=f"Página {self.page + 1} de {total_pages}")
-        self.btn_prev.configure(state="normal" if self.page > 0 else "disabled")
-        self.btn_next.configure(state="normal" if end < total else "disabled")
-
-    def siguiente_pagina(self):
-        self.page += 1
-        self.mostrar_inventario()
-
-    def anterior_pagina(self):
-        if self.page > 0:
-            self.page -= 1
-        self.mostrar_inventario()
+    def mostrar_inventario(self, despues=None):
+        """Vuelve a la primera fila con el filtro y orden actuales."""
+        filtro = (self.search_entry.get() or "").strip()
+        self.consulta = (filtro, self.sort_by, self.sort_reverse, self.periodo.rango(), self._ubicacion())
+        self._titulos_columnas()
+        self.table.reload(then=despues)
+
+    def _ubicacion(self):
+        """Nombre de la ubicación elegida o None para todas."""
+        nombre = self.ubicacion_combo.get()
+        return None if nombre == TODAS_LAS_UBICACIONES else nombre
+
+    def _actualizar_ubicaciones(self, despues=None):
+        def aplicar(ubicaciones):
+            self.ubicaciones = ubicaciones
+            nombres = [nombre for _, nombre in ubicaciones]
+            self.ubicacion_combo.configure(values=[TODAS_LAS_UBICACIONES] + nombres)
+            if self.ubicacion_combo.get() not in nombres:
+                # la ubicación elegida se renombró o se eliminó
+                self.ubicacion_combo.set(TODAS_LAS_UBICACIONES)
+            if despues:
+                despues()
+
+        self.db.submit("ubicaciones", obtener_ubicaciones, on_done=aplicar)
+
+    def _titulos_columnas(self):
+        rango = self.consulta[3]
+        sufijo = f" {_fecha_corta(rango[0])}–{_fecha_corta(rango[1])}" if rango else ""
+        # Con un período pasado el stock es el que había al terminar
+        pasado = rango and rango[1] < datetime.now().strftime("%Y-%m-%d")
+        stock = f"Stock al {_fecha_corta(rango[1])}" if pasado else "Stock disponible"
+        for col, txt in zip(("nombre", "entradas", "salidas", "stock"),
+                            ["Producto", "Entradas" + sufijo, "Salidas" + sufijo, stock]):
+            self.tree.heading(col, text=txt)
+
+    def _consultar_bloque(self, cursor, desplazamiento, limite):
+        # Se ejecuta en un hilo de trabajo
+        filtro, orden, descendente, rango, ubicacion = self.consulta
+        return obtener_pagina("stock", filtro, orden, descendente, cursor=cursor, limite=limite,
+                              desplazamiento=desplazamiento, rango=rango, ubicacion=ubicacion)
+
+    def _contar(self):
+        # Se ejecuta en un hilo de trabajo
+        _, _, _, rango, ubicacion = self.consulta
+        return contar_filas("stock", self.consulta[0], rango, ubicacion)
+
+    @staticmethod
+    def _etiquetas_stock(fila):
+        stock = int(fila[3])
+        if stock <= 0:
+            return ("agotado",)
+        if stock <= 3:
+            return ("bajo",)
+        return ()
+
+    def _mostrar_rango(self, primera, ultima, total):
+        self.texto_pagina = f"Filas {primera}–{ultima} de {total}" if total else "Sin resultados"
+        self.lbl_pagina.configure(text=self.texto_pagina)
+
+    def _set_busy(self, ocupado):
+        self.tree.configure(cursor="watch" if ocupado else "")
+        self.lbl_pagina.configure(text="⏳ Cargando..." if ocupado else self.texto_pagina)
 
     def ordenar_col(self, col):
         if self.sort_by == col:
             self.sort_reverse = not self.sort_reverse
         else:
             self.sort_by, self.sort_reverse = col, False
-        self.page = 0
         self.mostrar_inventario()
 
     def actualizar_tabla(self):
-        self.mostrar_inventario()
-        messagebox.showinfo("Actualizado", "Inventario actualizado correctamente.")
+        self._actualizar_ubicaciones()
+        self.mostrar_inventario(despues=lambda: messagebox.showinfo("Actualizado", "Inventario actualizado correctamente."))
 
     # ---------------------------------------------------
     # Exportar CSV
     # ---------------------------------------------------
     def exportar_csv(self):
-        try:
-            inventario = calcular_inventario()
-            if not inventario:
-                messagebox.showinfo("Sin datos", "No hay datos para exportar.")
-                return
+        # El conteo va a un hilo de trabajo: con un período pasado puede
+        # tener que recalcular un cierre mensual
+        consulta = self.consulta
+        filtro, _, _, rango, ubicacion = consulta
+        self.db.submit("exportar", contar_filas, "stock", filtro, rango, ubicacion,
+                       on_done=lambda total: self._exportar_csv(consulta, total))
+
+    def _exportar_csv(self, consulta, total):
+        filtro, orden, descendente, rango, ubicacion = consulta
+        if total == 0:
+            messagebox.showinfo("Sin datos", "No hay datos para exportar.")
+            return
+
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("Archivo CSV", "*.csv")],
+            title="Guardar archivo CSV como",
+            initialfile=f"inventario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
 
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("Archivo CSV", "*.csv")],
-                title="Guardar archivo CSV como",
-                initialfile=f"inventario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            )
+        if not filename:
+            return
+
+        # Se exporta lo que muestra la tabla: búsqueda, período, ubicación y orden actuales
+        self.btn_exportar_csv.configure(state="disabled")
+        export_csv_dialog(self.master, "stock", filename, filtro, orden, descendente,
+                          on_finish=lambda: self.btn_exportar_csv.configure(state="normal"),
+                          rango=rango, ubicacion=ubicacion)
 
-            if not filename:
+    # ---------------------------------------------------
+    # Resumen por período
+    # ---------------------------------------------------
+    def mostrar_resumen(self):
+        """Ventana con las entradas y salidas del período por producto, día, semana o mes."""
+        rango = self.consulta[3]
+        ventana = ctk.CTkToplevel(self.master)
+        ventana.title("Resumen por período")
+        ventana.geometry("620x520")
+        ventana.transient(self.master.winfo_toplevel())
+
+        texto = f"Del {_fecha_corta(rango[0])} al {_fecha_corta(rango[1])}" if rango else "Todo el historial"
+        create_label(ventana, texto, font=("Segoe UI", 13, "bold")).pack(pady=(10, 4))
+
+        marco = create_frame(ventana)
+        marco.pack(fill="both", expand=True, padx=10, pady=(4, 10))
+        columnas = ("periodo", "entradas", "salidas", "neto")
+        tree = ttk.Treeview(marco, columns=columnas, show="headings", height=16)
+        vsb = ttk.Scrollbar(marco, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        apply_table_style(tree)
+        for col, txt, ancho in zip(columnas, ["Período", "Entradas", "Salidas", "Neto"], (220, 110, 110, 110)):
+            tree.heading(col, text=txt)
+            tree.column(col, width=ancho, anchor="center")
+
+        agrupaciones = {"Producto": "producto", "Día": "dia", "Semana": "semana", "Mes": "mes"}
+
+        def mostrar(filas, por):
+            if not tree.winfo_exists():
                 return
+            tree.delete(*tree.get_children())
+            tree.heading("periodo", text="Producto" if por == "producto" else "Período")
+            for clave, entradas, salidas in filas:
+                tree.insert("", "end", values=(_clave_resumen(clave, por), entradas, salidas, entradas - salidas))
+
+        def cargar(nombre):
+            por = agrupaciones[nombre]
+            desde, hasta = rango or (None, None)
+            self.db.submit("resumen", resumen_periodo, por, desde, hasta,
+                           on_done=lambda filas: mostrar(filas, por))
+
+        selector = ctk.CTkSegmentedButton(ventana, values=list(agrupaciones), command=cargar)
+        selector.pack(before=marco, pady=4)
+        tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="right", fill="y")
+        selector.set("Mes")
+        cargar("Mes")
 
-            with open(filename, mode="w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Producto", "Entradas", "Salidas", "Stock disponible"])
-                for row in inventario:
-                    writer.writerow(row)
+    # ---------------------------------------------------
+    # Exportar PDF
+    # ---------------------------------------------------
+    def exportar_pdf(self):
+        # Como en exportar_csv, el conteo no corre en el hilo de Tk
+        consulta = self.consulta
+        filtro, _, _, rango, ubicacion = consulta
+        self.db.submit("exportar", contar_filas, "stock", filtro, rango, ubicacion,
+                       on_done=lambda total: self._exportar_pdf(consulta, total))
+
+    def _exportar_pdf(self, consulta, total):
+        filtro, orden, descendente, rango, ubicacion = consulta
+        if total == 0:
+            messagebox.showinfo("Sin datos", "No hay datos para exportar.")
+            return
+
+        # reportlab solo se carga en el proceso que genera el PDF
+        if importlib.util.find_spec("reportlab") is None:
+            messagebox.showerror(
+                "Falta dependencia",
+                "El módulo 'reportlab' no está instalado.\n\nEjecuta en la terminal:\n\npip install reportlab"
+            )
+            return
 
-            messagebox.showinfo("Exportación exitosa", f"Datos exportados a:\n{filename}")
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".pdf",
+            filetypes=[("Archivo PDF", "*.pdf")],
+            title="Guardar archivo PDF como",
+            initialfile=f"inventario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        )
+
+        if not filename:
+            return
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Ocurrió un error al exportar:\n{e}")
+        # Igual que el CSV: búsqueda, período, ubicación y orden actuales
+        self.btn_exportar_pdf.configure(state="disabled")
+        export_pdf_dialog(self.master, filename, filtro, orden, descendente,
+                          on_finish=lambda: self.btn_exportar_pdf.configure(state="normal"),
+                          rango=rango, ubicacion=ubicacion)
 
     # ---------------------------------------------------
-    # Exportar PDF
+    # Transferencias entre ubicaciones
     # ---------------------------------------------------
-    def exportar_pdf(self):
-        try:
-            inventario = calcular_inventario()
-            if not inventario:
-                messagebox.showinfo("Sin datos", "No hay datos para exportar.")
+    def mostrar_transferencia(self):
+        """Ventana para mover unidades de un producto de una ubicación a otra."""
+        from tkcalendar import DateEntry  # lento de importar (carga babel)
+
+        if len(self.ubicaciones) < 2:
+            messagebox.showinfo("Transferir", "Crea otra ubicación en 📍 Ubicaciones para poder transferir.")
+            return
+        nombres = [nombre for _, nombre in self.ubicaciones]
+
+        ventana = ctk.CTkToplevel(self.master)
+        ventana.title("Transferir entre ubicaciones")
+        ventana.geometry("420x380")
+        ventana.transient(self.master.winfo_toplevel())
+
+        marco = create_frame(ventana)
+        marco.pack(fill="both", expand=True, padx=12, pady=12)
+        marco.grid_columnconfigure(1, weight=1)
+
+        def fila(n, texto, widget):
+            create_label(marco, texto).grid(row=n, column=0, sticky="w", padx=6, pady=5)
+            widget.grid(row=n, column=1, sticky="we", padx=6, pady=5)
+            return widget
+
+        producto = fila(0, "Producto", create_combobox(marco, values=[], width=220))
+        origen = fila(1, "Origen", create_combobox(marco, values=nombres, width=220))
+        destino = fila(2, "Destino", create_combobox(marco, values=nombres, width=220))
+        cantidad = fila(3, "Cantidad", create_entry(marco, placeholder="0", width=100))
+        fecha = fila(4, "Fecha", DateEntry(marco, date_pattern="yyyy-mm-dd", width=12))
+        comentario = fila(5, "Comentario", create_entry(marco, placeholder="Comentario (opcional)", width=220))
+        fecha.set_date(datetime.now())
+        origen.set(self._ubicacion() or nombres[0])
+        destino.set(next(n for n in nombres if n != origen.get()))
+
+        disponible = create_label(marco, "")
+        disponible.grid(row=6, column=0, columnspan=2, pady=(4, 0))
+
+        def mostrar_disponible(*_):
+            nombre, lugar = producto.get().strip(), origen.get()
+            if not nombre:
+                disponible.configure(text="")
                 return
 
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".pdf",
-                filetypes=[("Archivo PDF", "*.pdf")],
-                title="Guardar archivo PDF como",
-                initialfile=f"inventario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            )
+            def aplicar(unidades):
+                if disponible.winfo_exists():
+                    disponible.configure(text=f"Disponible en {lugar}: {unidades}")
 
-            if not filename:
-                return
+            self.db.submit("disponible", stock_disponible, nombre, lugar, on_done=aplicar)
 
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import A4
-            from reportlab.pdfgen import canvas
-
-            pdf = canvas.Canvas(filename, pagesize=A4)
-            width, height = A4
-
-            # Título
-            pdf.setFont("Helvetica-Bold", 16)
-            pdf.drawString(180, height - 60, "📦 Reporte de Inventario")
-            pdf.setFont("Helvetica", 10)
-
-            # Encabezados
-            headers = ["Producto", "Entradas", "Salidas", "Stock disponible"]
-            x_positions = [50, 250, 350, 460]
-            y = height - 100
-
-            pdf.setFont("Helvetica-Bold", 11)
-            for i, h in enumerate(headers):
-                pdf.drawString(x_positions[i], y, h)
-            pdf.setFont("Helvetica", 10)
-            y -= 18
-
-            # Filas de datos
-            for row in inventario:
-                nombre, entradas, salidas, stock = row
-                stock_int = int(stock)
-
-                # Color según nivel de stock
-                if stock_int == 0:
-                    pdf.setFillColor(colors.red)
-                elif stock_int <= 3:
-                    pdf.setFillColor(colors.darkorange)
-                else:
-                    pdf.setFillColor(colors.black)
+        producto.configure(command=mostrar_disponible)
+        origen.configure(command=mostrar_disponible)
 
-                # Escribir fila
-                pdf.drawString(x_positions[0], y, str(nombre))
-                pdf.drawString(x_positions[1], y, str(entradas))
-                pdf.drawString(x_positions[2], y, str(salidas))
-                pdf.drawString(x_positions[3], y, str(stock))
+        def aplicar_productos(lista):
+            if producto.winfo_exists():
+                producto.configure(values=lista)
 
-                # Restaurar color y bajar línea
-                pdf.setFillColor(colors.black)
-                y -= 18
+        self.db.submit("productos", nombres_productos, on_done=aplicar_productos)
 
-                # Salto de página
-                if y < 50:
-                    pdf.showPage()
-                    pdf.setFont("Helvetica", 10)
-                    y = height - 50
+        def guardar():
+            nombre = producto.get().strip()
+            try:
+                unidades = int(cantidad.get().strip())
+            except ValueError:
+                messagebox.showerror("Cantidad inválida", "Debe ser un número entero.", parent=ventana)
+                return
+
+            def terminado(_):
+                ventana.destroy()
+                messagebox.showinfo("Transferencia registrada",
+                                    f"{unidades} de {nombre}: {origen.get()} → {destino.get()}")
+                self.table.reload(keep_position=True)
+
+            def fallo(e):
+                boton.configure(state="normal")
+                if isinstance(e, StockInsuficiente):
+                    mensaje = f"Stock insuficiente en {origen.get()}. Disponible: {e.disponible}"
+                else:
+                    mensaje = str(e)
+                messagebox.showerror("No se pudo transferir", mensaje, parent=ventana)
 
-            pdf.save()
-            messagebox.showinfo("PDF generado", f"Archivo guardado en:\n{filename}")
+            boton.configure(state="disabled")
+            # Sin clave: una escritura nunca se descarta por otra petición
+            self.db.submit(None, transferir, nombre, fecha.get_date(), origen.get(), destino.get(), unidades,
+                           comentario.get().strip(), on_done=terminado, on_error=fallo)
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Ocurrió un error al exportar PDF:\n{e}")
+        boton = create_button(ventana, "🚚 Transferir", command=guardar, style="primary", width=160)
+        boton.pack(pady=(0, 12))
 
+    # ---------------------------------------------------
+    # Ubicaciones
+    # ---------------------------------------------------
+    def mostrar_ubicaciones(self):
+        """Ventana para crear, renombrar y eliminar ubicaciones."""
+        ventana = ctk.CTkToplevel(self.master)
+        ventana.title("Ubicaciones")
+        ventana.geometry("420x420")
+        ventana.transient(self.master.winfo_toplevel())
+
+        marco = create_frame(ventana)
+        marco.pack(fill="both", expand=True, padx=10, pady=(10, 4))
+        tree = ttk.Treeview(marco, columns=("nombre",), show="headings", height=10, selectmode="browse")
+        apply_table_style(tree)
+        tree.heading("nombre", text="Ubicación")
+        tree.column("nombre", width=360, anchor="center")
+        tree.pack(fill="both", expand=True)
+
+        nombre = create_entry(ventana, placeholder="Nombre de la ubicación", width=260)
+        nombre.pack(pady=6)
+
+        def llenar():
+            if not tree.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for id_ubicacion, texto in self.ubicaciones:
+                tree.insert("", "end", iid=str(id_ubicacion), values=(texto,))
+
+        def elegir(_):
+            sel = tree.selection()
+            if sel:
+                nombre.delete(0, "end")
+                nombre.insert(0, tree.item(sel[0], "values")[0])
+
+        tree.bind("<<TreeviewSelect>>", elegir)
+
+        def ejecutar(fn, *args):
+            def terminado(_):
+                if nombre.winfo_exists():
+                    nombre.delete(0, "end")
+
+                def refrescar():
+                    # después de leer las ubicaciones: la elegida pudo cambiar de nombre
+                    llenar()
+                    self.mostrar_inventario()
+
+                self._actualizar_ubicaciones(despues=refrescar)
+
+            self.db.submit(None, fn, *args, on_done=terminado,
+                           on_error=lambda e: messagebox.showerror("Ubicaciones", str(e), parent=ventana))
+
+        def seleccionada():
+            sel = tree.selection()
+            if not sel:
+                messagebox.showwarning("Selecciona", "Selecciona una ubicación.", parent=ventana)
+                return None
+            return int(sel[0])
+
+        def renombrar():
+            id_ubicacion = seleccionada()
+            if id_ubicacion is not None:
+                ejecutar(actualizar_ubicacion, id_ubicacion, nombre.get())
+
+        def eliminar():
+            id_ubicacion = seleccionada()
+            if id_ubicacion is not None and messagebox.askyesno(
+                    "Confirmar", "¿Eliminar la ubicación seleccionada?", parent=ventana):
+                ejecutar(eliminar_ubicacion, id_ubicacion)
+
+        botones = create_frame(ventana)
+        botones.pack(pady=(0, 10))
+        create_button(botones, "➕ Agregar", command=lambda: ejecutar(agregar_ubicacion, nombre.get()),
+                      style="primary", width=110).grid(row=0, column=0, padx=4)
+        create_button(botones, "✏️ Renombrar", command=renombrar, style="warning", width=110).grid(row=0, column=1, padx=4)
+        create_button(botones, "🗑️ Eliminar", command=eliminar, style="danger", width=110).grid(row=0, column=2, padx=4)
+        self._actualizar_ubicaciones(despues=llenar)
 
     # ---------------------------------------------------
     # Búsqueda
     # ---------------------------------------------------
     def _on_search(self, *args):
-        self.page = 0
         self.mostrar_inventario()
@@ -1,22 +1,20 @@
 # tabs/tab_salidas.py
 # ----------------------------------------------------
-# Módulo de pestaña SALIDAS con estilo unificado, paginación visible y resaltado.
+# Módulo de pestaña SALIDAS con estilo unificado, tabla virtual y resaltado.
 # ----------------------------------------------------
 
 import customtkinter as ctk
-import tkinter as tk
 from tkinter import ttk, messagebox
-from tkcalendar import DateEntry
 from datetime import datetime
-import csv
 
 from database import (
-    obtener_entradas,
-    obtener_salidas,
-    agregar_salida,
-    actualizar_salida,
+    obtener_pagina,
+    contar_filas,
+    registrar_salida,
     eliminar_salida,
-    calcular_inventario,
+    StockInsuficiente,
+    nombres_productos,
+    obtener_ubicaciones,
 )
 
 from ui_utils import (
@@ -26,35 +24,17 @@ from ui_utils import (
     create_combobox,
     create_button,
     create_search_bar,
+    DateRangeBar,
     apply_table_style,
+    import_csv_dialog,
+    export_csv_dialog,
+    QueryExecutor,
+    VirtualTable,
+    CellTooltip,
 )
 
-# --- Tooltip simple para mostrar comentarios largos ---
-class Tooltip:
-    def __init__(self, widget):
-        self.widget = widget
-        self.tipwindow = None
-
-    def show(self, text, x, y):
-        self.hide()
-        if not text:
-            return
-        self.tipwindow = tw = tk.Toplevel(self.widget)
-        tw.wm_overrideredirect(True)
-        tw.attributes("-topmost", True)
-        label = tk.Label(tw, text=text, justify='left', background="#ffffe0", relief='solid', borderwidth=1,
-                         font=("Segoe UI", 9), wraplength=600)
-        label.pack(ipadx=5, ipady=3)
-        tw.wm_geometry("+%d+%d" % (x, y))
-
-    def hide(self):
-        if self.tipwindow:
-            self.tipwindow.destroy()
-            self.tipwindow = None
-
-
 class TabSalidas:
-    def __init__(self, master):
+    def __init__(self, master, al_cargar=None):
         self.master = master
         try:
             self.master.configure(fg_color="#2f2f2f")
@@ -62,24 +42,28 @@ class TabSalidas:
             pass
 
         # Estados de control
-        self.page = 0
-        self.items_per_page = 10
         self.sort_by = None
         self.sort_reverse = False
         self.selected_id = None
         self.last_highlighted = None
 
-        self.salidas_full = []
-        self.tooltip = Tooltip(self.master)
+        self.consulta = ("", None, False, None)  # (filtro, orden, descendente, rango) que muestra la tabla
+        self.texto_pagina = ""
+
+        # Las consultas corren en hilos de trabajo y vuelven con after()
+        self.db = QueryExecutor(self.master, on_busy=self._set_busy)
 
         self._crear_interfaz()
         self._actualizar_productos()
-        self.mostrar_salidas()
+        self._actualizar_ubicaciones()
+        self.mostrar_salidas(despues=al_cargar)
 
     # ---------------------------------------------------
     # INTERFAZ
     # ---------------------------------------------------
     def _crear_interfaz(self):
+        from tkcalendar import DateEntry  # lento de importar (carga babel)
+
         top_outer = create_frame(self.master)
         top_outer.pack(fill="x", padx=12, pady=(12, 6))
 
@@ -120,6 +104,11 @@ class TabSalidas:
         self.comentario_entry = create_entry(form_frame, placeholder="Comentario (opcional)", width=200)
         self.comentario_entry.grid(row=1, column=5, padx=5)
 
+        # Ubicación de la que sale la mercadería
+        create_label(form_frame, "Ubicación").grid(row=0, column=6, sticky="w", padx=5)
+        self.ubicacion_combo = create_combobox(form_frame, values=[], width=150)
+        self.ubicacion_combo.grid(row=1, column=6, padx=5)
+
         # Botones superiores
         btns_frame = create_frame(top_outer)
         btns_frame.pack(pady=(6, 10))
@@ -144,6 +133,10 @@ class TabSalidas:
         self.btn_exportar = create_button(btns_frame, "💾 Exportar CSV", command=self.exportar_csv, style="success", width=160)
         self.btn_exportar.grid(row=0, column=5, padx=6, pady=4)
 
+        # Botón Importar CSV
+        self.btn_importar = create_button(btns_frame, "📥 Importar CSV", command=self.importar_csv, style="primary", width=160)
+        self.btn_importar.grid(row=0, column=6, padx=6, pady=4)
+
 
         
 
@@ -153,59 +146,68 @@ class TabSalidas:
         lower_outer = create_frame(self.master)
         lower_outer.pack(fill="both", expand=True, padx=12, pady=(6, 12))
 
-        # Frame búsqueda + paginación
+        # Frame búsqueda + rango visible
         top_table_controls = create_frame(lower_outer)
         top_table_controls.pack(fill="x", padx=10, pady=(4, 6))
 
-        # barra izquierda: búsqueda
-        search_frame, self.search_entry = create_search_bar(top_table_controls, self._on_search)
+        # barra izquierda: búsqueda y período
+        search_frame, self.search_entry = create_search_bar(top_table_controls, self._on_search, live=True)
         search_frame.pack(side="left", fill="x", expand=True)
-
-        # derecha: paginación
-        pag_frame = create_frame(top_table_controls)
-        pag_frame.pack(side="right", fill="x")
-        pag_frame.grid_columnconfigure((0, 1, 2), weight=1)
-        self.btn_prev = create_button(pag_frame, "⬅", command=self.anterior_pagina, style="primary", width=40)
-        self.btn_prev.grid(row=0, column=0, sticky="e", padx=5)
-        self.lbl_pagina = create_label(pag_frame, "1 / 1")
-        self.lbl_pagina.grid(row=0, column=1, sticky="e")
-        self.btn_next = create_button(pag_frame, "➡", command=self.siguiente_pagina, style="primary", width=40)
-        self.btn_next.grid(row=0, column=2, sticky="e", padx=5)
-
-        # Tabla principal
-        self.tree_frame = create_frame(lower_outer)
+        self.periodo = DateRangeBar(top_table_controls, self._on_search)
+        self.periodo.frame.pack(side="left", padx=6)
+
+        # derecha: filas visibles
+        self.lbl_pagina = create_label(top_table_controls, "")
+        self.lbl_pagina.pack(side="right", padx=5)
+
+        # Tabla principal: solo las filas visibles están en el Treeview,
+        # el resto se pide por bloques al desplazarse
+        columns = ("nombre", "fecha", "estado", "destino", "cantidad", "ubicacion", "comentario")
+        self.table = VirtualTable(
+            lower_outer, columns, self.db, self._consultar_bloque, self._contar,
+            row_values=self._valores_fila, on_change=self._mostrar_rango,
+        )
+        self.tree_frame = self.table.frame
         self.tree_frame.pack(fill="both", expand=True, padx=10, pady=(4, 8))
-        columns = ("nombre", "fecha", "estado", "destino", "cantidad", "comentario")
-        self.tree = ttk.Treeview(self.tree_frame, columns=columns, show="headings", height=14)
+        self.tree = self.table.tree
         apply_table_style(self.tree)
 
-        for col, txt in zip(columns, ["Nombre", "Fecha", "Estado", "Destino", "Cantidad", "Comentario"]):
+        for col, txt in zip(columns, ["Nombre", "Fecha", "Estado", "Destino", "Cantidad", "Ubicación", "Comentario"]):
             self.tree.heading(col, text=txt, command=lambda c=col: self.ordenar_col(c))
+        self.tree.heading("ubicacion", command="")
+        self.tree.heading("comentario", command="")
         self.tree.column("nombre", width=200, anchor="center")
         self.tree.column("fecha", width=100, anchor="center")
         self.tree.column("estado", width=120, anchor="center")
         self.tree.column("destino", width=180, anchor="center")
         self.tree.column("cantidad", width=90, anchor="center")
+        self.tree.column("ubicacion", width=140, anchor="center")
         self.tree.column("comentario", width=320, anchor="w")
 
-        vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=vsb.set)
-        vsb.pack(side="right", fill="y")
-        self.tree.pack(fill="both", expand=True, side="left")
 
         self.tree.bind("<Double-1>", self._on_double_click)
-        self.tree.bind("<Motion>", self._on_motion)
-        self.tree.bind("<Leave>", lambda e: self.tooltip.hide())
+        # Comentarios largos en un tooltip sobre la columna comentario ("#7")
+        self.tooltip = CellTooltip(self.tree, "#7", self._comentario_de, wraplength=600)
 
     # ---------------------------------------------------
     # Datos / Productos
     # ---------------------------------------------------
     def _actualizar_productos(self):
-        entradas = obtener_entradas()
-        nombres = sorted({row[1] for row in entradas if len(row) > 1 and row[1]})
-        self.nombre_combo.configure(values=nombres)
-        if not self.nombre_combo.get() and nombres:
-            self.nombre_combo.set(nombres[0])
+        def aplicar(nombres):
+            self.nombre_combo.configure(values=nombres)
+            if not self.nombre_combo.get() and nombres:
+                self.nombre_combo.set(nombres[0])
+
+        self.db.submit("productos", nombres_productos, on_done=aplicar)
+
+    def _actualizar_ubicaciones(self):
+        def aplicar(ubicaciones):
+            nombres = [nombre for _, nombre in ubicaciones]
+            self.ubicacion_combo.configure(values=nombres)
+            if self.ubicacion_combo.get() not in nombres and nombres:
+                self.ubicacion_combo.set(nombres[0])  # la principal va primero
+
+        self.db.submit("ubicaciones", obtener_ubicaciones, on_done=aplicar)
 
     # ---------------------------------------------------
     # Guardar / Actualizar / Eliminar
@@ -217,6 +219,7 @@ class TabSalidas:
         destino = self.destino_entry.get().strip()
         cantidad = self.cantidad_entry.get().strip()
         comentario = self.comentario_entry.get().strip()
+        ubicacion = self.ubicacion_combo.get().strip() or None
 
         if not all([nombre, fecha, estado, destino, cantidad]):
             messagebox.showwarning("Campos incompletos", "Completa todos los campos.")
@@ -227,22 +230,38 @@ class TabSalidas:
             messagebox.showerror("Cantidad inválida", "Debe ser un número entero.")
             return
 
-        stock_actual = next((it[3] for it in calcular_inventario() if it[0] == nombre), 0)
-        if self.selected_id is None and cantidad_int > stock_actual:
-            messagebox.showerror("Sin stock", f"Stock insuficiente para {nombre}. Disponible: {stock_actual}")
-            return
+        id_editar = int(self.selected_id) if self.selected_id is not None else None
 
-        if self.selected_id is None:
-            agregar_salida(nombre, fecha, estado, destino, cantidad_int, comentario)
-            messagebox.showinfo("Salida registrada", "Salida agregada correctamente.")
-        else:
-            actualizar_salida(int(self.selected_id), nombre, fecha, estado, destino, cantidad_int, comentario)
-            messagebox.showinfo("Actualizado", "Salida actualizada correctamente.")
+        def guardar():
+            # Se ejecuta en un hilo de trabajo: valida el stock y escribe en
+            # una sola transacción
+            registrar_salida(nombre, fecha, estado, destino, cantidad_int, comentario,
+                             id_salida=id_editar, ubicacion=ubicacion)
 
-        self._actualizar_productos()
-        self.mostrar_salidas()
-        self._highlight_recent()
-        self.limpiar_formulario()
+        def terminado(_):
+            self.btn_guardar.configure(state="normal")
+            if id_editar is None:
+                messagebox.showinfo("Salida registrada", "Salida agregada correctamente.")
+            else:
+                messagebox.showinfo("Actualizado", "Salida actualizada correctamente.")
+            self._actualizar_productos()
+            if id_editar is None:
+                self.mostrar_salidas(despues=self._highlight_recent)
+            else:
+                self.table.reload(keep_position=True)
+            self.limpiar_formulario()
+
+        def fallo(e):
+            self.btn_guardar.configure(state="normal")
+            if isinstance(e, StockInsuficiente):
+                messagebox.showerror("Sin stock", f"Stock insuficiente para {nombre} en esa ubicación. "
+                                                  f"Disponible: {e.disponible}")
+            else:
+                messagebox.showerror("Error", f"No se pudo guardar la salida:\n{e}")
+
+        self.btn_guardar.configure(state="disabled")
+        # Sin clave: una escritura nunca se descarta por otra petición
+        self.db.submit(None, guardar, on_done=terminado, on_error=fallo)
 
     def eliminar_seleccion(self):
         sel = self.tree.selection()
@@ -250,117 +269,126 @@ class TabSalidas:
             messagebox.showwarning("Selecciona", "Selecciona una salida.")
             return
         iid = sel[0]
+        if self.table.is_placeholder(iid):
+            return
         if not messagebox.askyesno("Confirmar", "¿Eliminar la salida seleccionada?"):
             return
-        eliminar_salida(int(iid))
-        messagebox.showinfo("Eliminado", "Salida eliminada correctamente.")
-        self.mostrar_salidas()
+
+        def terminado(_):
+            messagebox.showinfo("Eliminado", "Salida eliminada correctamente.")
+            self.table.reload(keep_position=True)
+
+        self.db.submit(None, eliminar_salida, int(iid), on_done=terminado)
 
     # ---------------------------------------------------
-    # Mostrar / Paginación / Orden
+    # Mostrar / Orden
     # ---------------------------------------------------
-    def mostrar_salidas(self):
-        self.salidas_full = obtener_salidas() or []
-        filtro = (self.search_entry.get() or "").lower()
-        filtered = [s for s in self.salidas_full if filtro in str(s[1]).lower() or filtro in str(s[4]).lower()] if filtro else self.salidas_full
-        if self.sort_by:
-            idx_map = {"nombre": 1, "fecha": 2, "estado": 3, "destino": 4, "cantidad": 5}
-            idx = idx_map.get(self.sort_by, 1)
-            def key(x):
-                v = x[idx]
-                if self.sort_by == "fecha":
-                    try: return datetime.strptime(v, "%Y-%m-%d")
-                    except: return datetime.min
-                if self.sort_by == "cantidad":
-                    try: return int(v)
-                    except: return 0
-                return str(v).lower()
-            filtered.sort(key=key, reverse=self.sort_reverse)
-        self._display_page(filtered)
-
-    def _display_page(self, data):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        total = len(data)
-        start, end = self.page * self.items_per_page, (self.page + 1) * self.items_per_page
-        for row in data[start:end]:
-            iid = str(row[0])
-            vals = (row[1], row[2], row[3], row[4], row[5], row[6])
-            self.tree.insert("", "end", iid=iid, values=vals)
-        total_pages = max(1, (total + 9)//10)
-        #self.lbl_pagina.configure(text=f"{self.page+1} / {total_pages}")
-        self.lbl_pagina.configure(text=f"Página {self.page + 1} de {total_pages}")
-        self.btn_prev.configure(state="normal" if self.page > 0 else "disabled")
-        self.btn_next.configure(state="normal" if end < total else "disabled")
-
-    def siguiente_pagina(self):
-        self.page += 1
-        self.mostrar_salidas()
-
-    def anterior_pagina(self):
-        if self.page > 0:
-            self.page -= 1
-        self.mostrar_salidas()
+    def mostrar_salidas(self, despues=None):
+        """Vuelve a la primera fila con el filtro, período y orden actuales."""
+        self.consulta = (self._filtro(), self.sort_by, self.sort_reverse, self.periodo.rango())
+        self.table.reload(then=despues)
+
+    def _filtro(self):
+        return (self.search_entry.get() or "").strip()
+
+    def _consultar_bloque(self, cursor, desplazamiento, limite):
+        # Se ejecuta en un hilo de trabajo
+        filtro, orden, descendente, rango = self.consulta
+        return obtener_pagina("salidas", filtro, orden, descendente,
+                              cursor=cursor, limite=limite, desplazamiento=desplazamiento, rango=rango)
+
+    def _contar(self):
+        # Se ejecuta en un hilo de trabajo
+        return contar_filas("salidas", self.consulta[0], self.consulta[3])
+
+    @staticmethod
+    def _valores_fila(fila):
+        # (id, nombre, fecha, estado, destino, cantidad, comentario, ubicacion):
+        # el comentario queda en la última columna, la más ancha
+        return (*fila[1:6], fila[7], fila[6])
+
+    def _mostrar_rango(self, primera, ultima, total):
+        self.tooltip.hide()  # cambiaron las filas bajo el puntero
+        self.texto_pagina = f"Filas {primera}–{ultima} de {total}" if total else "Sin resultados"
+        self.lbl_pagina.configure(text=self.texto_pagina)
+
+    def _set_busy(self, ocupado):
+        self.tree.configure(cursor="watch" if ocupado else "")
+        self.lbl_pagina.configure(text="⏳ Cargando..." if ocupado else self.texto_pagina)
 
     def ordenar_col(self, col):
         if self.sort_by == col:
             self.sort_reverse = not self.sort_reverse
         else:
             self.sort_by, self.sort_reverse = col, False
-        self.page = 0
         self.mostrar_salidas()
 
     def actualizar_tabla(self):
         self._actualizar_productos()
-        self.mostrar_salidas()
-        messagebox.showinfo("Actualizado", "Datos actualizados correctamente.")
+        self._actualizar_ubicaciones()
+        self.mostrar_salidas(despues=lambda: messagebox.showinfo("Actualizado", "Datos actualizados correctamente."))
         
     # ---------------------------------------------------
     # Exportar tabla a CSV con selector de ruta
     # ---------------------------------------------------
     def exportar_csv(self):
-        from tkinter import filedialog
+        # El conteo va a un hilo de trabajo, como las consultas de la tabla
+        consulta = self.consulta
+        filtro, _, _, rango = consulta
+        self.db.submit("exportar", contar_filas, "salidas", filtro, rango,
+                       on_done=lambda total: self._exportar_csv(consulta, total))
 
-        try:
-            salidas = obtener_salidas()
-            if not salidas:
-                messagebox.showinfo("Sin datos", "No hay datos de salidas para exportar.")
-                return
+    def _exportar_csv(self, consulta, total):
+        from tkinter import filedialog
 
-            # Selector de archivo para guardar
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("Archivo CSV", "*.csv")],
-                title="Guardar archivo CSV como",
-                initialfile=f"salidas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            )
+        filtro, orden, descendente, rango = consulta
+        if total == 0:
+            messagebox.showinfo("Sin datos", "No hay datos de salidas para exportar.")
+            return
 
-            if not filename:
-                return  # Usuario canceló
+        # Selector de archivo para guardar
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("Archivo CSV", "*.csv")],
+            title="Guardar archivo CSV como",
+            initialfile=f"salidas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
 
-            with open(filename, mode="w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                # Encabezados
-                writer.writerow(["Nombre", "Fecha", "Operativo/No operativo", "Destino", "Cantidad", "Comentario"])
+        if not filename:
+            return  # Usuario canceló
 
-                # Escribir filas
-                for s in salidas:
-                    # s = (id, nombre, fecha, estado, destino, cantidad, comentario)
-                    writer.writerow([s[1], s[2], s[3], s[4], s[5], s[6]])
+        # Se exporta lo que muestra la tabla: búsqueda, período y orden
+        self.btn_exportar.configure(state="disabled")
+        export_csv_dialog(self.master, "salidas", filename, filtro, orden, descendente,
+                          on_finish=lambda: self.btn_exportar.configure(state="normal"), rango=rango)
 
-            messagebox.showinfo("Exportación exitosa", f"Datos exportados correctamente a:\n{filename}")
+    # ---------------------------------------------------
+    # Importar salidas desde CSV
+    # ---------------------------------------------------
+    def importar_csv(self):
+        from tkinter import filedialog
 
-        except Exception as e:
-            messagebox.showerror("Error al exportar", f"Ocurrió un error al exportar:\n{e}")
+        archivo = filedialog.askopenfilename(
+            filetypes=[("Archivo CSV", "*.csv"), ("Todos", "*.*")],
+            title="Importar salidas desde CSV",
+        )
+        if not archivo:
+            return
+        self.btn_importar.configure(state="disabled")
 
+        def terminar():
+            self.btn_importar.configure(state="normal")
+            self._actualizar_productos()
+            self.mostrar_salidas()
 
+        import_csv_dialog(self.master, "salidas", archivo, on_finish=terminar)
 
     # ---------------------------------------------------
     # Edición y resaltado visual
     # ---------------------------------------------------
     def _on_double_click(self, e):
         rowid = self.tree.identify_row(e.y)
-        if not rowid: return
+        if not rowid or self.table.is_placeholder(rowid): return
         vals = self.tree.item(rowid, "values")
         self.selected_id = rowid
         self.nombre_combo.set(vals[0])
@@ -371,10 +399,15 @@ class TabSalidas:
         self.estado_combo.set(vals[2])
         self.destino_entry.delete(0, "end"); self.destino_entry.insert(0, vals[3])
         self.cantidad_entry.delete(0, "end"); self.cantidad_entry.insert(0, vals[4])
-        self.comentario_entry.delete(0, "end"); self.comentario_entry.insert(0, vals[5])
+        self.ubicacion_combo.set(vals[5])
+        self.comentario_entry.delete(0, "end"); self.comentario_entry.insert(0, vals[6])
         self.btn_guardar.configure(text="✏️ Guardar cambios")
 
     def _highlight_recent(self):
+        if self.table.visible_range()[1] < self.table.total:
+            # la salida nueva queda al final del orden por defecto
+            self.table.scroll_to(self.table.total, then=self._highlight_recent)
+            return
         try:
             last = self.tree.get_children()[-1]
             self.tree.item(last, tags=("highlight",))
@@ -386,23 +419,10 @@ class TabSalidas:
     # ---------------------------------------------------
     # Tooltip
     # ---------------------------------------------------
-    def _on_motion(self, e):
-        rowid = self.tree.identify_row(e.y)
-        col = self.tree.identify_column(e.x)
-        if not rowid or not col:
-            self.tooltip.hide()
-            return
-        if col == "#6":
-            vals = self.tree.item(rowid, "values")
-            text = vals[5] if len(vals) > 5 else ""
-            if text:
-                x = self.tree.winfo_rootx() + e.x + 20
-                y = self.tree.winfo_rooty() + e.y + 10
-                self.tooltip.show(text, x, y)
-            else:
-                self.tooltip.hide()
-        else:
-            self.tooltip.hide()
+    def _comentario_de(self, rowid):
+        # Se lee de la caché de filas de la tabla, no de Tk
+        fila = self.table.row(rowid)
+        return fila[6] if fila else ""
 
     # ---------------------------------------------------
     # Limpieza
@@ -412,6 +432,8 @@ class TabSalidas:
         self.nombre_combo.set("")
         self.fecha_entry.set_date(datetime.now())
         self.estado_combo.set("Operativo")
+        valores = self.ubicacion_combo.cget("values")
+        self.ubicacion_combo.set(valores[0] if valores else "")
         for entry in [self.destino_entry, self.cantidad_entry, self.comentario_entry]:
             entry.delete(0, "end")
         self.btn_guardar.configure(text="➕ Agregar")
@@ -420,5 +442,4 @@ class TabSalidas:
     # Búsqueda
     # ---------------------------------------------------
     def _on_search(self, *args):
-        self.page = 0
         self.mostrar_salidas()
\ No newline at end of file
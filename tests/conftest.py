@@ -0,0 +1,29 @@
+# tests/conftest.py
+# ----------------------------------------------------
+# Cada prueba trabaja sobre su propia base de datos, nueva y migrada.
+#
+#   python -m pytest -q
+# ----------------------------------------------------
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar database: si no, copia la base inicial en la carpeta del usuario
+os.environ["INVENTARIO_DB"] = os.path.join(tempfile.mkdtemp(prefix="inventario_pruebas_"), "inventario.db")
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """El módulo database apuntando a una base vacía en tmp_path."""
+    database.cerrar_conexiones()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "inventario.db"))
+    database.migrar()
+    yield database
+    database.cerrar_conexiones()
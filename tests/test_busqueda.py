@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+
+@pytest.fixture
+def con_nombres(db):
+    azar = random.Random(7)
+    palabras = ["tornillo", "tuerca", "toma", "cable", "cabezal", "taco", "arandela", "to"]
+    for i in range(120):
+        nombre = " ".join(azar.choice(palabras) for _ in range(azar.randint(1, 4)))
+        db.agregar_entrada(nombre, f"2025-01-{i % 28 + 1:02d}", f"F-{i}", 1, "")
+    return db
+
+
+def _todas(db, filtro, orden=None):
+    filas, cursor = [], None
+    while True:
+        pagina, cursor = db.obtener_pagina("entradas", filtro=filtro, orden=orden, cursor=cursor, limite=25)
+        filas += pagina
+        if cursor is None:
+            return filas
+
+
+@pytest.mark.parametrize("escrito", [["t", "to"], ["tor", "tornillo t"], ["ca", "cab"]])
+def test_refinar_no_cambia_el_orden(con_nombres, escrito):
+    db = con_nombres
+    # Sin orden van por relevancia; con fecha se refina en memoria
+    for orden in (None, "fecha"):
+        db.limpiar_cache()
+        esperado = _todas(db, escrito[-1], orden)
+        db.limpiar_cache()
+        for filtro in escrito:
+            obtenido = _todas(db, filtro, orden)
+        assert obtenido == esperado
@@ -0,0 +1,47 @@
+import sqlite3
+import threading
+
+
+def _en_otro_hilo(fn, *args):
+    hilo = threading.Thread(target=fn, args=args)
+    hilo.start()
+    hilo.join()
+
+
+def _cambios(db, antes):
+    db._generacion(())
+    return {t: g - antes[t] for t, g in db._generaciones.items() if g != antes[t]}
+
+
+def test_escrituras_de_otro_hilo_no_invalidan_todo(db):
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "")
+    db._generacion(())
+    antes = dict(db._generaciones)
+    _en_otro_hilo(db.registrar_salida, "Tornillo", "2025-02-01", "Operativo", "Obra", 2, "")
+    assert _cambios(db, antes) == {"salidas": 1}
+    # Ni el primer uso de la conexión de otro hilo
+    antes = dict(db._generaciones)
+    _en_otro_hilo(db._generacion, ())
+    assert _cambios(db, antes) == {}
+
+
+def test_escrituras_de_otro_proceso_invalidan_todo(db):
+    db._generacion(())
+    antes = dict(db._generaciones)
+    otra = sqlite3.connect(db.DB_PATH, isolation_level=None)
+    try:
+        # Otro proceso con este módulo: cuenta su escritura
+        otra.execute("BEGIN IMMEDIATE")
+        otra.execute("INSERT INTO ubicaciones (nombre) VALUES ('Norte')")
+        otra.execute("UPDATE escrituras SET n = n + 1")
+        otra.execute("COMMIT")
+        assert set(_cambios(db, antes)) == set(db._generaciones)
+        assert [nombre for _, nombre in db.obtener_ubicaciones()] == ["Principal", "Norte"]
+
+        # Otro programa, sin contador
+        antes = dict(db._generaciones)
+        otra.execute("DELETE FROM ubicaciones WHERE nombre = 'Norte'")
+        assert set(_cambios(db, antes)) == set(db._generaciones)
+        assert [nombre for _, nombre in db.obtener_ubicaciones()] == ["Principal"]
+    finally:
+        otra.close()
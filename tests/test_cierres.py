@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def con_historia(db):
+    for mes in range(1, 13):
+        db.agregar_entrada("Tornillo", f"2025-{mes:02d}-10", f"F-{mes}", 10, "")
+        db.registrar_salida("Tornillo", f"2025-{mes:02d}-20", "Operativo", "Obra", 3, "")
+    return db
+
+
+def _cierres(db):
+    return db.connect().execute("SELECT COUNT(*), SUM(valido) FROM cierres").fetchone()
+
+
+def test_escribir_con_fecha_anterior_recalcula_los_cierres(con_historia):
+    db = con_historia
+    total, validos = _cierres(db)
+    assert total >= 12 and validos == total
+    db.agregar_entrada("Tornillo", "2025-02-01", "F-vieja", 5, "")
+    assert _cierres(db) == (total, total)
+    assert db.stock_al("2025-06-30", "Tornillo") == [("Tornillo", 65, 18, 47)]
+
+
+def test_leer_no_escribe_aunque_los_cierres_esten_desactualizados(con_historia):
+    db = con_historia
+    otra = sqlite3.connect(db.DB_PATH, isolation_level=None, timeout=0)
+    try:
+        # Otro proceso deja los cierres sin validez y se queda con el bloqueo de escritura
+        otra.execute("BEGIN IMMEDIATE")
+        otra.execute("UPDATE cierres SET valido = 0 WHERE fecha >= '2025-05-31'")
+        otra.execute("COMMIT")
+        otra.execute("BEGIN IMMEDIATE")
+
+        assert db.stock_al("2025-08-15", "Tornillo") == [("Tornillo", 80, 21, 59)]
+        assert db.stock_al("2025-08-15", "Tornillo", "Principal") == [("Tornillo", 80, 21, 59)]
+        rango = ("2025-07-01", "2025-07-31")
+        assert db.obtener_pagina("stock", rango=rango)[0] == [("Tornillo", 10, 3, 49)]
+        assert db.contar_filas("stock", rango=rango) == 1
+        otra.execute("ROLLBACK")
+    finally:
+        otra.close()
+    # Siguen sin validez hasta la próxima escritura o mantenimiento
+    total, validos = _cierres(db)
+    assert validos < total
+    db.optimizar()
+    assert _cierres(db) == (total, total)
+
+
+def test_interrupcion_deshace_la_transaccion(db):
+    with pytest.raises(KeyboardInterrupt):
+        with db.transaccion("IMMEDIATE") as conn:
+            conn.execute("INSERT INTO ubicaciones (nombre) VALUES ('Norte')")
+            conn.execute("ROLLBACK")  # como hace SQLite al interrumpir una escritura
+            raise KeyboardInterrupt
+    assert not db.connect().in_transaction
+    assert [nombre for _, nombre in db.obtener_ubicaciones()] == ["Principal"]
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+import cli
+
+
+def _ejecutar(db, *argv):
+    salida = io.StringIO()
+    codigo = cli.ejecutar(cli._crear_parser().parse_args(list(argv)), salida, db)
+    return codigo, json.loads(salida.getvalue()) if salida.getvalue() else None
+
+
+@pytest.fixture
+def con_stock(db):
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "")
+    db.agregar_entrada("Tornillo 6mm", "2025-01-10", "F-2", 4, "")
+    db.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 3, "")
+    return db
+
+
+def test_inventario_de_un_producto(con_stock):
+    assert _ejecutar(con_stock, "inventario", "--producto", " Tornillo ") == (
+        cli.CORRECTO, [{"producto": "Tornillo", "entradas": 10, "salidas": 3, "disponible": 7}])
+    assert _ejecutar(con_stock, "inventario", "--producto", "Tornillo", "--al", "2025-01-31") == (
+        cli.CORRECTO, [{"producto": "Tornillo", "entradas": 10, "salidas": 0, "disponible": 10}])
+    assert _ejecutar(con_stock, "inventario", "--producto", "Clavo") == (cli.CORRECTO, [])
+
+
+@pytest.mark.parametrize("opciones", [["--buscar", "torn"], ["--desde", "2025-01-01"], ["--hasta", "2025-12-31"]])
+def test_inventario_al_rechaza_opciones_sin_soporte(con_stock, opciones, capsys):
+    assert _ejecutar(con_stock, "inventario", "--al", "2025-01-31", *opciones) == (cli.USO, None)
+    assert "--al" in capsys.readouterr().err
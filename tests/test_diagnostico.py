@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+
+@pytest.mark.skipif(os.environ.get("INVENTARIO_DIAGNOSTICO") == "1", reason="medición encendida por entorno")
+def test_medicion_apagada_por_defecto(db):
+    db.limpiar_diagnostico()
+    db.obtener_pagina("entradas")
+    estado = db.estadisticas_consultas()
+    assert not estado["activo"]
+    assert estado["sentencias"] == 0
+
+
+def test_medicion_desde_la_ventana(db):
+    activo = db.estadisticas_consultas()["activo"]
+    db.configurar_diagnostico(activo=True)
+    try:
+        db.limpiar_diagnostico()
+        db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "")
+        db.connect().execute("SELECT * FROM entradas").fetchall()
+        estado = db.estadisticas_consultas()
+        assert estado["activo"]
+        assert any("FROM entradas" in s["sql"] for s in estado["mas_costosas"])
+    finally:
+        db.configurar_diagnostico(activo=activo)
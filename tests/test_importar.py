@@ -0,0 +1,64 @@
+import pytest
+
+
+def _csv(tmp_path, texto, nombre="datos.csv"):
+    ruta = tmp_path / nombre
+    ruta.write_text(texto, encoding="utf-8")
+    return str(ruta)
+
+
+def test_importar_entradas_con_rechazos(db, tmp_path):
+    ruta = _csv(tmp_path, (
+        "Producto;Fecha;Factura;Cantidad;Comentario\n"
+        "Tornillo;10/01/2025;F-1;10;\n"
+        "Tuerca;2025-01-11;F-2;cero;\n"
+        "Arandela;2025-01-12;F-1;4;\n"
+        "\n"
+        ";2025-01-13;F-3;1;\n"
+        "Clavo;2025-01-14;F-4;-2;\n"
+        "Tuerca;2025-01-15;F-5;6;con comentario\n"
+    ))
+    resultado = db.importar_csv("entradas", ruta)
+    assert resultado["lineas"] == 6
+    assert resultado["insertadas"] == 2
+    assert resultado["rechazadas"] == 4
+    assert [linea for linea, _ in resultado["errores"]] == [3, 4, 6, 7]
+    assert not resultado["cancelado"]
+    assert db.stock_disponible("Tornillo") == 10
+    assert db.stock_disponible("Tuerca") == 6
+    assert db.verificar_stock() == []
+
+
+def test_importar_salidas_comprueba_el_stock_en_el_lote(db, tmp_path):
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "")
+    ruta = _csv(tmp_path, "".join(f"Tornillo,2025-02-0{i},Operativo,Obra,4,\n" for i in range(1, 4)))
+    resultado = db.importar_csv("salidas", ruta, tamano_lote=2)
+    assert (resultado["insertadas"], resultado["rechazadas"]) == (2, 1)
+    assert resultado["errores"][0][0] == 3
+    assert db.stock_disponible("Tornillo") == 2
+
+
+@pytest.mark.parametrize("cancelar_tras", [1, 2])
+def test_importar_cancelado(db, tmp_path, cancelar_tras):
+    ruta = _csv(tmp_path, "".join(f"Tornillo,2025-01-10,F-{i},1,\n" for i in range(5)))
+    avances = []
+    resultado = db.importar_csv("entradas", ruta, tamano_lote=2,
+                                progreso=lambda lineas, fraccion: avances.append(fraccion),
+                                cancelado=lambda: len(avances) >= cancelar_tras)
+    # Los lotes ya guardados se conservan, pero no se informa el 100 %
+    assert resultado["cancelado"]
+    assert resultado["insertadas"] == 2 * cancelar_tras
+    assert db.stock_disponible("Tornillo") == 2 * cancelar_tras
+    assert len(avances) == cancelar_tras
+    assert 1.0 not in avances
+
+
+def test_importar_completo_informa_el_100(db, tmp_path):
+    ruta = _csv(tmp_path, "".join(f"Tornillo,2025-01-10,F-{i},1,\n" for i in range(5)))
+    avances = []
+    resultado = db.importar_csv("entradas", ruta, tamano_lote=2,
+                                progreso=lambda lineas, fraccion: avances.append(fraccion),
+                                cancelado=lambda: False)
+    assert not resultado["cancelado"]
+    assert resultado["insertadas"] == 5
+    assert avances[-1] == 1.0
@@ -0,0 +1,29 @@
+import os
+import shutil
+
+
+def test_migrar_la_base_inicial(tmp_path, monkeypatch):
+    import database
+
+    database.cerrar_conexiones()
+    ruta = tmp_path / "inventario.db"
+    shutil.copy(os.path.join(os.path.dirname(database.__file__), "inventario.db"), ruta)
+    monkeypatch.setattr(database, "DB_PATH", str(ruta))
+    try:
+        conn = database.connect()
+        entradas = conn.execute("SELECT COUNT(*), SUM(cantidad) FROM entradas").fetchone()
+        salidas = conn.execute("SELECT COUNT(*), SUM(cantidad) FROM salidas").fetchone()
+
+        database.migrar()
+        assert database.version_esquema() == database.MIGRACIONES[-1][0]
+        assert not database.migraciones_pendientes()
+        # Los movimientos se conservan y quedan en la ubicación principal
+        assert conn.execute("SELECT COUNT(*), SUM(cantidad) FROM entradas").fetchone() == entradas
+        assert conn.execute("SELECT COUNT(*), SUM(cantidad) FROM salidas").fetchone() == salidas
+        assert conn.execute("SELECT DISTINCT ubicacion_id FROM entradas").fetchall() == [(1,)]
+        assert database.verificar_stock() == []
+        total = sum(d for _, _, _, d in database.calcular_inventario())
+        assert total == entradas[1] - salidas[1]
+        assert database.migrar() == []
+    finally:
+        database.cerrar_conexiones()
@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.fixture
+def con_stock(db):
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "")
+    db.agregar_entrada("Tuerca", "2025-01-10", "F-2", 3, "")
+    return db
+
+
+@pytest.mark.parametrize("cantidad", [0, -50])
+def test_cantidad_no_positiva(con_stock, cantidad):
+    with pytest.raises(ValueError):
+        con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", cantidad, "")
+    assert con_stock.stock_disponible("Tornillo") == 10
+    assert con_stock.contar_filas("salidas") == 0
+
+
+def test_stock_insuficiente(con_stock):
+    con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 7, "")
+    with pytest.raises(con_stock.StockInsuficiente) as error:
+        con_stock.registrar_salida("Tornillo", "2025-02-02", "Operativo", "Obra", 4, "")
+    assert error.value.disponible == 3
+    assert con_stock.stock_disponible("Tornillo") == 3
+
+
+def test_producto_desconocido(con_stock):
+    with pytest.raises(con_stock.StockInsuficiente) as error:
+        con_stock.registrar_salida("Clavo", "2025-02-01", "Operativo", "Obra", 1, "")
+    assert error.value.disponible == 0
+
+
+def test_editar_devuelve_la_cantidad_anterior(con_stock):
+    id_salida = con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 8, "")
+    # Disponible 2, pero las 8 de la salida vuelven al stock al editarla
+    con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 10, "", id_salida=id_salida)
+    assert con_stock.stock_disponible("Tornillo") == 0
+    with pytest.raises(con_stock.StockInsuficiente) as error:
+        con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 11, "", id_salida=id_salida)
+    assert error.value.disponible == 10
+    assert con_stock.stock_disponible("Tornillo") == 0
+
+
+def test_editar_cambiando_de_producto(con_stock):
+    id_salida = con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 8, "")
+    with pytest.raises(con_stock.StockInsuficiente):
+        con_stock.registrar_salida("Tuerca", "2025-02-01", "Operativo", "Obra", 4, "", id_salida=id_salida)
+    con_stock.registrar_salida("Tuerca", "2025-02-01", "Operativo", "Obra", 3, "", id_salida=id_salida)
+    assert con_stock.stock_disponible("Tornillo") == 10
+    assert con_stock.stock_disponible("Tuerca") == 0
+    assert con_stock.verificar_stock() == []
+
+
+def test_editar_salida_borrada(con_stock):
+    with pytest.raises(ValueError):
+        con_stock.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 1, "", id_salida=999)
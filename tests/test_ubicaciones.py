@@ -0,0 +1,126 @@
+import pytest
+
+
+def _paginas(db, tabla, **opciones):
+    filas, cursor = [], None
+    while True:
+        pagina, cursor = db.obtener_pagina(tabla, cursor=cursor, limite=2, **opciones)
+        filas += pagina
+        if cursor is None:
+            return filas
+
+
+def test_stock_por_ubicacion_con_nombre_reutilizado(db):
+    sucursal = db.agregar_ubicacion("Sucursal 2")
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 10, "", ubicacion=sucursal)
+    assert db.obtener_pagina("stock", ubicacion="Sucursal 2")[0] == [("Tornillo", 10, 0, 10)]
+    assert db.contar_filas("stock", ubicacion="Sucursal 2") == 1
+
+    # El nombre pasa a otra ubicación, vacía: la caché no debe devolver la vieja
+    db.actualizar_ubicacion(sucursal, "Norte")
+    db.agregar_ubicacion("Sucursal 2")
+    assert db.obtener_pagina("stock", ubicacion="Sucursal 2") == ([], None)
+    assert db.contar_filas("stock", ubicacion="Sucursal 2") == 0
+    assert db.obtener_pagina("stock", ubicacion="Norte")[0] == [("Tornillo", 10, 0, 10)]
+
+
+@pytest.fixture
+def dos_bodegas(db):
+    db.agregar_ubicacion("Norte")
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 50, "")
+    db.agregar_entrada("Tuerca", "2025-01-10", "F-2", 5, "")
+    return db
+
+
+def test_transferir_mueve_stock_entre_ubicaciones(dos_bodegas):
+    db = dos_bodegas
+    db.transferir("Tornillo", "2025-02-01", "Principal", "Norte", 20)
+    assert db.stock_disponible("Tornillo", "Principal") == 30
+    assert db.stock_disponible("Tornillo", "Norte") == 20
+    assert db.stock_por_ubicacion("Tornillo") == [("Norte", 20, 0, 20), ("Principal", 50, 20, 30)]
+    assert db.stock_ubicacion("Norte") == [("Tornillo", 20, 0, 20)]
+    assert db.verificar_stock() == []
+
+
+def test_transferencias_no_cuentan_en_los_totales(dos_bodegas):
+    db = dos_bodegas
+    db.transferir("Tornillo", "2025-02-01", "Principal", "Norte", 20)
+    db.registrar_salida("Tornillo", "2025-02-10", "Operativo", "Obra", 5, "", ubicacion="Norte")
+
+    assert db.stock_disponible("Tornillo") == 45
+    assert ("Tornillo", 50, 5, 45) in db.calcular_inventario()
+    assert ("Tornillo", 50, 5, 45) in db.obtener_pagina("stock")[0]
+    assert db.obtener_pagina("stock", rango=("2025-02-01", "2025-02-28"))[0] == [("Tornillo", 0, 5, 45)]
+    assert db.resumen_periodo("mes") == [("2025-01", 55, 0), ("2025-02", 0, 5)]
+    assert db.stock_al("2025-02-05", "Tornillo") == [("Tornillo", 50, 0, 50)]
+    # En cada ubicación la transferencia sí es una entrada y una salida
+    assert db.stock_al("2025-02-05", "Tornillo", "Norte") == [("Tornillo", 20, 0, 20)]
+    assert db.obtener_pagina("stock", rango=("2025-02-01", "2025-02-28"), ubicacion="Principal")[0] == [
+        ("Tornillo", 0, 20, 30)]
+    assert db.verificar_stock() == []
+    assert db.reconstruir_stock() == []
+
+
+def test_borrar_una_mitad_borra_la_transferencia(dos_bodegas):
+    db = dos_bodegas
+    primera = db.transferir("Tornillo", "2025-02-01", "Principal", "Norte", 20)
+    segunda = db.transferir("Tuerca", "2025-02-01", "Principal", "Norte", 5)
+    conn = db.connect()
+    entrada = conn.execute("SELECT id FROM entradas WHERE transferencia_id = ?", (primera,)).fetchone()[0]
+
+    db.eliminar_entrada(entrada)
+    assert conn.execute("SELECT COUNT(*) FROM salidas WHERE transferencia_id = ?", (primera,)).fetchone()[0] == 0
+    assert db.stock_disponible("Tornillo", "Principal") == 50
+    db.eliminar_salida(segunda)
+    assert conn.execute("SELECT COUNT(*) FROM entradas WHERE transferencia_id = ?", (segunda,)).fetchone()[0] == 0
+    assert db.stock_disponible("Tuerca", "Norte") == 0
+    assert db.verificar_stock() == []
+
+
+def test_mitades_de_transferencia_no_se_editan(dos_bodegas):
+    db = dos_bodegas
+    salida = db.transferir("Tornillo", "2025-02-01", "Principal", "Norte", 20)
+    entrada = db.connect().execute("SELECT id FROM entradas WHERE transferencia_id = ?", (salida,)).fetchone()[0]
+    with pytest.raises(ValueError):
+        db.actualizar_entrada(entrada, "Tornillo", "2025-02-01", f"TR-{salida}", 1, "")
+    with pytest.raises(ValueError):
+        db.registrar_salida("Tornillo", "2025-02-01", "Operativo", "Obra", 1, "", id_salida=salida)
+
+
+@pytest.mark.parametrize("origen, destino, cantidad, error", [
+    ("Principal", "Norte", 51, "StockInsuficiente"),
+    ("Norte", "Principal", 1, "StockInsuficiente"),
+    ("Norte", "norte", 1, "ValueError"),
+    ("Principal", "Sur", 1, "ValueError"),
+    ("Principal", "Norte", 0, "ValueError"),
+])
+def test_transferencias_invalidas(dos_bodegas, origen, destino, cantidad, error):
+    db = dos_bodegas
+    excepcion = db.StockInsuficiente if error == "StockInsuficiente" else ValueError
+    with pytest.raises(excepcion):
+        db.transferir("Tornillo", "2025-02-01", origen, destino, cantidad)
+    assert db.stock_por_ubicacion("Tornillo") == [("Principal", 50, 0, 50)]
+
+
+def test_ubicaciones(db):
+    norte = db.agregar_ubicacion("  Norte ")
+    assert db.obtener_ubicaciones() == [(1, "Principal"), (norte, "Norte")]
+    with pytest.raises(ValueError):
+        db.agregar_ubicacion("NORTE")
+    with pytest.raises(ValueError):
+        db.eliminar_ubicacion(db.UBICACION_PRINCIPAL)
+    db.agregar_entrada("Tornillo", "2025-01-10", "F-1", 5, "", ubicacion="Norte")
+    with pytest.raises(ValueError):
+        db.eliminar_ubicacion(norte)
+
+
+def test_paginas_filtradas_por_ubicacion(dos_bodegas):
+    db = dos_bodegas
+    for dia in range(1, 8):
+        db.transferir("Tornillo", f"2025-02-{dia:02d}", "Principal", "Norte", 1)
+    esperadas = db.contar_filas("entradas", ubicacion="Norte")
+    assert esperadas == 7
+    for orden in (None, "fecha", "cantidad", "nombre"):
+        filas = _paginas(db, "entradas", orden=orden, ubicacion="Norte")
+        assert len({fila[0] for fila in filas}) == esperadas
+        assert all(fila[-1] == "Norte" for fila in filas)
@@ -4,8 +4,13 @@
 # Entradas, Salidas e Inventario
 # ----------------------------------------------------
 
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 import customtkinter as ctk
-from tkinter import ttk, StringVar, Entry, Frame, Label, Button
+from tkinter import ttk, messagebox, StringVar, Entry, Frame, Label, Button, Toplevel
 
 # -------------------------------
 # COLORES UNIFICADOS
@@ -102,14 +107,106 @@ def _ajustar_color_hover(hex_color):
 # -------------------------------
 # BARRA DE BUSQUEDA
 # -------------------------------
-def create_search_bar(parent, callback):
+def create_search_bar(parent, callback, live=False, delay_ms=150):
+    """Barra de búsqueda. Con live=True también busca mientras se escribe,
+    esperando `delay_ms` sin teclas nuevas antes de llamar a callback()."""
     frame = create_frame(parent, fg_color="transparent")
     entry = ctk.CTkEntry(frame, placeholder_text="Buscar...", width=250)
     entry.pack(side="left", padx=5)
-    btn = create_button(frame, "Buscar", command=lambda: callback(), style="primary", width=80)
+    state = {"after": None, "text": ""}
+
+    def run():
+        state["after"] = None
+        state["text"] = entry.get()
+        callback()
+
+    def on_key(event):
+        if state["after"]:
+            entry.after_cancel(state["after"])
+            state["after"] = None
+        if entry.get() != state["text"]:  # flechas, Shift, etc. no cambian el texto
+            state["after"] = entry.after(delay_ms, run)
+
+    def now():
+        if state["after"]:
+            entry.after_cancel(state["after"])
+        run()
+
+    if live:
+        entry.bind("<KeyRelease>", on_key)
+    entry.bind("<Return>", lambda e: now())
+    btn = create_button(frame, "Buscar", command=now, style="primary", width=80)
     btn.pack(side="left", padx=5)
     return frame, entry
 
+# -------------------------------
+# RANGO DE FECHAS
+# -------------------------------
+def _mes_anterior(hoy):
+    fin = hoy.replace(day=1) - timedelta(days=1)
+    return fin.replace(day=1), fin
+
+
+class DateRangeBar:
+    """Selector de período: un atajo ("Este mes", "Mes anterior"...) o dos
+    fechas a mano. Llama a callback() cada vez que cambia; rango() devuelve
+    (desde, hasta) en ISO, o None con "Todo"."""
+
+    ATAJOS = {
+        "Todo": None,
+        "Hoy": lambda hoy: (hoy, hoy),
+        "Esta semana": lambda hoy: (hoy - timedelta(days=hoy.weekday()), hoy),
+        "Este mes": lambda hoy: (hoy.replace(day=1), hoy),
+        "Mes anterior": _mes_anterior,
+        "Este año": lambda hoy: (hoy.replace(month=1, day=1), hoy),
+        "Personalizado": None,
+    }
+
+    def __init__(self, parent, callback):
+        from tkcalendar import DateEntry  # lento de importar (carga babel)
+
+        self.callback = callback
+        self.activo = False
+        self._ultimo = None
+        self.frame = create_frame(parent, fg_color="transparent")
+        self.atajo = ctk.CTkOptionMenu(self.frame, values=list(self.ATAJOS), width=130, command=self._on_atajo)
+        self.atajo.set("Todo")
+        self.atajo.pack(side="left", padx=5)
+        create_label(self.frame, "Desde").pack(side="left", padx=(8, 4))
+        self.desde = DateEntry(self.frame, date_pattern="dd-mm-yyyy", width=10)
+        self.desde.set_date(date.today().replace(day=1))
+        self.desde.pack(side="left")
+        create_label(self.frame, "Hasta").pack(side="left", padx=(8, 4))
+        self.hasta = DateEntry(self.frame, date_pattern="dd-mm-yyyy", width=10)
+        self.hasta.pack(side="left")
+        for entry in (self.desde, self.hasta):
+            entry.bind("<<DateEntrySelected>>", self._on_fecha)
+            entry.bind("<Return>", self._on_fecha)
+
+    def rango(self):
+        if not self.activo:
+            return None
+        try:
+            desde, hasta = sorted((self.desde.get_date(), self.hasta.get_date()))
+        except ValueError:
+            return self._ultimo  # texto a medio escribir: se mantiene el rango anterior
+        self._ultimo = (desde.isoformat(), hasta.isoformat())
+        return self._ultimo
+
+    def _on_atajo(self, nombre):
+        calcular = self.ATAJOS[nombre]
+        if calcular:
+            desde, hasta = calcular(date.today())
+            self.desde.set_date(desde)
+            self.hasta.set_date(hasta)
+        self.activo = nombre != "Todo"
+        self.callback()
+
+    def _on_fecha(self, event=None):
+        self.atajo.set("Personalizado")
+        self.activo = True
+        self.callback()
+
 # -------------------------------
 # ESTILO DE TABLA
 # -------------------------------
@@ -134,4 +231,881 @@ def apply_table_style(tabla):
         font=("Segoe UI", 11, "bold"),
         relief="flat"
     )
-    style.map("Treeview.Heading", background=[("active", COLORES["primary"])])
\ No newline at end of file
+    style.map("Treeview.Heading", background=[("active", COLORES["primary"])])
+
+# -------------------------------
+# TOOLTIP DE CELDA
+# -------------------------------
+class CellTooltip:
+    """Tooltip para una columna de un Treeview (p. ej. comentarios largos).
+
+    Usa una sola ventana que se oculta y se vuelve a mostrar. En <Motion>
+    solo se averigua la celda bajo el puntero; si es la misma de antes no se
+    hace nada. El texto se pide a text_for(iid), que debe leerlo de una
+    caché de filas, y aparece tras `delay_ms` con el puntero quieto en la celda.
+    """
+
+    def __init__(self, tree, column, text_for, delay_ms=400, wraplength=500):
+        self.tree = tree
+        self.column = column  # identificador de Tk, p. ej. "#5"
+        self.text_for = text_for
+        self.delay_ms = delay_ms
+        self.wraplength = wraplength
+        self._window = None
+        self._label = None
+        self._cell = None
+        self._pending = None
+
+        tree.bind("<Motion>", self._on_motion, add="+")
+        tree.bind("<Leave>", lambda e: self.hide(), add="+")
+        tree.bind("<ButtonPress>", lambda e: self.hide(), add="+")
+
+    def _on_motion(self, event):
+        rowid = self.tree.identify_row(event.y)
+        cell = (rowid, self.tree.identify_column(event.x)) if rowid else None
+        if cell == self._cell:
+            return
+        self.hide()
+        self._cell = cell
+        if cell and cell[1] == self.column:
+            x = self.tree.winfo_rootx() + event.x + 20
+            y = self.tree.winfo_rooty() + event.y + 10
+            self._pending = self.tree.after(self.delay_ms, lambda: self._show(rowid, x, y))
+
+    def _show(self, rowid, x, y):
+        self._pending = None
+        text = self.text_for(rowid)
+        if not text:
+            return
+        if self._window is None:
+            self._window = Toplevel(self.tree)
+            self._window.wm_overrideredirect(True)
+            self._window.attributes("-topmost", True)
+            self._label = Label(self._window, justify="left", background="#ffffe0", relief="solid",
+                                   borderwidth=1, font=("Segoe UI", 9), wraplength=self.wraplength)
+            self._label.pack(ipadx=4, ipady=3)
+        self._label.configure(text=text)
+        self._window.wm_geometry("+%d+%d" % (x, y))
+        self._window.deiconify()
+
+    def hide(self):
+        self._cell = None
+        if self._pending:
+            self.tree.after_cancel(self._pending)
+            self._pending = None
+        if self._window is not None:
+            self._window.withdraw()
+
+
+# -------------------------------
+# SINCRONIZAR FILAS CON UN TREEVIEW
+# -------------------------------
+class TreeBinding:
+    """Mantiene un Treeview igual a una lista de filas tocando solo lo que cambió.
+
+    update() recibe tuplas (iid, values, tags, fila) en el orden deseado y
+    compara con lo que ya se muestra: borra las filas que sobran, inserta
+    las nuevas, y solo llama a item()/move() en las que cambiaron de
+    valores, etiquetas o posición. row(iid) devuelve la fila original sin
+    preguntarle a Tk.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._shown = {}  # iid -> (values, tags)
+        self._rows = {}   # iid -> fila original
+        self._order = []  # iids en el orden del Treeview
+
+    def update(self, entries):
+        entries = [(str(iid), tuple(values), tuple(tags), fila) for iid, values, tags, fila in entries]
+        wanted = {iid for iid, _, _, _ in entries}
+
+        gone = [iid for iid in self._order if iid not in wanted]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del self._shown[iid]
+                del self._rows[iid]
+            self._order = [iid for iid in self._order if iid in wanted]
+
+        for index, (iid, values, tags, fila) in enumerate(entries):
+            self._rows[iid] = fila
+            previous = self._shown.get(iid)
+            if previous is None:
+                self.tree.insert("", index, iid=iid, values=values, tags=tags)
+                self._order.insert(index, iid)
+            else:
+                if previous != (values, tags):
+                    self.tree.item(iid, values=values, tags=tags)
+                if self._order[index] != iid:
+                    self.tree.move(iid, "", index)
+                    self._order.remove(iid)
+                    self._order.insert(index, iid)
+            self._shown[iid] = (values, tags)
+
+    def clear(self):
+        self.update([])
+
+    def row(self, iid):
+        return self._rows.get(iid)
+
+    def iids(self):
+        return list(self._order)
+
+
+# -------------------------------
+# TABLA VIRTUAL (desplazamiento infinito)
+# -------------------------------
+class VirtualTable:
+    """Treeview que solo contiene las filas visibles.
+
+    Las filas se piden a la base de datos por bloques a medida que el
+    usuario se desplaza y se guardan en una caché LRU de tamaño fijo, así
+    la memoria no depende del total de filas. La barra de desplazamiento
+    representa el total real (count()).
+
+    fetch(cursor, offset, limit) -> (filas, cursor_siguiente) y count() -> int
+    se ejecutan en los hilos del QueryExecutor. row_values(fila) y
+    row_tags(fila) dan lo que se muestra; la primera columna de la fila es
+    la clave que se usa como iid. Los cambios se aplican con TreeBinding,
+    así al recargar tras guardar solo se repinta la fila afectada.
+    """
+
+    PLACEHOLDER = "…"
+
+    def __init__(self, parent, columns, executor, fetch, count, row_values=None, row_tags=None,
+                 height=14, block_size=100, max_blocks=40, on_change=None, **tree_kwargs):
+        self.executor = executor
+        self.fetch = fetch
+        self.count = count
+        self.row_values = row_values or (lambda fila: fila[1:])
+        self.row_tags = row_tags or (lambda fila: ())
+        self.height = height
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.on_change = on_change
+        self.columns = columns
+
+        self.total = 0
+        self.top = 0
+        self._blocks = OrderedDict()  # índice de bloque -> (filas, cursor_siguiente)
+        self._stale = {}  # bloques de antes de recargar, se muestran hasta que lleguen los nuevos
+        self._generation = 0
+        self._after_render = None
+
+        self.frame = create_frame(parent, fg_color="transparent")
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", height=height, **tree_kwargs)
+        self.binding = TreeBinding(self.tree)
+        self.vsb = ttk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        self.vsb.pack(side="right", fill="y")
+        self.tree.pack(fill="both", expand=True, side="left")
+
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda e: self._scroll_key(-self.height))
+        self.tree.bind("<Next>", lambda e: self._scroll_key(self.height))
+        self.tree.bind("<Home>", lambda e: self._scroll_key(-self.total))
+        self.tree.bind("<End>", lambda e: self._scroll_key(self.total))
+        self.tree.bind("<Up>", lambda e: self._on_arrow(-1))
+        self.tree.bind("<Down>", lambda e: self._on_arrow(1))
+
+    # ---------- API ----------
+    def reload(self, keep_position=False, then=None):
+        """Vuelve a contar y cargar las filas (tras buscar, ordenar o guardar)."""
+        self._generation += 1
+        if keep_position:
+            self._stale = dict(self._blocks)
+        else:
+            self._stale = {}
+            self.top = 0
+        self._blocks.clear()
+        generation = self._generation
+        top, height, size = self.top, self.height, self.block_size
+
+        def load():
+            # Se ejecuta en un hilo de trabajo: conteo y bloques visibles en
+            # una sola petición, así una búsqueda se pinta en un solo viaje
+            total = self.count()
+            first = max(0, min(top, total - height))
+            last = min(total, first + height) - 1
+            blocks, cursor = {}, None
+            for block in range(first // size, last // size + 1):
+                offset = 0 if cursor is not None else block * size
+                blocks[block] = self.fetch(cursor, offset, size)
+                cursor = blocks[block][1]
+            return total, first, blocks
+
+        def loaded(result):
+            if generation != self._generation:
+                return
+            self.total, self.top, blocks = result
+            self._blocks.update(blocks)
+            for block in blocks:
+                self._stale.pop(block, None)
+            self._after_render = then
+            self._render()
+
+        self.executor.submit("recarga", load, on_done=loaded)
+
+    def scroll(self, delta):
+        self.scroll_to(self.top + delta)
+
+    def scroll_to(self, index, then=None):
+        """Muestra la fila `index` arriba; then() se llama cuando ya está pintada."""
+        top = max(0, min(int(index), self.total - self.height))
+        if top != self.top or then:
+            self.top = top
+            self._after_render = then
+            self._render()
+
+    def row(self, iid):
+        """Fila de la base de datos que se muestra con ese iid (o None)."""
+        return self.binding.row(iid)
+
+    def is_placeholder(self, iid):
+        """True si la fila aún no llegó de la base de datos."""
+        return iid.startswith("_vacio")
+
+    def visible_range(self):
+        """(primera, última) fila visible, contando desde 1."""
+        if not self.total:
+            return 0, 0
+        return self.top + 1, min(self.total, self.top + self.height)
+
+    # ---------- scrolling ----------
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(value) * self.total)
+        elif action == "scroll":
+            step = self.height if unit == "pages" else 1
+            self.scroll(int(value) * step)
+
+    def _on_wheel(self, event):
+        # Windows/macOS: delta es múltiplo de 120 (o pequeño en macOS)
+        notches = event.delta // 120 if abs(event.delta) >= 120 else (1 if event.delta > 0 else -1)
+        self.scroll(-3 * notches)
+        return "break"
+
+    def _scroll_key(self, delta):
+        self.scroll(delta)
+        return "break"
+
+    def _on_arrow(self, direction):
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        if not children or focus not in children:
+            return None
+        position = children.index(focus)
+        at_edge = (direction < 0 and position == 0) or (direction > 0 and position == len(children) - 1)
+        if not at_edge:
+            return None  # Treeview mueve la selección por sí mismo
+        self.scroll(direction)
+        self._select_index(position)
+        return "break"
+
+    def _select_index(self, position):
+        children = self.tree.get_children()
+        if 0 <= position < len(children) and not self.is_placeholder(children[position]):
+            self.tree.selection_set(children[position])
+            self.tree.focus(children[position])
+
+    # ---------- data ----------
+    def _rows_for_window(self):
+        """Filas visibles (None donde el bloque aún no llegó) y bloques que faltan."""
+        rows, missing = [], []
+        end = min(self.total, self.top + self.height)
+        for index in range(self.top, end):
+            block, offset = divmod(index, self.block_size)
+            if block in self._blocks:
+                self._blocks.move_to_end(block)
+                block_rows = self._blocks[block][0]
+            else:
+                block_rows = self._stale.get(block, ((), None))[0]
+                if block not in missing:
+                    missing.append(block)
+            rows.append(block_rows[offset] if offset < len(block_rows) else None)
+        return rows, missing
+
+    def _anchor(self, block):
+        """Cursor y desplazamiento para llegar a `block` desde el bloque cacheado más cercano."""
+        previous = [b for b in self._blocks if b < block and self._blocks[b][1] is not None]
+        if previous:
+            nearest = max(previous)
+            return self._blocks[nearest][1], (block - nearest - 1) * self.block_size
+        return None, block * self.block_size
+
+    def _request_blocks(self, missing):
+        generation = self._generation
+        anchors = {block: self._anchor(block) for block in missing}
+        size = self.block_size
+
+        def load():
+            # Se ejecuta en un hilo de trabajo
+            loaded = {}
+            for block in missing:
+                if block - 1 in loaded and loaded[block - 1][1] is not None:
+                    cursor, offset = loaded[block - 1][1], 0
+                else:
+                    cursor, offset = anchors[block]
+                loaded[block] = self.fetch(cursor, offset, size)
+            return loaded
+
+        def store(loaded):
+            if generation != self._generation:
+                return
+            for block, data in loaded.items():
+                self._blocks[block] = data
+                self._blocks.move_to_end(block)
+                self._stale.pop(block, None)
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+            self._render()
+
+        self.executor.submit("ventana", load, on_done=store)
+
+    def _render(self):
+        rows, missing = self._rows_for_window()
+        placeholder = (self.PLACEHOLDER,) * len(self.columns)
+        entries, seen = [], set()
+        for index, row in enumerate(rows, start=self.top):
+            # una fila vieja puede repetirse con una nueva mientras se recarga
+            if row is None or str(row[0]) in seen:
+                entries.append((f"_vacio{index}", placeholder, (), None))
+            else:
+                seen.add(str(row[0]))
+                entries.append((row[0], self.row_values(row), self.row_tags(row), row))
+        # el Treeview conserva la selección de las filas que siguen visibles
+        self.binding.update(entries)
+
+        if self.total:
+            self.vsb.set(self.top / self.total, min(1.0, (self.top + self.height) / self.total))
+        else:
+            self.vsb.set(0, 1)
+        if self.on_change:
+            self.on_change(*self.visible_range(), self.total)
+
+        if missing:
+            self._request_blocks(missing)
+        elif self._after_render:
+            callback, self._after_render = self._after_render, None
+            callback()
+
+
+# -------------------------------
+# TAREAS EN SEGUNDO PLANO
+# -------------------------------
+def run_in_background(widget, target, on_done=None, on_error=None, on_progress=None, poll_ms=100):
+    """Ejecuta target(reportar) en un hilo sin bloquear la interfaz.
+
+    target recibe una función reportar(*args) que puede llamar desde el hilo;
+    el último valor reportado se entrega a on_progress(*args) en el hilo de Tk.
+    Al terminar se llama on_done(resultado) u on_error(excepcion), también
+    desde el hilo de Tk mediante after().
+    """
+    estado = {"progreso": None}
+
+    def reportar(*args):
+        estado["progreso"] = args
+
+    def trabajo():
+        try:
+            estado["resultado"] = target(reportar)
+        except Exception as e:
+            estado["error"] = e
+
+    def revisar():
+        progreso, estado["progreso"] = estado["progreso"], None
+        if progreso is not None and on_progress:
+            on_progress(*progreso)
+        if hilo.is_alive():
+            widget.after(poll_ms, revisar)
+        elif "error" in estado:
+            if on_error:
+                on_error(estado["error"])
+        elif on_done:
+            on_done(estado.get("resultado"))
+
+    hilo = threading.Thread(target=trabajo, daemon=True)
+    hilo.start()
+    widget.after(poll_ms, revisar)
+    return hilo
+
+
+# Hilos compartidos por todas las pestañas para consultar la base de datos.
+# Cada hilo usa su propia conexión persistente (ver database.connect).
+_db_pool = None
+
+
+def _get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="db")
+    return _db_pool
+
+
+class QueryExecutor:
+    """Ejecuta funciones de database.py fuera del hilo de Tk.
+
+    Cada petición lleva una clave ("pagina", "guardar", ...). Si llega otra
+    petición con la misma clave antes de que termine la anterior, el
+    resultado viejo se descarta: si aún no había empezado no se ejecuta, y
+    si ya estaba consultando se interrumpe su sentencia SQLite.
+    on_busy(True/False) avisa cuando hay peticiones pendientes.
+    """
+
+    def __init__(self, widget, on_busy=None, poll_ms=20):
+        self.widget = widget
+        self.on_busy = on_busy
+        self.poll_ms = poll_ms
+        self._tickets = itertools.count(1)
+        self._latest = {}
+        self._pending = []
+        self._polling = False
+        self._busy = False
+        self._running = {}  # ticket -> conexión del hilo que la ejecuta
+        self._running_lock = threading.Lock()
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None):
+        """Encola fn(*args). Con key=None la petición nunca se descarta (escrituras)."""
+        if key is None:
+            key = object()
+        ticket = next(self._tickets)
+        previous = self._latest.get(key)
+        self._latest[key] = ticket
+        if previous is not None:
+            # Bajo el lock la petición vieja sigue dentro de fn, así el
+            # interrupt no puede alcanzar a otra consulta de ese hilo
+            with self._running_lock:
+                conn = self._running.get(previous)
+                if conn is not None:
+                    conn.interrupt()
+        future = _get_db_pool().submit(self._run, key, ticket, fn, args)
+        self._pending.append((key, ticket, future, on_done, on_error))
+        self._set_busy(True)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _run(self, key, ticket, fn, args):
+        from database import connect
+
+        if self._latest.get(key) != ticket:
+            return None  # reemplazada antes de empezar
+        with self._running_lock:
+            self._running[ticket] = connect()
+        try:
+            return fn(*args)
+        finally:
+            with self._running_lock:
+                del self._running[ticket]
+
+    def _poll(self):
+        current, self._pending = self._pending, []
+        still_running = []
+        for item in current:
+            key, ticket, future, on_done, on_error = item
+            if not future.done():
+                still_running.append(item)
+                continue
+            if self._latest.get(key) != ticket:
+                continue  # resultado obsoleto
+            del self._latest[key]
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    messagebox.showerror("Error", f"Error al consultar la base de datos:\n{error}")
+            elif on_done:
+                on_done(future.result())
+        # los callbacks pueden haber agregado peticiones nuevas
+        self._pending = still_running + self._pending
+        self._set_busy(bool(self._pending))
+        if self._pending:
+            self.widget.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def _set_busy(self, busy):
+        if busy != self._busy:
+            self._busy = busy
+            if self.on_busy:
+                self.on_busy(busy)
+
+
+class ProgressDialog:
+    """Ventana pequeña con barra de progreso y botón Cancelar."""
+
+    def __init__(self, parent, title, text=""):
+        self.cancelado = threading.Event()
+        self.window = ctk.CTkToplevel(parent)
+        self.window.title(title)
+        self.window.geometry("380x150")
+        self.window.resizable(False, False)
+        self.window.transient(parent.winfo_toplevel())
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.label = create_label(self.window, text or title)
+        self.label.pack(padx=16, pady=(18, 8))
+        self.bar = ctk.CTkProgressBar(self.window, width=320)
+        self.bar.set(0)
+        self.bar.pack(padx=16, pady=4)
+        self.btn_cancel = create_button(self.window, "Cancelar", command=self.cancel, style="danger", width=100)
+        self.btn_cancel.pack(pady=(10, 12))
+
+    def update(self, fraction, text=None):
+        self.bar.set(max(0.0, min(1.0, fraction)))
+        if text:
+            self.label.configure(text=text)
+
+    def cancel(self):
+        self.cancelado.set()
+        self.btn_cancel.configure(state="disabled", text="Cancelando...")
+
+    def close(self):
+        try:
+            self.window.destroy()
+        except Exception:
+            pass
+
+
+def import_csv_dialog(parent, tabla, archivo, on_finish=None):
+    """Importa un CSV en segundo plano mostrando progreso y el resumen final."""
+    from database import importar_csv
+
+    dialog = ProgressDialog(parent, "Importar CSV", f"Importando {tabla}...")
+
+    def progreso(lineas, fraccion):
+        dialog.update(fraccion, f"Importando {tabla}... {lineas} líneas")
+
+    def terminado(resultado):
+        dialog.close()
+        resumen = (f"Líneas leídas: {resultado['lineas']}\n"
+                   f"Insertadas: {resultado['insertadas']}\n"
+                   f"Rechazadas: {resultado['rechazadas']}")
+        if resultado["cancelado"]:
+            resumen = "Importación cancelada (los lotes ya guardados se conservan).\n\n" + resumen
+        if resultado["errores"]:
+            detalle = "\n".join(f"Línea {linea}: {motivo}" for linea, motivo in resultado["errores"][:15])
+            if resultado["rechazadas"] > 15:
+                detalle += f"\n... y {resultado['rechazadas'] - 15} más"
+            titulo = "Importación cancelada" if resultado["cancelado"] else "Importación con errores"
+            messagebox.showwarning(titulo, f"{resumen}\n\n{detalle}")
+        elif resultado["cancelado"]:
+            messagebox.showinfo("Importación cancelada", resumen)
+        else:
+            messagebox.showinfo("Importación terminada", resumen)
+        if on_finish:
+            on_finish()
+
+    def fallo(error):
+        dialog.close()
+        messagebox.showerror("Error", f"No se pudo importar:\n{error}")
+        if on_finish:
+            on_finish()
+
+    run_in_background(
+        parent,
+        lambda reportar: importar_csv(tabla, archivo, progreso=reportar, cancelado=dialog.cancelado.is_set),
+        on_done=terminado, on_error=fallo, on_progress=progreso,
+    )
+
+
+def export_csv_dialog(parent, tabla, archivo, filtro=None, orden=None, descendente=False, on_finish=None,
+                      rango=None, ubicacion=None):
+    """Exporta a CSV en segundo plano con barra de progreso y opción de cancelar."""
+    from database import exportar_csv
+
+    dialog = ProgressDialog(parent, "Exportar CSV", "Exportando...")
+
+    def progreso(filas, total):
+        dialog.update(filas / total if total else 1.0, f"Exportando... {filas} de {total} filas")
+
+    def terminado(resultado):
+        dialog.close()
+        if resultado["cancelado"]:
+            messagebox.showinfo("Exportación cancelada", "No se guardó el archivo.")
+        else:
+            messagebox.showinfo("Exportación exitosa", f"{resultado['filas']} filas exportadas a:\n{archivo}")
+        if on_finish:
+            on_finish()
+
+    def fallo(error):
+        dialog.close()
+        messagebox.showerror("Error al exportar", f"Ocurrió un error al exportar:\n{error}")
+        if on_finish:
+            on_finish()
+
+    run_in_background(
+        parent,
+        lambda reportar: exportar_csv(tabla, archivo, filtro, orden, descendente,
+                                      progreso=reportar, cancelado=dialog.cancelado.is_set, rango=rango,
+                                      ubicacion=ubicacion),
+        on_done=terminado, on_error=fallo, on_progress=progreso,
+    )
+
+
+def export_pdf_dialog(parent, archivo, filtro=None, orden=None, descendente=False, on_finish=None,
+                      rango=None, ubicacion=None, poll_ms=100):
+    """Genera el PDF del inventario en otro proceso con barra de progreso y opción de cancelar.
+
+    El proceso (reportes.proceso_pdf) abre su propia conexión a la base y
+    avisa su avance por una cola que se revisa con after(); la interfaz no
+    comparte el GIL con reportlab mientras se dibujan las páginas.
+    """
+    import multiprocessing
+    from queue import Empty
+    from reportes import proceso_pdf
+
+    contexto = multiprocessing.get_context("spawn")  # igual en Windows y Linux
+    cola = contexto.Queue()
+    cancelar = contexto.Event()
+    opciones = {"filtro": filtro, "orden": orden, "descendente": descendente, "rango": rango,
+                "ubicacion": ubicacion}
+    proceso = contexto.Process(target=proceso_pdf, args=(cola, cancelar, archivo, opciones), daemon=True)
+
+    dialog = ProgressDialog(parent, "Exportar PDF", "Preparando el reporte...")
+    estado = {}
+
+    def terminar():
+        proceso.join(timeout=1)
+        dialog.close()
+        if "error" in estado:
+            messagebox.showerror("Error al exportar", f"Ocurrió un error al exportar PDF:\n{estado['error']}")
+        elif estado["listo"]["cancelado"]:
+            messagebox.showinfo("Exportación cancelada", "No se guardó el archivo.")
+        else:
+            resultado = estado["listo"]
+            messagebox.showinfo("PDF generado",
+                                f"{resultado['filas']} productos en {resultado['paginas']} páginas:\n{archivo}")
+        if on_finish:
+            on_finish()
+
+    def leer(espera):
+        """Vacía la cola; devuelve el último (filas, total) recibido."""
+        progreso = None
+        try:
+            while True:
+                mensaje = cola.get(timeout=espera) if espera else cola.get_nowait()
+                if mensaje[0] == "progreso":
+                    progreso = mensaje[1:]
+                else:
+                    estado[mensaje[0]] = mensaje[1]
+        except Empty:
+            pass
+        return progreso
+
+    def revisar():
+        if dialog.cancelado.is_set():
+            cancelar.set()
+        vivo = proceso.is_alive()
+        # Si ya terminó, lo último que envió puede estar aún en la tubería
+        progreso = leer(0 if vivo else 0.5)
+        if progreso:
+            filas, total = progreso
+            dialog.update(filas / total if total else 1.0, f"Generando PDF... {filas} de {total} productos")
+        if estado:
+            terminar()
+        elif not vivo:
+            estado["error"] = f"el proceso terminó inesperadamente (código {proceso.exitcode})"
+            terminar()
+        else:
+            parent.after(poll_ms, revisar)
+
+    proceso.start()
+    parent.after(poll_ms, revisar)
+    return proceso
+
+
+def diagnostics_dialog(parent):
+    """Ventana con los contadores de consultas, las consultas lentas con su
+    plan y la caché de lecturas; permite guardarlos para un reporte de soporte."""
+    from tkinter import filedialog
+    import database
+
+    ventana = ctk.CTkToplevel(parent)
+    ventana.title("Diagnóstico de consultas")
+    ventana.geometry("900x640")
+    ventana.transient(parent.winfo_toplevel())
+
+    resumen = create_label(ventana, "", font=("Segoe UI", 12, "bold"))
+    resumen.pack(padx=10, pady=(10, 4), anchor="w")
+
+    def tabla(titulo, columnas, anchos, alto):
+        create_label(ventana, titulo).pack(padx=10, pady=(6, 2), anchor="w")
+        marco = create_frame(ventana)
+        marco.pack(fill="both", expand=True, padx=10)
+        tree = ttk.Treeview(marco, columns=columnas, show="headings", height=alto)
+        vsb = ttk.Scrollbar(marco, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        apply_table_style(tree)
+        for col, ancho in zip(columnas, anchos):
+            tree.heading(col, text="SQL" if col == "sql" else col.capitalize())
+            tree.column(col, width=ancho, anchor="w" if col == "sql" else "center", stretch=col == "sql")
+        tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="right", fill="y")
+        return tree
+
+    costosas = tabla("Sentencias que más tiempo suman", ("veces", "total ms", "máx ms", "filas", "sql"),
+                     (70, 90, 80, 90, 520), 7)
+    lentas = tabla("Consultas lentas (la más reciente primero)", ("hora", "ms", "filas", "hilo", "sql"),
+                   (140, 80, 80, 110, 440), 6)
+    detalle = ctk.CTkTextbox(ventana, height=120, font=("Consolas", 11))
+    detalle.pack(fill="x", padx=10, pady=(6, 4))
+
+    datos = {"lentas": []}
+
+    def mostrar_detalle(event=None):
+        seleccion = lentas.selection()
+        if not seleccion:
+            return
+        lenta = datos["lentas"][int(seleccion[0])]
+        detalle.delete("1.0", "end")
+        detalle.insert("1.0", lenta["sql"] + "\n\n" + "\n".join(lenta["plan"]))
+
+    def actualizar():
+        estado = database.estadisticas_consultas()
+        cache = database.estadisticas_cache()
+        datos["lentas"] = estado["lentas"]
+        if estado["activo"]:
+            activo.select()
+        else:
+            activo.deselect()
+        apagado = "" if estado["activo"] else "Medición apagada  ·  "
+        resumen.configure(text=(
+            f"{apagado}Desde {estado['desde'].replace('T', ' ')}  ·  {estado['sentencias']} sentencias en "
+            f"{estado['total_ms'] / 1000:.1f} s  ·  lentas > {estado['umbral_ms']:.0f} ms: {len(estado['lentas'])}  ·  "
+            f"caché: {cache['tasa_aciertos']:.0%} aciertos"
+        ))
+        costosas.delete(*costosas.get_children())
+        for s in estado["mas_costosas"]:
+            costosas.insert("", "end", values=(s["veces"], s["total_ms"], s["max_ms"], s["filas"], s["sql"]))
+        lentas.delete(*lentas.get_children())
+        for i, lenta in enumerate(estado["lentas"]):
+            lentas.insert("", "end", iid=str(i),
+                          values=(lenta["hora"].replace("T", " "), lenta["ms"], lenta["filas"], lenta["hilo"], lenta["sql"]))
+        detalle.delete("1.0", "end")
+
+    def limpiar():
+        database.limpiar_diagnostico()
+        actualizar()
+
+    def guardar():
+        archivo = filedialog.asksaveasfilename(
+            parent=ventana,
+            defaultextension=".json",
+            filetypes=[("Archivo JSON", "*.json")],
+            title="Guardar diagnóstico",
+            initialfile=f"diagnostico_{date.today().strftime('%Y%m%d')}.json",
+        )
+        if not archivo:
+            return
+        try:
+            database.volcar_diagnostico(archivo)
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo guardar el diagnóstico:\n{e}", parent=ventana)
+            return
+        messagebox.showinfo("Diagnóstico guardado", f"Adjunta este archivo al reporte:\n{archivo}", parent=ventana)
+
+    lentas.bind("<<TreeviewSelect>>", mostrar_detalle)
+
+    botones = create_frame(ventana)
+    botones.pack(pady=(4, 10))
+    def medir():
+        database.configurar_diagnostico(activo=activo.get())
+        actualizar()
+
+    activo = ctk.CTkSwitch(botones, text="Medir consultas", command=medir)
+    activo.grid(row=0, column=0, padx=10)
+    create_button(botones, "🔄 Actualizar", command=actualizar, style="primary", width=130).grid(row=0, column=1, padx=6)
+    create_button(botones, "🧹 Limpiar", command=limpiar, style="neutral", width=130).grid(row=0, column=2, padx=6)
+    create_button(botones, "💾 Guardar para soporte", command=guardar, style="success", width=190).grid(
+        row=0, column=3, padx=6)
+
+    import perfil_ui
+    if perfil_ui.activo():
+        create_button(botones, "🕒 Perfil de la interfaz", command=lambda: ui_profile_dialog(ventana),
+                      style="warning", width=190).grid(row=0, column=4, padx=6)
+
+    actualizar()
+    return ventana
+
+
+def ui_profile_dialog(parent):
+    """Callbacks de Tk que más tiempo suman en cada pestaña y bloqueos del
+    bucle de eventos (requiere arrancar con --perfil-ui)."""
+    from tkinter import filedialog
+    import perfil_ui
+
+    ventana = ctk.CTkToplevel(parent)
+    ventana.title("Perfil de la interfaz")
+    ventana.geometry("900x560")
+    ventana.transient(parent.winfo_toplevel())
+
+    resumen = create_label(ventana, "", font=("Segoe UI", 12, "bold"))
+    resumen.pack(padx=10, pady=(10, 4), anchor="w")
+
+    marco = create_frame(ventana)
+    marco.pack(fill="both", expand=True, padx=10)
+    columnas = ("veces", "total", "max", "medio", "ubicacion")
+    tree = ttk.Treeview(marco, columns=columnas, show="tree headings", height=18)
+    vsb = ttk.Scrollbar(marco, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=vsb.set)
+    apply_table_style(tree)
+    tree.heading("#0", text="Pestaña / callback")
+    tree.column("#0", width=360)
+    for col, txt, ancho in zip(columnas, ["Veces", "Total ms", "Máx ms", "Medio ms", "Ubicación"],
+                               (70, 90, 80, 80, 180)):
+        tree.heading(col, text=txt)
+        tree.column(col, width=ancho, anchor="center")
+    tree.pack(side="left", fill="both", expand=True)
+    vsb.pack(side="right", fill="y")
+
+    def actualizar():
+        datos = perfil_ui.peores()
+        bloqueos = datos["bloqueos"]
+        resumen.configure(text=(
+            f"Bucle de eventos bloqueado {bloqueos['veces']} veces (≥ {perfil_ui.UMBRAL_BLOQUEO_MS} ms), "
+            f"{bloqueos['total_ms'] / 1000:.1f} s en total, el peor {bloqueos['max_ms']:.0f} ms"
+        ))
+        tree.delete(*tree.get_children())
+        for pestana, callbacks in datos["pestanas"].items():
+            total = sum(c["total_ms"] for c in callbacks)
+            padre = tree.insert("", "end", text=pestana, values=("", f"{total:.1f}", "", "", ""), open=True)
+            for c in callbacks:
+                tree.insert(padre, "end", text=c["nombre"],
+                            values=(c["veces"], c["total_ms"], c["max_ms"], c["medio_ms"], c["ubicacion"]))
+
+    def limpiar():
+        perfil_ui.limpiar()
+        actualizar()
+
+    def exportar():
+        archivo = filedialog.asksaveasfilename(
+            parent=ventana,
+            defaultextension=".json",
+            filetypes=[("Traza de Chrome / Perfetto", "*.json")],
+            title="Exportar traza",
+            initialfile=f"perfil_ui_{date.today().strftime('%Y%m%d')}.json",
+        )
+        if not archivo:
+            return
+        try:
+            eventos = perfil_ui.guardar_traza(archivo)
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo guardar la traza:\n{e}", parent=ventana)
+            return
+        messagebox.showinfo("Traza guardada",
+                            f"{eventos} eventos en:\n{archivo}\n\nSe abre en chrome://tracing, "
+                            "ui.perfetto.dev o speedscope.app", parent=ventana)
+
+    botones = create_frame(ventana)
+    botones.pack(pady=(6, 10))
+    create_button(botones, "🔄 Actualizar", command=actualizar, style="primary", width=130).grid(row=0, column=0, padx=6)
+    create_button(botones, "🧹 Limpiar", command=limpiar, style="neutral", width=130).grid(row=0, column=1, padx=6)
+    create_button(botones, "💾 Exportar traza", command=exportar, style="success", width=160).grid(
+        row=0, column=2, padx=6)
+
+    actualizar()
+    return ventana